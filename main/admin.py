@@ -1,6 +1,69 @@
-from django.contrib import admin
+import re
+
+from django.contrib import admin, messages
 from django import forms
-from .models import Rifa, Numero, Transaccion, Ganador
+from django.urls import reverse
+from django.utils.html import format_html, format_html_join
+from .models import (
+    Rifa, Numero, Transaccion, Ganador, Tarea, Comprador, CompraRifa, TransicionNumero, CambioNumero
+)
+from .archivo import ESTADOS_ARCHIVABLES
+from .tareas import encolar
+from .telefonos import normalizar_telefono
+
+PARECE_TELEFONO = re.compile(r'[\d\s()+.-]*\d[\d\s()+.-]*')
+
+
+def mensaje_tareas(model_admin, request, tareas):
+    """Avisa las tareas encoladas con un enlace para seguir su progreso"""
+    enlaces = format_html_join(', ', '<a href="{}">#{}</a>', (
+        (reverse('admin:main_tarea_change', args=[t.pk]), t.pk) for t in tareas
+    ))
+    model_admin.message_user(request, format_html(
+        'Se encolaron {} tarea(s): {}. Se ejecutan con manage.py procesar_tareas.',
+        len(tareas), enlaces
+    ))
+
+
+class RifaAutocompleteFilter(admin.SimpleListFilter):
+    """Filtro por rifa con autocompletado, sin cargar todas las rifas en la barra lateral"""
+    title = 'rifa'
+    parameter_name = 'rifa'
+    template = 'admin/filtro_autocompletar.html'
+
+    def __init__(self, request, params, model, model_admin):
+        self.opts = model._meta
+        super().__init__(request, params, model, model_admin)
+
+    def lookups(self, request, model_admin):
+        # Solo se consulta la rifa seleccionada, para mostrar su nombre
+        if self.value() and self.value().isdigit():
+            return list(Rifa.objects.filter(pk=self.value()).values_list('pk', 'nombre'))
+        return []
+
+    def has_output(self):
+        return True
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(rifa_id=self.value())
+        return queryset
+
+    def choices(self, changelist):
+        yield {
+            'selected': self.value() is None,
+            'query_string': changelist.get_query_string(remove=[self.parameter_name]),
+            'display': 'Todas',
+            'app_label': self.opts.app_label,
+            'model_name': self.opts.model_name,
+        }
+        for pk, nombre in self.lookup_choices:
+            yield {
+                'selected': True,
+                'query_string': changelist.get_query_string({self.parameter_name: pk}),
+                'display': nombre,
+            }
+
 
 class TransaccionForm(forms.ModelForm):
     class Meta:
@@ -9,6 +72,9 @@ class TransaccionForm(forms.ModelForm):
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        if 'numeros' not in self.fields:
+            # Solo lectura (rifa archivada)
+            return
         # Filtrar números disponibles solo si hay una rifa seleccionada
         if 'rifa' in self.data:
             try:
@@ -40,11 +106,12 @@ class RifaAdmin(admin.ModelAdmin):
         'get_esta_activa',
         'numeros_generados'
     ]
-    list_filter = ['estado', 'fecha_sorteo', 'fecha_creacion', 'numeros_generados']
+    list_filter = ['estado', 'fecha_sorteo', 'fecha_creacion', 'numeros_generados', 'archivada']
+    show_full_result_count = False
     search_fields = ['nombre', 'descripcion']
     prepopulated_fields = {'slug': ('nombre',)}
-    readonly_fields = ['fecha_creacion', 'fecha_actualizacion', 'numeros_generados']
-    actions = ['regenerar_numeros']
+    readonly_fields = ['fecha_creacion', 'fecha_actualizacion', 'numeros_generados', 'archivada']
+    actions = ['regenerar_numeros', 'exportar_numeros', 'archivar_rifas']
     
     fieldsets = (
         ('Información Básica', {
@@ -64,14 +131,20 @@ class RifaAdmin(admin.ModelAdmin):
                 'estado',
                 'fecha_creacion',
                 'fecha_actualizacion',
-                'numeros_generados'
+                'numeros_generados',
+                'archivada'
             )
         })
     )
 
+    def get_queryset(self, request):
+        # Un COUNT por subconsulta en la misma query del listado, en vez de uno por fila
+        return super().get_queryset(request).con_numeros_vendidos()
+
     def get_numeros_vendidos(self, obj):
         return obj.numeros_vendidos
     get_numeros_vendidos.short_description = 'Números Vendidos'
+    get_numeros_vendidos.admin_order_field = '_numeros_vendidos'
 
     def get_esta_activa(self, obj):
         return obj.esta_activa
@@ -79,17 +152,32 @@ class RifaAdmin(admin.ModelAdmin):
     get_esta_activa.boolean = True
 
     def regenerar_numeros(self, request, queryset):
-        """Acción para regenerar números de rifas seleccionadas"""
-        for rifa in queryset:
-            # Eliminar números existentes
-            rifa.numeros.all().delete()
-            rifa.numeros_generados = False
-            rifa.save()
-            # Generar nuevos números
-            rifa.generar_numeros()
-        self.message_user(request, f"Se regeneraron los números para {queryset.count()} rifa(s)")
+        """Acción para regenerar números de rifas seleccionadas (en segundo plano)"""
+        tareas = [encolar('regenerar_numeros', rifa_id=rifa.pk) for rifa in queryset.filter(archivada=False)]
+        if not tareas:
+            self.message_user(request, "Las rifas archivadas no se pueden regenerar", messages.WARNING)
+            return
+        mensaje_tareas(self, request, tareas)
     regenerar_numeros.short_description = "Regenerar números para las rifas seleccionadas"
 
+    def exportar_numeros(self, request, queryset):
+        """Acción para exportar a CSV los números de las rifas seleccionadas (en segundo plano)"""
+        tareas = [encolar('exportar_numeros', rifa_id=rifa.pk) for rifa in queryset]
+        mensaje_tareas(self, request, tareas)
+    exportar_numeros.short_description = "Exportar números (CSV) de las rifas seleccionadas"
+
+    def archivar_rifas(self, request, queryset):
+        """Comprime los números de las rifas sorteadas o canceladas (en segundo plano)"""
+        rifas = queryset.filter(estado__in=ESTADOS_ARCHIVABLES, archivada=False)
+        tareas = [encolar('archivar_rifa', rifa_id=rifa.pk) for rifa in rifas]
+        if not tareas:
+            self.message_user(
+                request, "Solo se archivan rifas sorteadas o canceladas que no estén archivadas", messages.WARNING
+            )
+            return
+        mensaje_tareas(self, request, tareas)
+    archivar_rifas.short_description = "Archivar rifas terminadas seleccionadas"
+
 @admin.register(Numero)
 class NumeroAdmin(admin.ModelAdmin):
     list_display = [
@@ -100,12 +188,33 @@ class NumeroAdmin(admin.ModelAdmin):
         'nombre_comprador',
         'fecha_compra'
     ]
-    list_filter = ['estado', 'rifa', 'fecha_compra']
+    list_filter = ['estado', RifaAutocompleteFilter, 'fecha_compra']
     search_fields = ['numero', 'telefono_comprador', 'nombre_comprador', 'rifa__nombre']
-    readonly_fields = ['fecha_reserva', 'fecha_compra']
+    readonly_fields = ['fecha_reserva', 'fecha_compra', 'comprador']
+    autocomplete_fields = ['rifa']
+    show_full_result_count = False
     
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('rifa')
+    
+    def save_model(self, request, obj, form, change):
+        # El changeform corre en una transacción: la fila queda bloqueada hasta guardar
+        anterior = Numero.objects.select_for_update().filter(pk=obj.pk).values_list(
+            'estado', 'comprador_id'
+        ).first()
+        estado_anterior, comprador_anterior = anterior or ('disponible', None)
+        super().save_model(request, obj, form, change)
+        if (estado_anterior, comprador_anterior) == (obj.estado, obj.comprador_id):
+            # Editar otros campos no es una transición: no va a la bitácora
+            return
+        obj.rifa.registrar_cambios(
+            [CambioNumero(
+                obj.numero, estado_anterior, obj.estado, comprador_anterior,
+                obj.comprador_id, obj.nombre_comprador, obj.telefono_comprador
+            )],
+            operador=request.user,
+            origen='admin'
+        )
 
 @admin.register(Transaccion)
 class TransaccionAdmin(admin.ModelAdmin):
@@ -121,26 +230,32 @@ class TransaccionAdmin(admin.ModelAdmin):
         'metodo_pago',
         'fecha_creacion'
     ]
-    list_filter = ['estado', 'fecha_creacion', 'metodo_pago', 'rifa']
+    list_filter = ['estado', 'fecha_creacion', 'metodo_pago', RifaAutocompleteFilter]
     search_fields = ['codigo_transaccion', 'nombre_cliente', 'telefono_cliente', 'rifa__nombre']
+    autocomplete_fields = ['rifa']
+    show_full_result_count = False
+    actions = ['completar_transacciones']
     readonly_fields = [
         'fecha_creacion', 
         'fecha_actualizacion', 
         'monto_total', 
         'codigo_transaccion',
+        'comprador',
         'get_cantidad_numeros_display',
+        'get_numeros_archivados',
         'get_precio_por_numero',
         'get_monto_calculado'
     ]
     
     fieldsets = (
         ('Información del Cliente', {
-            'fields': ('nombre_cliente', 'telefono_cliente')
+            'fields': ('nombre_cliente', 'telefono_cliente', 'comprador')
         }),
         ('Detalles de la Transacción', {
             'fields': (
                 'rifa', 
                 'numeros', 
+                'get_numeros_archivados',
                 'get_cantidad_numeros_display',
                 'get_precio_por_numero',
                 'monto_total',
@@ -156,16 +271,30 @@ class TransaccionAdmin(admin.ModelAdmin):
     )
     
     def get_cantidad_numeros(self, obj):
-        return obj.numeros.count()
+        return obj.cantidad_numeros
     get_cantidad_numeros.short_description = 'Cantidad de Números'
+    get_cantidad_numeros.admin_order_field = 'cantidad_numeros'
     
     def get_cantidad_numeros_display(self, obj):
         if obj.pk:
-            count = obj.numeros.count()
+            count = obj.cantidad_numeros if obj.rifa.archivada else obj.numeros.count()
             return f"{count} número(s)"
         return "Seleccione números primero"
     get_cantidad_numeros_display.short_description = 'Cantidad de Números'
     
+    def get_numeros_archivados(self, obj):
+        if obj.pk and obj.rifa.archivada:
+            numeros = obj.rifa.archivo.leer().transacciones.get(obj.pk, [])
+            return ', '.join(map(str, numeros)) or '-'
+        return '-'
+    get_numeros_archivados.short_description = 'Números (archivo)'
+    
+    def get_readonly_fields(self, request, obj=None):
+        # Los números de una rifa archivada ya no están en la tabla: no se editan
+        if obj and obj.rifa.archivada:
+            return list(self.readonly_fields) + ['rifa', 'numeros', 'estado']
+        return self.readonly_fields
+    
     def get_precio_por_numero(self, obj):
         if obj.rifa:
             return f"${obj.rifa.precio_numero} por número"
@@ -174,15 +303,18 @@ class TransaccionAdmin(admin.ModelAdmin):
     
     def get_monto_calculado(self, obj):
         if obj.rifa and obj.pk:
-            count = obj.numeros.count()
+            count = obj.cantidad_numeros if obj.rifa.archivada else obj.numeros.count()
             total = count * obj.rifa.precio_numero
             return f"${total} ({count} × ${obj.rifa.precio_numero})"
         return "El monto se calculará automáticamente"
     get_monto_calculado.short_description = 'Cálculo del Monto'
     
-    def save_model(self, request, obj, form, change):
-        # Guardar primero para tener el ID
-        super().save_model(request, obj, form, change)
+    def save_related(self, request, form, formsets, change):
+        # Los números (ManyToMany) se guardan recién aquí, después de save_model
+        super().save_related(request, form, formsets, change)
+        obj = form.instance
+        if obj.rifa.archivada:
+            return
         
         # Actualizar la cantidad de números y monto total
         obj.cantidad_numeros = obj.numeros.count()
@@ -191,7 +323,24 @@ class TransaccionAdmin(admin.ModelAdmin):
         
         # Si la transacción se marca como completada, marcar los números como vendidos
         if obj.estado == 'completada':
-            obj.marcar_numeros_como_vendidos()
+            try:
+                obj.marcar_numeros_como_vendidos(operador=request.user)
+            except ValueError as error:
+                # La transacción se guarda pero queda pendiente: los números no se vendieron
+                obj.estado = 'pendiente'
+                obj.save()
+                self.message_user(request, str(error), messages.ERROR)
+    
+    def completar_transacciones(self, request, queryset):
+        """Marca como completadas las transacciones y vende sus números (en segundo plano)"""
+        ids = list(queryset.exclude(estado='completada').values_list('pk', flat=True))
+        if not ids:
+            self.message_user(request, "Las transacciones seleccionadas ya estaban completadas")
+            return
+        mensaje_tareas(self, request, [
+            encolar('completar_transacciones', transaccion_ids=ids, operador_id=request.user.pk)
+        ])
+    completar_transacciones.short_description = "Completar transacciones seleccionadas"
     
     def get_queryset(self, request):
         return super().get_queryset(request).select_related('rifa')
@@ -204,6 +353,76 @@ class TransaccionAdmin(admin.ModelAdmin):
             form.base_fields['metodo_pago'].initial = 'efectivo'
         return form
 
+class CompraRifaInline(admin.TabularInline):
+    model = CompraRifa
+    fields = ['rifa', 'numeros', 'monto', 'fecha_ultima_compra']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+    ordering = ['-numeros']
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+
+@admin.register(Comprador)
+class CompradorAdmin(admin.ModelAdmin):
+    """Ranking de compradores: el orden por defecto usa el índice de numeros_comprados"""
+    list_display = [
+        'telefono',
+        'nombre',
+        'numeros_comprados',
+        'monto_total',
+        'fecha_ultima_compra'
+    ]
+    search_fields = ['telefono', 'nombre']
+    readonly_fields = [
+        'telefono',
+        'numeros_comprados',
+        'monto_total',
+        'fecha_creacion',
+        'fecha_ultima_compra'
+    ]
+    inlines = [CompraRifaInline]
+    show_full_result_count = False
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def get_search_results(self, request, queryset, search_term):
+        # Un teléfono se busca por su forma normalizada, con lookup exacto sobre el índice único
+        if PARECE_TELEFONO.fullmatch(search_term.strip()):
+            return queryset.filter(telefono=normalizar_telefono(search_term)), False
+        return super().get_search_results(request, queryset, search_term)
+
+@admin.register(TransicionNumero)
+class TransicionNumeroAdmin(admin.ModelAdmin):
+    """Bitácora de solo lectura; los filtros por rifa+número y por operador usan sus índices"""
+    list_display = [
+        'fecha',
+        'rifa',
+        'numero',
+        'estado_anterior',
+        'estado_nuevo',
+        'nombre_comprador',
+        'telefono_comprador',
+        'operador',
+        'origen'
+    ]
+    list_filter = ['origen', 'estado_nuevo']
+    search_fields = ['=numero']
+    list_select_related = ['rifa', 'operador']
+    raw_id_fields = ['rifa', 'comprador', 'comprador_anterior', 'operador', 'transaccion']
+    show_full_result_count = False
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 @admin.register(Ganador)
 class GanadorAdmin(admin.ModelAdmin):
     list_display = [
@@ -218,4 +437,64 @@ class GanadorAdmin(admin.ModelAdmin):
     search_fields = ['rifa__nombre', 'numero_ganador__numero', 'nombre_ganador', 'telefono_ganador']
     
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related('rifa', 'numero_ganador')
\ No newline at end of file
+        return super().get_queryset(request).select_related('rifa', 'numero_ganador')
+
+@admin.register(Tarea)
+class TareaAdmin(admin.ModelAdmin):
+    list_display = [
+        'id',
+        'get_tipo',
+        'estado',
+        'get_progreso',
+        'intentos',
+        'trabajador',
+        'fecha_creacion',
+        'fecha_fin'
+    ]
+    list_filter = ['estado', 'tipo']
+    readonly_fields = [
+        'tipo',
+        'parametros',
+        'estado',
+        'get_progreso',
+        'intentos',
+        'max_intentos',
+        'resultado',
+        'get_descarga',
+        'error',
+        'trabajador',
+        'fecha_creacion',
+        'disponible_desde',
+        'fecha_inicio',
+        'fecha_fin',
+        'latido'
+    ]
+    exclude = ['procesados', 'total']
+    change_form_template = 'admin/main/tarea/change_form.html'
+    show_full_result_count = False
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def get_tipo(self, obj):
+        return obj.get_tipo_display()
+    get_tipo.short_description = 'Tipo'
+    get_tipo.admin_order_field = 'tipo'
+    
+    def get_progreso(self, obj):
+        return format_html(
+            '<progress class="tarea-progreso" data-tarea="{}" max="100" value="{}"></progress> '
+            '<span class="tarea-progreso-texto">{}% ({}/{})</span>',
+            obj.pk, obj.porcentaje, obj.porcentaje, obj.procesados, obj.total
+        )
+    get_progreso.short_description = 'Progreso'
+    
+    def get_descarga(self, obj):
+        if obj.tipo != 'exportar_numeros' or obj.estado != 'completada':
+            return '-'
+        return format_html('<a href="{}">Descargar CSV</a>', reverse('descargar_exportacion', args=[obj.pk]))
+    get_descarga.short_description = 'Descarga'
+
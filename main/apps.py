@@ -1,4 +1,32 @@
+from pathlib import Path
+
 from django.apps import AppConfig
+from django.conf import settings
+
+
+def precompilar_templates():
+    """Carga en el loader cacheado todos los templates de main y devuelve sus nombres"""
+    from django.template import engines
+
+    directorio = Path(__file__).resolve().parent / 'templates'
+    nombres = sorted(
+        ruta.relative_to(directorio).as_posix() for ruta in directorio.rglob('*.html')
+    )
+    for engine in engines.all():
+        for nombre in nombres:
+            engine.get_template(nombre)
+    return nombres
+
+
+def precompilar_al_iniciar():
+    """Precompila si PRECOMPILAR_TEMPLATES está activo.
+
+    La llaman rifa/wsgi.py y rifa/asgi.py al crear la aplicación: solo paga
+    el costo el proceso que va a atender requests, no cada comando de manage.py.
+    """
+    if getattr(settings, 'PRECOMPILAR_TEMPLATES', False):
+        return precompilar_templates()
+    return []
 
 
 class MainConfig(AppConfig):
@@ -0,0 +1,277 @@
+"""Archivo compacto de los números de rifas terminadas.
+
+Una rifa sorteada o cancelada no vuelve a cambiar: sus números se guardan en
+``ArchivoRifa`` como dos blobs comprimidos con zlib y se borran de la tabla de
+números.
+
+* ``estados``: un byte por número (posición ``numero - 1``), ver ``CODIGOS``.
+* ``datos``: JSON con la tabla de compradores, los datos de los números que
+  tienen comprador o fechas, y los números de cada transacción.
+
+``archivar`` y ``restaurar`` son operaciones inversas.
+"""
+import json
+import zlib
+from collections import OrderedDict, defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ArchivoRifa, Comprador, Ganador, Numero, Rifa, Transaccion
+
+ESTADOS_ARCHIVABLES = ('sorteada', 'cancelada')
+
+# 0 = el número no existe (rifa generada a medias)
+CODIGOS = {'disponible': 1, 'reservado': 2, 'vendido': 3}
+ESTADOS = {codigo: estado for estado, codigo in CODIGOS.items()}
+NOMBRES_ESTADO = dict(Numero.ESTADO_CHOICES)
+
+LOTE_BORRADO = 5000
+
+# Archivos ya descomprimidos, por (id, fecha de archivado); nunca cambian
+_decodificados = OrderedDict()
+MAX_DECODIFICADOS = 8
+
+
+class NumeroArchivado:
+    """Número leído del archivo, con los atributos que usan las plantillas"""
+    __slots__ = (
+        'rifa_id', 'numero', 'estado', 'nombre_comprador', 'telefono_comprador',
+        'comprador_id', 'fecha_reserva', 'fecha_compra', 'fecha_actualizacion',
+    )
+
+    def __init__(self, rifa_id, numero, estado, comprador=None, fecha_reserva=None,
+                 fecha_compra=None, fecha_actualizacion=None):
+        self.rifa_id = rifa_id
+        self.numero = numero
+        self.estado = estado
+        self.nombre_comprador, self.telefono_comprador, self.comprador_id = comprador or (None, None, None)
+        self.fecha_reserva = fecha_reserva
+        self.fecha_compra = fecha_compra
+        self.fecha_actualizacion = fecha_actualizacion
+
+    @property
+    def id(self):
+        # No hay fila: la clave identifica al número dentro del archivo
+        return f'archivo-{self.rifa_id}-{self.numero}'
+
+    def get_estado_display(self):
+        return NOMBRES_ESTADO[self.estado]
+
+    @property
+    def vendido(self):
+        return self.estado == 'vendido'
+
+    @property
+    def disponible(self):
+        return self.estado == 'disponible'
+
+    @property
+    def reservado(self):
+        return self.estado == 'reservado'
+
+
+class DatosArchivo:
+    """Contenido descomprimido de un ``ArchivoRifa``"""
+
+    def __init__(self, archivo):
+        self.rifa_id = archivo.rifa_id
+        self.version = archivo.fecha_archivado
+        self.estados = zlib.decompress(archivo.estados)
+        datos = json.loads(zlib.decompress(archivo.datos))
+        self.compradores = [tuple(comprador) for comprador in datos['compradores']]
+        self.detalles = {fila[0]: fila[1:] for fila in datos['numeros']}
+        self.transacciones = {int(pk): numeros for pk, numeros in datos['transacciones'].items()}
+        self._claves = {}
+
+    def claves(self, estado=None):
+        """Números existentes en orden, opcionalmente solo los de un estado"""
+        if estado not in self._claves:
+            if estado is None:
+                claves = [i + 1 for i, codigo in enumerate(self.estados) if codigo]
+            else:
+                codigo = CODIGOS.get(estado)
+                claves = [i + 1 for i, valor in enumerate(self.estados) if valor == codigo]
+            self._claves[estado] = claves
+        return self._claves[estado]
+
+    def contar(self, claves=None):
+        """Cantidad de números por estado, de todo el archivo o de ``claves``"""
+        if claves is None:
+            return {estado: self.estados.count(codigo) for estado, codigo in CODIGOS.items()}
+        conteo = dict.fromkeys(CODIGOS, 0)
+        for numero in claves:
+            conteo[ESTADOS[self.estados[numero - 1]]] += 1
+        return conteo
+
+    def numero(self, numero):
+        if not 0 < numero <= len(self.estados) or not self.estados[numero - 1]:
+            return None
+        indice, fecha_reserva, fecha_compra = self.detalles.get(numero, (-1, None, None))
+        return NumeroArchivado(
+            self.rifa_id,
+            numero,
+            ESTADOS[self.estados[numero - 1]],
+            comprador=self.compradores[indice] if indice >= 0 else None,
+            fecha_reserva=parse_datetime(fecha_reserva) if fecha_reserva else None,
+            fecha_compra=parse_datetime(fecha_compra) if fecha_compra else None,
+            fecha_actualizacion=self.version,
+        )
+
+    def compras(self):
+        """Números vendidos y fecha de la última compra por id de comprador"""
+        compras = {}
+        vendido = CODIGOS['vendido']
+        for numero, (indice, _, fecha_compra) in self.detalles.items():
+            if indice < 0 or self.estados[numero - 1] != vendido or not self.compradores[indice][2]:
+                continue
+            fila = compras.setdefault(self.compradores[indice][2], [0, None])
+            fila[0] += 1
+            fecha = parse_datetime(fecha_compra) if fecha_compra else None
+            if fecha and (fila[1] is None or fecha > fila[1]):
+                fila[1] = fecha
+        return compras
+
+    def __iter__(self):
+        for numero in self.claves():
+            yield self.numero(numero)
+
+
+def leer(archivo):
+    """Descomprime el archivo, reutilizando el resultado entre requests"""
+    clave = (archivo.pk, archivo.fecha_archivado)
+    datos = _decodificados.get(clave)
+    if datos is None:
+        datos = DatosArchivo(archivo)
+        _decodificados[clave] = datos
+        while len(_decodificados) > MAX_DECODIFICADOS:
+            _decodificados.popitem(last=False)
+    else:
+        _decodificados.move_to_end(clave)
+    return datos
+
+
+def _codificar(rifa):
+    """Arma los blobs de estados y datos a partir de los números de la rifa"""
+    filas = Numero.objects.filter(rifa=rifa).order_by('numero').values_list(
+        'id', 'numero', 'estado', 'nombre_comprador', 'telefono_comprador', 'comprador_id',
+        'fecha_reserva', 'fecha_compra'
+    )
+    mayor = Numero.objects.filter(rifa=rifa).order_by('-numero').values_list('numero', flat=True).first() or 0
+    estados = bytearray(mayor)
+    compradores = {}
+    numeros = []
+    por_id = {}
+    totales = dict.fromkeys(CODIGOS, 0)
+
+    for pk, numero, estado, nombre, telefono, comprador_id, fecha_reserva, fecha_compra in filas.iterator(chunk_size=LOTE_BORRADO):
+        estados[numero - 1] = CODIGOS[estado]
+        totales[estado] += 1
+        por_id[pk] = numero
+        if nombre or telefono or comprador_id or fecha_reserva or fecha_compra:
+            comprador = (nombre, telefono, comprador_id)
+            indice = compradores.setdefault(comprador, len(compradores)) if any(comprador) else -1
+            numeros.append([
+                numero,
+                indice,
+                fecha_reserva.isoformat() if fecha_reserva else None,
+                fecha_compra.isoformat() if fecha_compra else None,
+            ])
+
+    transacciones = defaultdict(list)
+    relaciones = Numero.transacciones.through.objects.filter(numero__rifa=rifa).values_list(
+        'transaccion_id', 'numero_id'
+    )
+    for transaccion_id, numero_id in relaciones.iterator(chunk_size=LOTE_BORRADO):
+        transacciones[transaccion_id].append(por_id[numero_id])
+
+    datos = {
+        'compradores': list(compradores),
+        'numeros': numeros,
+        'transacciones': transacciones,
+    }
+    return (
+        zlib.compress(bytes(estados), 9),
+        zlib.compress(json.dumps(datos, separators=(',', ':')).encode(), 9),
+        totales,
+    )
+
+
+def archivar(rifa):
+    """Comprime los números de una rifa terminada y borra las filas.
+
+    Se conserva la fila del número ganador, que ``Ganador`` referencia.
+    Devuelve el ``ArchivoRifa`` creado.
+    """
+    if rifa.estado not in ESTADOS_ARCHIVABLES:
+        raise ValueError(f"Solo se archivan rifas sorteadas o canceladas ({rifa.nombre} está {rifa.estado})")
+    if rifa.archivada:
+        raise ValueError(f"La rifa {rifa.nombre} ya está archivada")
+
+    with transaction.atomic():
+        estados, datos, totales = _codificar(rifa)
+        archivo = ArchivoRifa.objects.create(
+            rifa=rifa,
+            estados=estados,
+            datos=datos,
+            disponibles=totales['disponible'],
+            reservados=totales['reservado'],
+            vendidos=totales['vendido'],
+        )
+        conservar = Ganador.objects.filter(rifa=rifa).values_list('numero_ganador_id', flat=True)
+        borrar = Numero.objects.filter(rifa=rifa).exclude(id__in=list(conservar))
+        while True:
+            ids = list(borrar.values_list('id', flat=True)[:LOTE_BORRADO])
+            if not ids:
+                break
+            Numero.objects.filter(id__in=ids).delete()
+        Rifa.objects.filter(pk=rifa.pk).update(archivada=True, fecha_actualizacion=timezone.now())
+        rifa.archivada = True
+    return archivo
+
+
+def restaurar(rifa):
+    """Vuelve a crear las filas de números de una rifa archivada y borra el archivo"""
+    archivo = ArchivoRifa.objects.get(rifa=rifa)
+    datos = DatosArchivo(archivo)
+    # Compradores y transacciones borrados después de archivar no se vinculan
+    compradores = set(Comprador.objects.filter(
+        id__in={comprador[2] for comprador in datos.compradores if comprador[2]}
+    ).values_list('id', flat=True))
+    transacciones = set(Transaccion.objects.filter(
+        id__in=list(datos.transacciones)
+    ).values_list('id', flat=True))
+    with transaction.atomic():
+        Numero.objects.bulk_create(
+            (
+                Numero(
+                    rifa=rifa,
+                    numero=numero.numero,
+                    estado=numero.estado,
+                    nombre_comprador=numero.nombre_comprador,
+                    telefono_comprador=numero.telefono_comprador,
+                    comprador_id=numero.comprador_id if numero.comprador_id in compradores else None,
+                    fecha_reserva=numero.fecha_reserva,
+                    fecha_compra=numero.fecha_compra,
+                )
+                for numero in datos
+            ),
+            batch_size=LOTE_BORRADO,
+            ignore_conflicts=True
+        )
+        ids = dict(Numero.objects.filter(rifa=rifa).values_list('numero', 'id'))
+        Relacion = Numero.transacciones.through
+        Relacion.objects.bulk_create(
+            (
+                Relacion(transaccion_id=transaccion_id, numero_id=ids[numero])
+                for transaccion_id, numeros in datos.transacciones.items()
+                if transaccion_id in transacciones
+                for numero in numeros
+            ),
+            batch_size=LOTE_BORRADO,
+            ignore_conflicts=True
+        )
+        archivo.delete()
+        Rifa.objects.filter(pk=rifa.pk).update(archivada=False, fecha_actualizacion=timezone.now())
+        rifa.archivada = False
@@ -0,0 +1,114 @@
+import gzip
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.http import FileResponse, Http404
+from django.utils._os import safe_join
+from django.views.decorators.http import require_safe
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él solo se genera .gz
+    brotli = None
+
+EXTENSIONES_COMPRIMIBLES = ('.css', '.js', '.svg', '.txt', '.json', '.html', '.map')
+
+# Nombre con el hash que agrega ManifestStaticFilesStorage: layout.3f2a1b9c0d4e.css
+NOMBRE_CON_HASH = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+
+
+class ComprimidoManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage que además guarda versiones .gz y .br de cada archivo"""
+
+    def post_process(self, paths, dry_run=False, **options):
+        for nombre, nombre_con_hash, procesado in super().post_process(paths, dry_run, **options):
+            if not dry_run and isinstance(nombre_con_hash, str):
+                self.comprimir(nombre_con_hash)
+            yield nombre, nombre_con_hash, procesado
+
+    def comprimir(self, nombre):
+        if not nombre.endswith(EXTENSIONES_COMPRIMIBLES):
+            return
+        ruta = self.path(nombre)
+        with open(ruta, 'rb') as archivo:
+            contenido = archivo.read()
+        # mtime=0 para que el .gz sea reproducible entre collectstatic
+        with open(ruta + '.gz', 'wb') as archivo:
+            archivo.write(gzip.compress(contenido, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with open(ruta + '.br', 'wb') as archivo:
+                archivo.write(brotli.compress(contenido, quality=11))
+
+
+def codificaciones_aceptadas(cabecera):
+    """Valor q de cada codificación de un Accept-Encoding (``br;q=0.5, gzip``)"""
+    aceptadas = {}
+    for parte in cabecera.split(','):
+        codificacion, _, parametros = parte.partition(';')
+        codificacion = codificacion.strip().lower()
+        if not codificacion:
+            continue
+        calidad = 1.0
+        for parametro in parametros.split(';'):
+            clave, _, valor = parametro.partition('=')
+            if clave.strip().lower() == 'q':
+                try:
+                    calidad = float(valor)
+                except ValueError:
+                    calidad = 0.0
+        aceptadas[codificacion] = calidad
+    return aceptadas
+
+
+def elegir_codificacion(cabecera, disponibles):
+    """La codificación de ``disponibles`` con mayor q; a igual q, la primera.
+
+    Las que tienen q=0 se rechazan explícitamente; ``*`` cubre las no nombradas.
+    """
+    aceptadas = codificaciones_aceptadas(cabecera)
+    comodin = aceptadas.get('*', 0.0)
+    elegida, mejor = None, 0.0
+    for codificacion in disponibles:
+        calidad = aceptadas.get(codificacion, comodin)
+        if calidad > mejor:
+            elegida, mejor = codificacion, calidad
+    return elegida
+
+
+@require_safe
+def servir_estatico(request, path):
+    """Sirve STATIC_ROOT usando las versiones precomprimidas y cache de larga duración.
+
+    Pensado para despliegues sin un servidor web delante; con nginx u otro
+    proxy conviene servir STATIC_ROOT directamente con las mismas cabeceras.
+    """
+    try:
+        ruta = safe_join(settings.STATIC_ROOT, path)
+    except ValueError:
+        raise Http404
+    if not os.path.isfile(ruta):
+        raise Http404
+
+    content_type, _ = mimetypes.guess_type(ruta)
+    extensiones = {'br': '.br', 'gzip': '.gz'}
+    codificacion = elegir_codificacion(
+        request.headers.get('Accept-Encoding', ''),
+        [nombre for nombre, extension in extensiones.items() if os.path.isfile(ruta + extension)]
+    )
+    if codificacion:
+        ruta += extensiones[codificacion]
+
+    response = FileResponse(open(ruta, 'rb'), content_type=content_type or 'application/octet-stream')
+    response.headers.pop('Content-Disposition', None)
+    if codificacion:
+        response.headers['Content-Encoding'] = codificacion
+    response.headers['Vary'] = 'Accept-Encoding'
+    if NOMBRE_CON_HASH.search(path):
+        # El nombre cambia cuando cambia el contenido
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        response.headers['Cache-Control'] = 'public, max-age=300'
+    return response
@@ -0,0 +1,96 @@
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+# Anchos generados por tipo de variante; nunca se agranda la imagen original
+ANCHOS = {
+    'tarjeta': (400, 800),
+    'detalle': (1200,),
+}
+CALIDAD_WEBP = 80
+CALIDAD_JPEG = 82
+CARPETA_VARIANTES = 'rifas/variantes'
+
+
+def _guardar(imagen, nombre, formato, **opciones):
+    buffer = BytesIO()
+    imagen.save(buffer, formato, **opciones)
+    # Nombre estable: se reemplaza la variante anterior en vez de acumular copias
+    if default_storage.exists(nombre):
+        default_storage.delete(nombre)
+    return default_storage.save(nombre, ContentFile(buffer.getvalue()))
+
+
+def generar_variantes(archivo):
+    """Genera las variantes WebP y JPEG de una imagen y devuelve su descripción.
+
+    El resultado se guarda en ``Rifa.imagen_variantes``::
+
+        {'origen': 'rifas/x.png',
+         'tarjeta': [{'ancho': 400, 'alto': 300, 'webp': '...', 'jpeg': '...'}, ...],
+         'detalle': [...]}
+    """
+    archivo.open('rb')
+    try:
+        original = ImageOps.exif_transpose(Image.open(archivo))
+        original.load()
+    finally:
+        archivo.close()
+
+    if original.mode in ('RGBA', 'LA', 'P'):
+        original = original.convert('RGBA')
+        # JPEG no tiene transparencia: se aplana sobre fondo blanco
+        opaca = Image.new('RGB', original.size, (255, 255, 255))
+        opaca.paste(original, mask=original.getchannel('A'))
+    else:
+        original = original.convert('RGB')
+        opaca = original
+
+    base = os.path.splitext(os.path.basename(archivo.name))[0]
+    variantes = {'origen': archivo.name}
+    # Un mismo ancho puede repetirse entre tipos cuando la original es chica
+    generadas = {}
+    for tipo, anchos in ANCHOS.items():
+        variantes[tipo] = []
+        for ancho in sorted({min(ancho, original.width) for ancho in anchos}):
+            if ancho in generadas:
+                variantes[tipo].append(generadas[ancho])
+                continue
+            alto = max(1, round(original.height * ancho / original.width))
+            nombre = f'{CARPETA_VARIANTES}/{base}-{ancho}'
+            generadas[ancho] = {
+                'ancho': ancho,
+                'alto': alto,
+                'webp': _guardar(
+                    original.resize((ancho, alto), Image.LANCZOS),
+                    f'{nombre}.webp', 'WEBP', quality=CALIDAD_WEBP, method=6
+                ),
+                'jpeg': _guardar(
+                    opaca.resize((ancho, alto), Image.LANCZOS),
+                    f'{nombre}.jpg', 'JPEG', quality=CALIDAD_JPEG, optimize=True, progressive=True
+                ),
+            }
+            variantes[tipo].append(generadas[ancho])
+    return variantes
+
+
+def datos_imagen(variantes, tipo):
+    """URLs y dimensiones de un tipo de variante, listos para <picture> con srcset"""
+    lista = variantes.get(tipo) or []
+    if not lista:
+        return None
+    menor = lista[0]
+    return {
+        'src': default_storage.url(menor['jpeg']),
+        'ancho': menor['ancho'],
+        'alto': menor['alto'],
+        'srcset_webp': ', '.join(
+            f"{default_storage.url(v['webp'])} {v['ancho']}w" for v in lista
+        ),
+        'srcset_jpeg': ', '.join(
+            f"{default_storage.url(v['jpeg'])} {v['ancho']}w" for v in lista
+        ),
+    }
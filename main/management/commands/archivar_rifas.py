@@ -0,0 +1,95 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+from django.utils import timezone
+
+from main.archivo import ESTADOS_ARCHIVABLES, archivar, restaurar
+from main.models import Numero, Rifa
+
+
+def tamano_tabla_numeros():
+    """Bytes ocupados por la tabla de números y sus índices, o None si no se puede medir"""
+    tabla = Numero._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute(
+                    "SELECT SUM(pgsize) FROM dbstat WHERE name IN "
+                    "(SELECT name FROM sqlite_master WHERE tbl_name = %s)",
+                    [tabla]
+                )
+            elif connection.vendor == 'postgresql':
+                cursor.execute("SELECT pg_total_relation_size(%s)", [tabla])
+            else:
+                return None
+            return cursor.fetchone()[0]
+    except DatabaseError:
+        # SQLite compilado sin dbstat
+        return None
+
+
+def formatear_bytes(cantidad):
+    if cantidad is None:
+        return '?'
+    for unidad in ('B', 'KB', 'MB'):
+        if abs(cantidad) < 1024:
+            return f"{cantidad:.1f} {unidad}"
+        cantidad /= 1024
+    return f"{cantidad:.1f} GB"
+
+
+class Command(BaseCommand):
+    help = (
+        "Comprime los números de las rifas sorteadas o canceladas en un archivo "
+        "por rifa y borra las filas de la tabla de números."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rifa', type=int, action='append', help="ID de rifa (se puede repetir)")
+        parser.add_argument(
+            '--dias', type=int,
+            help="Solo rifas cuyo sorteo fue hace al menos esta cantidad de días"
+        )
+        parser.add_argument('--restaurar', action='store_true', help="Vuelve a crear las filas de rifas archivadas")
+        parser.add_argument(
+            '--vacuum', action='store_true',
+            help="En SQLite, ejecuta VACUUM al final para devolver el espacio al sistema"
+        )
+
+    def handle(self, *args, **options):
+        if options['restaurar']:
+            rifas = Rifa.objects.filter(archivada=True)
+        else:
+            rifas = Rifa.objects.filter(archivada=False, estado__in=ESTADOS_ARCHIVABLES)
+            if options['dias'] is not None:
+                rifas = rifas.filter(fecha_sorteo__lte=timezone.now() - timedelta(days=options['dias']))
+        if options['rifa']:
+            rifas = rifas.filter(id__in=options['rifa'])
+        if not rifas.exists():
+            raise CommandError("No hay rifas para procesar")
+
+        antes = tamano_tabla_numeros()
+        for rifa in rifas.order_by('id'):
+            inicio = time.perf_counter()
+            if options['restaurar']:
+                restaurar(rifa)
+                self.stdout.write(
+                    f"{rifa.nombre}: restaurada en {time.perf_counter() - inicio:.2f}s"
+                )
+                continue
+            filas = rifa.numeros.count()
+            archivo = archivar(rifa)
+            self.stdout.write(
+                f"{rifa.nombre}: {filas} fila(s) -> {formatear_bytes(archivo.tamano)} "
+                f"en el archivo ({time.perf_counter() - inicio:.2f}s)"
+            )
+
+        if options['vacuum'] and connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('VACUUM')
+        despues = tamano_tabla_numeros()
+        self.stdout.write(
+            f"Tabla de números e índices: {formatear_bytes(antes)} -> {formatear_bytes(despues)}"
+        )
@@ -0,0 +1,86 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, transaction
+from django.utils import timezone
+
+from main.models import Numero, Rifa
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide el throughput de escrituras concurrentes sobre Numero con el "
+        "perfil de base de datos configurado (DB_ENGINE / SQLITE_TUNED)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hilos', type=int, default=8, help="Operadores simultáneos")
+        parser.add_argument('--escrituras', type=int, default=200, help="Escrituras por operador")
+        parser.add_argument('--numeros', type=int, default=2000, help="Tamaño de la rifa temporal")
+
+    def handle(self, *args, **options):
+        hilos = options['hilos']
+        escrituras = options['escrituras']
+
+        rifa = Rifa.objects.create(
+            nombre=f"benchmark-{int(time.time() * 1000)}",
+            descripcion="Rifa temporal del benchmark de escrituras",
+            fecha_sorteo=timezone.now() + timedelta(days=1),
+            precio_numero=1,
+            cantidad_numeros=options['numeros'],
+        )
+        threads = []
+        try:
+            ids = list(Numero.objects.filter(rifa=rifa).values_list('id', flat=True))
+            errores = []
+            completadas = []
+
+            def operador(indice):
+                ok = 0
+                try:
+                    for i in range(escrituras):
+                        numero_id = ids[(indice * escrituras + i) % len(ids)]
+                        try:
+                            with transaction.atomic():
+                                Numero.objects.filter(id=numero_id).update(
+                                    estado='vendido',
+                                    telefono_comprador=str(indice),
+                                    fecha_compra=timezone.now(),
+                                    fecha_actualizacion=timezone.now(),
+                                )
+                            ok += 1
+                        except OperationalError as exc:
+                            errores.append(str(exc))
+                finally:
+                    completadas.append(ok)
+                    connection.close()
+
+            threads = [threading.Thread(target=operador, args=(i,)) for i in range(hilos)]
+            inicio = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            duracion = time.perf_counter() - inicio
+        finally:
+            # La rifa temporal se borra aunque la medición falle a mitad de camino
+            for thread in threads:
+                if thread.is_alive():
+                    thread.join()
+            rifa.delete()
+
+        db = settings.DATABASES['default']
+        total = sum(completadas)
+        self.stdout.write(f"Motor: {db['ENGINE']}")
+        self.stdout.write(f"Opciones: {db.get('OPTIONS', {})}")
+        self.stdout.write(f"Operadores: {hilos} x {escrituras} escrituras")
+        self.stdout.write(f"Escrituras OK: {total} en {duracion:.2f}s ({total / duracion:.1f}/s)")
+        if errores:
+            self.stdout.write(self.style.WARNING(
+                f"Errores de bloqueo: {len(errores)} (ej: {errores[0]})"
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS("Errores de bloqueo: 0"))
@@ -0,0 +1,115 @@
+import gzip
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.contrib.staticfiles import finders
+from django.core.management.base import BaseCommand, CommandError
+from django.template import Engine, engines
+from django.test import Client
+from django.urls import reverse
+
+from main.models import Rifa
+
+TEMPLATES = {
+    'mis_rifas': ['mis_rifas.html', 'layout.html'],
+    'gestion_numeros': ['gestion_numeros.html', 'layout.html'],
+}
+
+ESTATICOS = {
+    'mis_rifas': ['main/css/layout.css', 'main/js/layout.js', 'main/css/mis_rifas.css', 'main/js/mis_rifas.js'],
+    'gestion_numeros': [
+        'main/css/layout.css', 'main/js/layout.js',
+        'main/css/gestion_numeros.css', 'main/js/gestion_numeros.js',
+    ],
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide el tamaño de la respuesta y el tiempo de render de las páginas "
+        "mis_rifas y gestion_numeros, y el costo de compilar sus templates "
+        "con y sin el loader cacheado."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rifa', type=int, help="Rifa para gestion_numeros (por defecto la más grande)")
+        parser.add_argument('--repeticiones', type=int, default=20)
+
+    def handle(self, *args, **options):
+        if options['rifa']:
+            rifa = Rifa.objects.filter(id=options['rifa']).first()
+        else:
+            rifa = Rifa.objects.order_by('-cantidad_numeros').first()
+        if rifa is None:
+            raise CommandError("No hay rifas para medir gestion_numeros")
+
+        paginas = {
+            'mis_rifas': reverse('mis_rifas'),
+            'gestion_numeros': reverse('gestion_numeros', args=[rifa.id]),
+        }
+
+        usuario = User.objects.create_user(f'medir-paginas-{int(time.time())}')
+        try:
+            client = Client(HTTP_HOST='localhost')
+            client.force_login(usuario)
+            for nombre, url in paginas.items():
+                self.medir(client, nombre, url, options['repeticiones'])
+        finally:
+            usuario.delete()
+
+    def medir(self, client, nombre, url, repeticiones):
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            response = client.get(url)
+            tiempos.append(time.perf_counter() - inicio)
+        if response.status_code != 200:
+            raise CommandError(f"{url} respondió {response.status_code}")
+
+        primera = tiempos[0]
+        html = response.content
+        estaticos = 0
+        for ruta in ESTATICOS[nombre]:
+            encontrado = finders.find(ruta)
+            if encontrado:
+                with open(encontrado, 'rb') as archivo:
+                    estaticos += len(archivo.read())
+
+        self.stdout.write(f"{nombre} ({url})")
+        self.stdout.write(f"  HTML: {len(html)} bytes ({len(gzip.compress(html))} con gzip)")
+        self.stdout.write(f"  CSS/JS externos (cacheables): {estaticos} bytes")
+        self.stdout.write(
+            f"  Tiempo: primera {primera * 1000:.1f} ms, "
+            f"mediana {statistics.median(tiempos) * 1000:.1f} ms, "
+            f"mínimo {min(tiempos) * 1000:.1f} ms"
+        )
+        sin_cache, configurado = self.medir_compilacion(TEMPLATES[nombre], repeticiones)
+        self.stdout.write(
+            f"  Compilación de templates: {sin_cache * 1000:.2f} ms sin cache, "
+            f"{configurado * 1000:.2f} ms con el engine configurado"
+        )
+
+    def medir_compilacion(self, nombres, repeticiones):
+        """Mediana de cargar los templates con un engine sin cache y con el del proyecto"""
+        engine = engines['django'].engine
+        sin_cache = Engine(
+            dirs=engine.dirs,
+            app_dirs=False,
+            loaders=[
+                'django.template.loaders.filesystem.Loader',
+                'django.template.loaders.app_directories.Loader',
+            ],
+            libraries=engine.libraries,
+            builtins=engine.builtins,
+        )
+        resultados = []
+        for motor in (sin_cache, engine):
+            tiempos = []
+            for _ in range(repeticiones):
+                inicio = time.perf_counter()
+                for nombre in nombres:
+                    motor.get_template(nombre)
+                tiempos.append(time.perf_counter() - inicio)
+            resultados.append(statistics.median(tiempos))
+        return resultados
@@ -0,0 +1,213 @@
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from main.models import Rifa
+
+# Arranque de un worker en un proceso nuevo, por fases; -X importtime escribe
+# el detalle de imports en stderr
+ARRANQUE = '''
+import json, time
+inicio = time.perf_counter()
+fases = []
+def marcar(nombre):
+    fases.append((nombre, time.perf_counter() - inicio))
+from django.conf import settings
+settings.INSTALLED_APPS
+marcar('settings')
+import django
+django.setup(set_prefix=False)
+marcar('django.setup (apps y modelos)')
+from django.core.handlers.wsgi import WSGIHandler
+handler = WSGIHandler()
+marcar('middleware')
+from main.apps import precompilar_al_iniciar
+precompilar_al_iniciar()
+marcar('templates precompilados')
+from django.urls import get_resolver
+get_resolver().url_patterns
+marcar('urls y vistas')
+print(json.dumps(fases))
+'''
+
+LINEA_IMPORT = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def host_de_prueba():
+    """Primer host aceptado por ALLOWED_HOSTS que no sea un comodín, para el Client"""
+    for host in settings.ALLOWED_HOSTS:
+        if host != '*' and not host.startswith('.'):
+            return host
+    return 'localhost'
+
+
+class Sonda:
+    """Middleware que anota cuándo entra y sale el request; va intercalado con el real"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        marcas = request.__dict__.setdefault('marcas_sonda', [])
+        marcas.append(time.perf_counter())
+        response = self.get_response(request)
+        marcas.append(time.perf_counter())
+        request.marcas_sonda_finales = marcas
+        return response
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide el arranque en frío de un worker (tiempo de import por módulo y por "
+        "fase) y el costo de cada middleware por request."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticiones', type=int, default=5, help="Arranques en frío a medir")
+        parser.add_argument('--modulos', type=int, default=15, help="Cantidad de módulos a listar")
+        parser.add_argument('--requests', type=int, default=200, help="Requests por URL para el middleware")
+        parser.add_argument('--rifa', type=int, help="Rifa para las URLs de prueba (por defecto la primera)")
+        parser.add_argument('--solo-arranque', action='store_true')
+        parser.add_argument('--solo-middleware', action='store_true')
+
+    def handle(self, *args, **options):
+        if not options['solo_middleware']:
+            self.medir_arranque(options['repeticiones'], options['modulos'])
+        if not options['solo_arranque']:
+            self.medir_middleware(options['rifa'], options['requests'])
+
+    def medir_arranque(self, repeticiones, cantidad_modulos):
+        entorno = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get(
+            'DJANGO_SETTINGS_MODULE', 'rifa.settings.default'
+        ))
+        corridas = []
+        for _ in range(repeticiones + 1):
+            proceso = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', ARRANQUE],
+                env=entorno, capture_output=True, text=True, cwd=settings.BASE_DIR
+            )
+            if proceso.returncode:
+                raise CommandError(proceso.stderr[-2000:])
+            corridas.append((json.loads(proceso.stdout.strip().splitlines()[-1]), proceso.stderr))
+        # La primera corrida puede incluir la compilación de los .pyc
+        corridas = corridas[1:]
+
+        perfil = entorno['DJANGO_SETTINGS_MODULE']
+        if perfil == 'rifa.settings.default':
+            perfil += f" ({entorno.get('DJANGO_ENTORNO', 'dev')})"
+        self.stdout.write(f"Arranque en frío {perfil}, mediana de {repeticiones}:")
+        if entorno.get('PYTHONDONTWRITEBYTECODE'):
+            self.stdout.write(self.style.WARNING(
+                "  PYTHONDONTWRITEBYTECODE está activo: los módulos sin .pyc se compilan en "
+                "cada arranque (conviene correr compileall al armar la imagen)"
+            ))
+        anterior = 0
+        for i, (nombre, _) in enumerate(corridas[0][0]):
+            acumulado = statistics.median(fases[i][1] for fases, _ in corridas)
+            self.stdout.write(f"  {nombre:<32} {(acumulado - anterior) * 1000:8.1f} ms")
+            anterior = acumulado
+        self.stdout.write(f"  {'total':<32} {anterior * 1000:8.1f} ms")
+
+        propio = defaultdict(list)
+        acumulado = defaultdict(list)
+        paquetes = defaultdict(list)
+        for _, importtime in corridas:
+            por_paquete = defaultdict(int)
+            for linea in importtime.splitlines():
+                coincidencia = LINEA_IMPORT.match(linea)
+                if not coincidencia:
+                    continue
+                tiempo_propio, tiempo_acumulado, sangria, modulo = coincidencia.groups()
+                propio[modulo].append(int(tiempo_propio))
+                acumulado[modulo].append(int(tiempo_acumulado))
+                por_paquete[modulo.split('.')[0]] += int(tiempo_propio)
+            for paquete, tiempo in por_paquete.items():
+                paquetes[paquete].append(tiempo)
+
+        self.stdout.write("Import por paquete (tiempo propio sumado):")
+        ranking = sorted(paquetes.items(), key=lambda item: -statistics.median(item[1]))
+        for paquete, tiempos in ranking[:cantidad_modulos]:
+            self.stdout.write(f"  {paquete:<40} {statistics.median(tiempos) / 1000:8.1f} ms")
+
+        self.stdout.write("Módulos más lentos (propio / acumulado):")
+        ranking = sorted(propio.items(), key=lambda item: -statistics.median(item[1]))
+        for modulo, tiempos in ranking[:cantidad_modulos]:
+            self.stdout.write(
+                f"  {modulo:<40} {statistics.median(tiempos) / 1000:8.1f} ms "
+                f"{statistics.median(acumulado[modulo]) / 1000:8.1f} ms"
+            )
+
+        self.stdout.write("Módulos del proyecto (acumulado):")
+        for modulo in sorted(acumulado, key=lambda modulo: -statistics.median(acumulado[modulo])):
+            if modulo.split('.')[0] in ('main', 'rifa'):
+                self.stdout.write(f"  {modulo:<40} {statistics.median(acumulado[modulo]) / 1000:8.1f} ms")
+
+    def medir_middleware(self, rifa_id, cantidad):
+        rifas = Rifa.objects.filter(archivada=False)
+        rifa = rifas.filter(id=rifa_id).first() if rifa_id else rifas.order_by('id').first()
+        if rifa is None:
+            raise CommandError("No hay rifas para medir el middleware")
+        numero = rifa.numeros.order_by('numero').first()
+        if numero is None:
+            raise CommandError(f"La rifa {rifa.nombre} no tiene números")
+
+        urls = {
+            'JSON datos de número': reverse('obtener_datos_numero', args=[numero.id]),
+            'JSON ventas': reverse('ventas_rifa', args=[rifa.id]),
+            'HTML mis rifas': reverse('mis_rifas'),
+        }
+        # Una sonda antes de cada middleware y otra delante de la vista
+        sonda = f'{__name__}.Sonda'
+        capas = list(settings.MIDDLEWARE)
+        intercalado = [item for capa in capas for item in (sonda, capa)] + [sonda]
+
+        Usuario = get_user_model()
+        usuario = Usuario.objects.create_user(
+            **{Usuario.USERNAME_FIELD: f'perfil-arranque-{int(time.time())}'}
+        )
+        try:
+            with override_settings(MIDDLEWARE=intercalado):
+                client = Client(HTTP_HOST=host_de_prueba())
+                client.force_login(usuario)
+                for nombre, url in urls.items():
+                    self.medir_url(client, nombre, url, capas, cantidad)
+        finally:
+            usuario.delete()
+
+    def medir_url(self, client, nombre, url, capas, cantidad):
+        # Tiempo en cada capa: lo que pasa entre su sonda y la siguiente, a la ida y a la vuelta.
+        # 'vista' incluye resolver la URL y los process_view de todas las capas.
+        tiempos = defaultdict(list)
+        totales = []
+        for i in range(cantidad + 10):
+            response = client.get(url)
+            if response.status_code != 200:
+                raise CommandError(f"{url} respondió {response.status_code}")
+            marcas = response.wsgi_request.marcas_sonda_finales
+            if i < 10:
+                continue
+            sondas = len(capas) + 1
+            ida, vuelta = marcas[:sondas], marcas[sondas:][::-1]
+            for j, capa in enumerate(capas):
+                tiempos[capa].append((ida[j + 1] - ida[j]) + (vuelta[j] - vuelta[j + 1]))
+            tiempos['vista'].append(vuelta[-1] - ida[-1])
+            totales.append(vuelta[0] - ida[0])
+
+        middleware = sum(statistics.median(tiempos[capa]) for capa in capas)
+        self.stdout.write(
+            f"{nombre} ({url}): mediana {statistics.median(totales) * 1e6:.0f} µs, "
+            f"middleware {middleware * 1e6:.0f} µs"
+        )
+        for capa in capas + ['vista']:
+            self.stdout.write(f"  {capa:<60} {statistics.median(tiempos[capa]) * 1e6:8.1f} µs")
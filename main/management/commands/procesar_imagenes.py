@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from main.models import Rifa
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera las variantes (tarjeta y detalle, WebP y JPEG) de las imágenes "
+        "de rifas que todavía no las tienen."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--forzar', action='store_true', help="Regenerar aunque ya existan")
+
+    def handle(self, *args, **options):
+        rifas = Rifa.objects.exclude(imagen='').exclude(imagen__isnull=True)
+        procesadas = 0
+        for rifa in rifas.iterator():
+            if options['forzar']:
+                rifa.imagen_variantes = {}
+            antes = rifa.imagen_variantes
+            rifa.procesar_imagen()
+            if rifa.imagen_variantes is not antes:
+                procesadas += 1
+                self.stdout.write(f"{rifa.nombre}: {len(rifa.imagen_variantes.get('tarjeta', []))} variante(s) de tarjeta")
+        self.stdout.write(self.style.SUCCESS(f"{procesadas} imagen(es) procesada(s)"))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from main.tareas import ejecutar_pendientes, identificador_trabajador
+
+
+class Command(BaseCommand):
+    help = "Ejecuta las tareas en segundo plano encoladas en la base de datos."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--una-vez', action='store_true', help="Vaciar la cola y terminar")
+        parser.add_argument('--intervalo', type=float, default=2.0, help="Segundos entre consultas a la cola")
+
+    def handle(self, *args, **options):
+        trabajador = identificador_trabajador()
+        self.stdout.write(f"Trabajador {trabajador} iniciado")
+        try:
+            while True:
+                close_old_connections()
+                ejecutadas = ejecutar_pendientes(trabajador)
+                if ejecutadas:
+                    self.stdout.write(f"{ejecutadas} tarea(s) ejecutada(s)")
+                if options['una_vez']:
+                    break
+                if not ejecutadas:
+                    time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            self.stdout.write("Trabajador detenido")
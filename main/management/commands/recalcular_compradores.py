@@ -0,0 +1,80 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Max, Sum
+
+from main.models import ArchivoRifa, Comprador, CompraRifa, Numero
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruye los totales de los compradores (Comprador y CompraRifa) "
+        "a partir de los números vendidos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        lote = options['lote']
+        # Las rifas archivadas se cuentan desde su archivo (solo conservan la fila del ganador)
+        compras = (
+            Numero.objects.filter(estado='vendido', comprador__isnull=False, rifa__archivada=False)
+            .order_by()
+            .values('comprador_id', 'rifa_id')
+            .annotate(numeros=Count('id'), monto=Sum('rifa__precio_numero'), ultima=Max('fecha_compra'))
+        )
+
+        with transaction.atomic():
+            CompraRifa.objects.all().delete()
+            CompraRifa.objects.bulk_create(
+                (
+                    CompraRifa(
+                        comprador_id=fila['comprador_id'],
+                        rifa_id=fila['rifa_id'],
+                        numeros=fila['numeros'],
+                        monto=fila['monto'],
+                        fecha_ultima_compra=fila['ultima'],
+                    )
+                    for fila in compras.iterator()
+                ),
+                batch_size=lote
+            )
+            existentes = set(Comprador.objects.values_list('id', flat=True))
+            for archivo in ArchivoRifa.objects.select_related('rifa'):
+                CompraRifa.objects.bulk_create(
+                    (
+                        CompraRifa(
+                            comprador_id=comprador_id,
+                            rifa=archivo.rifa,
+                            numeros=numeros,
+                            monto=numeros * archivo.rifa.precio_numero,
+                            fecha_ultima_compra=ultima,
+                        )
+                        for comprador_id, (numeros, ultima) in archivo.leer().compras().items()
+                        if comprador_id in existentes
+                    ),
+                    batch_size=lote
+                )
+
+            Comprador.objects.update(numeros_comprados=0, monto_total=0)
+            totales = (
+                CompraRifa.objects.order_by()
+                .values('comprador_id')
+                .annotate(numeros=Sum('numeros'), monto=Sum('monto'), ultima=Max('fecha_ultima_compra'))
+            )
+            compradores = [
+                Comprador(
+                    id=fila['comprador_id'],
+                    numeros_comprados=fila['numeros'],
+                    monto_total=fila['monto'],
+                    fecha_ultima_compra=fila['ultima'],
+                )
+                for fila in totales
+            ]
+            Comprador.objects.bulk_update(
+                compradores,
+                ['numeros_comprados', 'monto_total', 'fecha_ultima_compra'],
+                batch_size=lote
+            )
+
+        self.stdout.write(f"{len(compradores)} comprador(es) con compras recalculados")
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Coalesce, TruncHour
+
+from main.models import Numero, ResumenRifa, Rifa, VentaHoraria
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruye el resumen de ventas por hora (VentaHoraria) y el resumen "
+        "del catálogo (ResumenRifa) a partir del estado actual de los números."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rifa', type=int, action='append', help="ID de rifa (se puede repetir)")
+
+    def handle(self, *args, **options):
+        # Las archivadas ya no tienen filas de números: se conserva su resumen
+        rifas = Rifa.objects.filter(archivada=False)
+        if options['rifa']:
+            rifas = rifas.filter(id__in=options['rifa'])
+
+        for rifa in rifas.iterator():
+            filas = {}
+            # Los números sin fecha se imputan a la hora de creación de la rifa
+            for estado, campo_fecha in (('vendido', 'fecha_compra'), ('reservado', 'fecha_reserva')):
+                conteos = (
+                    Numero.objects.filter(rifa=rifa, estado=estado)
+                    .annotate(hora=TruncHour(Coalesce(campo_fecha, F('rifa__fecha_creacion'))))
+                    .order_by()
+                    .values('hora')
+                    .annotate(total=Count('id'))
+                )
+                for conteo in conteos:
+                    fila = filas.setdefault(conteo['hora'], VentaHoraria(rifa=rifa, hora=conteo['hora']))
+                    if estado == 'vendido':
+                        fila.vendidos = conteo['total']
+                        fila.monto = conteo['total'] * rifa.precio_numero
+                    else:
+                        fila.reservados = conteo['total']
+
+            with transaction.atomic():
+                VentaHoraria.objects.filter(rifa=rifa).delete()
+                VentaHoraria.objects.bulk_create(filas.values(), batch_size=1000)
+                ResumenRifa.actualizar(rifa)
+
+            self.stdout.write(f"{rifa.nombre}: {len(filas)} hora(s) recalculadas")
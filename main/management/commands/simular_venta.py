@@ -0,0 +1,287 @@
+import logging
+import random
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import got_request_exception
+from django.db import OperationalError, connection
+from django.db.models import Sum
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from main.management.commands.perfil_arranque import host_de_prueba
+from main.models import Comprador, CompraRifa, Numero, Rifa, TransicionNumero, VentaHoraria
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+class Command(BaseCommand):
+    help = (
+        "Simula la venta masiva previa al sorteo: N operadores venden y reservan "
+        "números al azar de una rifa temporal a través de las vistas. Informa "
+        "requests/s, latencias, errores de bloqueo y ventas dobles comparando "
+        "lo confirmado a cada operador con el estado final de los números."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--operadores', type=int, default=8, help="Operadores simultáneos (hilos)")
+        parser.add_argument('--operaciones', type=int, default=50, help="Intentos de venta por operador")
+        parser.add_argument('--numeros', type=int, default=500, help="Tamaño de la rifa temporal")
+        parser.add_argument('--reservas', type=float, default=0.3, help="Proporción de reservas en vez de ventas")
+        parser.add_argument('--azar', type=float, default=0.1, help="Proporción que usa 'Número al azar'")
+        parser.add_argument('--semilla', type=int, default=0)
+        parser.add_argument('--conservar', action='store_true', help="No borra la rifa ni los usuarios al terminar")
+
+    def handle(self, *args, **options):
+        marca = int(time.time() * 1000)
+        Usuario = get_user_model()
+        rifa = Rifa.objects.create(
+            nombre=f"simulacion-{marca}",
+            descripcion="Rifa temporal de la simulación de venta",
+            fecha_sorteo=timezone.now() + timedelta(hours=2),
+            precio_numero=1,
+            cantidad_numeros=options['numeros'],
+        )
+        usuarios = []
+        # Teléfonos únicos por intento: identifican a quién se le confirmó cada venta
+        prefijo = f'99{marca % 10 ** 6:06d}'
+        # Los errores se cuentan en el informe; el traceback de cada uno solo tapa la salida
+        logger = logging.getLogger('django.request')
+        nivel = logger.level
+        try:
+            if not rifa.numeros.exists():
+                # Rifas grandes se generan con una tarea; acá hace falta tenerlas ya
+                rifa.generar_numeros()
+            for i in range(options['operadores']):
+                usuarios.append(Usuario.objects.create_user(
+                    **{Usuario.USERNAME_FIELD: f'simulacion-{marca}-{i}'}
+                ))
+            logger.setLevel(logging.CRITICAL)
+            resultado = self.simular(rifa, usuarios, prefijo, options)
+            self.informar(rifa, resultado, options)
+        finally:
+            # Todo lo temporal se borra aunque la simulación falle a mitad de camino
+            logger.setLevel(nivel)
+            if not options['conservar']:
+                rifa.delete()
+                Usuario.objects.filter(pk__in=[usuario.pk for usuario in usuarios]).delete()
+                Comprador.objects.filter(telefono__startswith=prefijo).delete()
+
+    def simular(self, rifa, usuarios, prefijo, options):
+        ids = list(rifa.numeros.values_list('id', flat=True))
+        host = host_de_prueba()
+        barrera = threading.Barrier(len(usuarios))
+        mediciones = []
+        ventas = []
+        errores = []
+        # El Client guarda las excepciones con una señal global, compartida entre
+        # hilos: acá se anotan por hilo (la vista corre en el hilo que pide)
+        excepciones = {}
+
+        def anotar_excepcion(sender, **kwargs):
+            excepciones[threading.get_ident()] = sys.exc_info()[1]
+
+        def pedir(tipo, funcion):
+            inicio = time.perf_counter()
+            response = funcion()
+            latencia = time.perf_counter() - inicio
+            excepcion = excepciones.pop(threading.get_ident(), None)
+            if isinstance(excepcion, OperationalError):
+                estado = 'bloqueo'
+                errores.append(('bloqueo', str(excepcion)))
+            elif excepcion is not None:
+                estado = 'error'
+                errores.append(('error', repr(excepcion)))
+            elif response.status_code == 409:
+                # Otro operador cambió el número entre la consulta y la venta
+                estado = 'conflicto'
+            else:
+                estado = 'ok' if response.status_code == 200 else f'http {response.status_code}'
+            mediciones.append((tipo, latencia, estado))
+            return response.json() if estado == 'ok' else None
+
+        def operador(indice, client):
+            azar = random.Random(options['semilla'] * 1000 + indice)
+            reservas_propias = []
+            try:
+                barrera.wait()
+                for i in range(options['operaciones']):
+                    telefono = f'{prefijo}{indice:03d}{i:04d}'
+                    nombre = f'Cliente {indice}-{i}'
+
+                    if reservas_propias and azar.random() < 0.5:
+                        # Confirma una reserva propia al mismo comprador
+                        numero_id, telefono, nombre = reservas_propias.pop()
+                        visto = 'reservado'
+                        estado = 'vendido'
+                    elif azar.random() < options['azar']:
+                        datos = pedir('numero al azar', lambda: client.post(
+                            reverse('numeros_aleatorios', args=[rifa.id]),
+                            {'cantidad': 1, 'reservar': 1, 'nombre': nombre, 'telefono': telefono}
+                        ))
+                        for numero in (datos or {}).get('numeros', []):
+                            reservas_propias.append((numero['id'], telefono, nombre))
+                        continue
+                    else:
+                        # Como en la grilla: se mira el número y se vende solo si está libre
+                        numero_id = azar.choice(ids)
+                        datos = pedir('datos', lambda: client.get(
+                            reverse('obtener_datos_numero', args=[numero_id])
+                        ))
+                        if not datos or datos['estado'] != 'disponible':
+                            continue
+                        visto = datos['estado']
+                        estado = 'reservado' if azar.random() < options['reservas'] else 'vendido'
+
+                    datos = pedir('actualizar', lambda: client.post(
+                        reverse('actualizar_estado_numero', args=[numero_id]),
+                        {'estado': estado, 'estado_anterior': visto, 'nombre': nombre, 'telefono': telefono}
+                    ))
+                    if datos and datos.get('success'):
+                        if estado == 'vendido':
+                            ventas.append((numero_id, telefono))
+                        else:
+                            reservas_propias.append((numero_id, telefono, nombre))
+            finally:
+                connection.close()
+
+        # El login va antes de arrancar: un hilo que falle antes de la barrera trabaría al resto
+        clients = []
+        for usuario in usuarios:
+            client = Client(HTTP_HOST=host, raise_request_exception=False)
+            client.force_login(usuario)
+            clients.append(client)
+        hilos = [
+            threading.Thread(target=operador, args=(i, client)) for i, client in enumerate(clients)
+        ]
+        got_request_exception.connect(anotar_excepcion)
+        inicio = time.perf_counter()
+        try:
+            for hilo in hilos:
+                hilo.start()
+            for hilo in hilos:
+                hilo.join()
+        finally:
+            got_request_exception.disconnect(anotar_excepcion)
+        return {
+            'duracion': time.perf_counter() - inicio,
+            'mediciones': mediciones,
+            'ventas': ventas,
+            'errores': errores,
+        }
+
+    def informar(self, rifa, resultado, options):
+        mediciones = resultado['mediciones']
+        duracion = resultado['duracion']
+        db = settings.DATABASES['default']
+        self.stdout.write(f"Motor: {db['ENGINE']} {db.get('OPTIONS', {})}")
+        self.stdout.write(
+            f"Rifa de {options['numeros']} números, {options['operadores']} operadores x "
+            f"{options['operaciones']} intentos"
+        )
+        self.stdout.write(
+            f"Requests: {len(mediciones)} en {duracion:.2f}s ({len(mediciones) / duracion:.1f}/s)"
+        )
+
+        por_tipo = defaultdict(list)
+        for tipo, latencia, _ in mediciones:
+            por_tipo[tipo].append(latencia)
+        por_tipo['total'] = [latencia for _, latencia, _ in mediciones]
+        self.stdout.write("Latencia (ms):" + ''.join(f"{'p' + str(p):>9}" for p in PERCENTILES) + f"{'máx':>9}")
+        for tipo, latencias in por_tipo.items():
+            if len(latencias) < 2:
+                continue
+            cortes = statistics.quantiles(latencias, n=100, method='inclusive')
+            valores = [cortes[p - 1] for p in PERCENTILES] + [max(latencias)]
+            self.stdout.write(
+                f"  {tipo:<14}{len(latencias):>6}" + ''.join(f"{valor * 1000:>9.1f}" for valor in valores)
+            )
+
+        resultados = defaultdict(int)
+        for _, _, estado in mediciones:
+            resultados[estado] += 1
+        self.stdout.write(
+            "Respuestas: " + ', '.join(f"{estado} {cantidad}" for estado, cantidad in sorted(resultados.items()))
+        )
+        bloqueos = [mensaje for tipo, mensaje in resultado['errores'] if tipo == 'bloqueo']
+        otros = [mensaje for tipo, mensaje in resultado['errores'] if tipo == 'error']
+        estilo = self.style.WARNING if bloqueos else self.style.SUCCESS
+        self.stdout.write(estilo(
+            f"Errores de bloqueo: {len(bloqueos)}" + (f" (ej: {bloqueos[0]})" if bloqueos else '')
+        ))
+        if otros:
+            self.stdout.write(self.style.ERROR(f"Otros errores: {len(otros)} (ej: {otros[0]})"))
+
+        self.verificar(rifa, resultado['ventas'])
+
+    def verificar(self, rifa, ventas):
+        """Contrasta las ventas confirmadas a los operadores con el estado final"""
+        finales = {
+            pk: (estado, telefono)
+            for pk, estado, telefono in Numero.objects.filter(rifa=rifa).values_list(
+                'id', 'estado', 'telefono_comprador'
+            )
+        }
+        compradores = defaultdict(set)
+        for numero_id, telefono in ventas:
+            compradores[numero_id].add(telefono)
+
+        dobles = {numero_id for numero_id, telefonos in compradores.items() if len(telefonos) > 1}
+        # Ventas confirmadas que no quedaron: otro operador pisó el número después
+        perdidas = [
+            (numero_id, telefono) for numero_id, telefonos in compradores.items()
+            for telefono in telefonos if finales[numero_id] != ('vendido', telefono)
+        ]
+        # Ventas que quedaron aunque el operador recibió un error
+        sin_confirmar = [
+            numero_id for numero_id, (estado, telefono) in finales.items()
+            if estado == 'vendido' and telefono not in compradores.get(numero_id, ())
+        ]
+        self.stdout.write(f"Ventas confirmadas: {len(ventas)} sobre {len(compradores)} números")
+        estilo = self.style.ERROR if dobles or perdidas else self.style.SUCCESS
+        self.stdout.write(estilo(
+            f"Números vendidos a más de un comprador: {len(dobles)}; "
+            f"ventas confirmadas que no quedaron registradas: {len(perdidas)}"
+        ))
+        estilo = self.style.WARNING if sin_confirmar else self.style.SUCCESS
+        self.stdout.write(estilo(f"Ventas registradas sin confirmar al operador: {len(sin_confirmar)}"))
+        problemas = []
+        if dobles:
+            problemas.append(f"{len(dobles)} número(s) vendidos a más de un comprador")
+        if perdidas:
+            problemas.append(f"{len(perdidas)} venta(s) confirmadas que no quedaron registradas")
+
+        # Los contadores incrementales deben coincidir con el estado final
+        conteo = defaultdict(int)
+        for estado, _ in finales.values():
+            conteo[estado] += 1
+        resumen = VentaHoraria.objects.filter(rifa=rifa).aggregate(
+            vendidos=Sum('vendidos'), reservados=Sum('reservados')
+        )
+        compras = CompraRifa.objects.filter(rifa=rifa).aggregate(numeros=Sum('numeros'))['numeros'] or 0
+        vendidos_con_comprador = Numero.objects.filter(
+            rifa=rifa, estado='vendido', comprador__isnull=False
+        ).count()
+        transiciones = TransicionNumero.objects.filter(rifa=rifa, estado_nuevo='vendido').count()
+        contadores = [
+            ('ventas por hora (vendidos)', resumen['vendidos'] or 0, conteo['vendido']),
+            ('ventas por hora (reservados)', resumen['reservados'] or 0, conteo['reservado']),
+            ('compras por comprador', compras, vendidos_con_comprador),
+        ]
+        for nombre, registrado, real in contadores:
+            estilo = self.style.SUCCESS if registrado == real else self.style.ERROR
+            self.stdout.write(estilo(f"  {nombre}: {registrado} registrados, {real} reales"))
+            if registrado != real:
+                problemas.append(f"{nombre}: {registrado} registrados, {real} reales")
+        self.stdout.write(f"  transiciones a vendido en la bitácora: {transiciones}")
+        # Salida distinta de cero para que CI detecte la inconsistencia
+        if problemas:
+            raise CommandError("La simulación dejó datos inconsistentes: " + '; '.join(problemas))
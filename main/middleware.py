@@ -0,0 +1,40 @@
+"""Middleware de páginas HTML que no corre para los endpoints JSON.
+
+Las vistas marcadas con ``@vista_json`` no muestran mensajes ni se embeben en
+frames. Las subclases de este módulo deciden con la vista ya resuelta
+(``process_view`` / ``request.resolver_match``), así que saltearlas no cuesta
+una resolución extra de la URL.
+"""
+from django.contrib.messages import middleware as messages
+from django.middleware import clickjacking
+
+
+def vista_json(vista):
+    """Marca una vista que solo devuelve JSON"""
+    vista.vista_json = True
+    return vista
+
+
+def es_vista_json(vista):
+    return getattr(vista, 'vista_json', False)
+
+
+class MessageMiddleware(messages.MessageMiddleware):
+    """Prepara el almacenamiento de mensajes solo para vistas HTML"""
+
+    def process_request(self, request):
+        pass
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not es_vista_json(view_func):
+            super().process_request(request)
+
+
+class XFrameOptionsMiddleware(clickjacking.XFrameOptionsMiddleware):
+    """Agrega X-Frame-Options solo a las respuestas de vistas HTML"""
+
+    def process_response(self, request, response):
+        resolver_match = getattr(request, 'resolver_match', None)
+        if resolver_match is not None and es_vista_json(resolver_match.func):
+            return response
+        return super().process_response(request, response)
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0002_alter_transaccion_cantidad_numeros'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='numero',
+            name='main_numero_rifa_id_ec9445_idx',
+        ),
+        migrations.AddIndex(
+            model_name='numero',
+            index=models.Index(fields=['rifa', 'estado', 'numero'], name='numero_rifa_estado_num_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='numero',
+            index=models.Index(fields=['fecha_compra'], name='numero_fecha_compra_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='numero',
+            index=models.Index(condition=models.Q(('estado', 'vendido')), fields=['rifa', 'fecha_compra'], name='numero_vendidos_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='numero',
+            index=models.Index(condition=models.Q(('estado', 'reservado')), fields=['fecha_reserva'], name='numero_reservados_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rifa',
+            index=models.Index(fields=['-fecha_creacion'], name='rifa_creacion_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rifa',
+            index=models.Index(fields=['estado', '-fecha_creacion'], name='rifa_estado_creacion_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaccion',
+            index=models.Index(fields=['-fecha_creacion'], name='transaccion_creacion_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaccion',
+            index=models.Index(fields=['rifa', '-fecha_creacion'], name='transaccion_rifa_creacion_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaccion',
+            index=models.Index(fields=['estado', '-fecha_creacion'], name='transaccion_estado_creac_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0003_auditoria_indices'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VentaHoraria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hora', models.DateTimeField()),
+                ('vendidos', models.IntegerField(default=0)),
+                ('reservados', models.IntegerField(default=0)),
+                ('monto', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('rifa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ventas_horarias', to='main.rifa')),
+            ],
+            options={
+                'verbose_name': 'Venta por hora',
+                'verbose_name_plural': 'Ventas por hora',
+                'ordering': ['rifa', 'hora'],
+                'unique_together': {('rifa', 'hora')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_numero_fecha_actualizacion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rifa',
+            name='imagen_variantes',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0007_tarea'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Comprador',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('telefono', models.CharField(max_length=20, unique=True)),
+                ('nombre', models.CharField(blank=True, max_length=100)),
+                ('numeros_comprados', models.IntegerField(default=0)),
+                ('monto_total', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_ultima_compra', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Comprador',
+                'verbose_name_plural': 'Compradores',
+                'ordering': ['-numeros_comprados'],
+                'indexes': [models.Index(fields=['-numeros_comprados'], name='comprador_numeros_idx'), models.Index(fields=['-monto_total'], name='comprador_monto_idx')],
+            },
+        ),
+        migrations.AddField(
+            model_name='numero',
+            name='comprador',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='numeros', to='main.comprador'),
+        ),
+        migrations.AddField(
+            model_name='transaccion',
+            name='comprador',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transacciones', to='main.comprador'),
+        ),
+        migrations.CreateModel(
+            name='CompraRifa',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('numeros', models.IntegerField(default=0)),
+                ('monto', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('fecha_ultima_compra', models.DateTimeField(blank=True, null=True)),
+                ('comprador', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='compras', to='main.comprador')),
+                ('rifa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='compras', to='main.rifa')),
+            ],
+            options={
+                'verbose_name': 'Compra por rifa',
+                'verbose_name_plural': 'Compras por rifa',
+                'ordering': ['rifa', '-numeros'],
+                'indexes': [models.Index(fields=['rifa', '-numeros'], name='compra_rifa_numeros_idx'), models.Index(fields=['rifa', '-monto'], name='compra_rifa_monto_idx')],
+                'unique_together': {('comprador', 'rifa')},
+            },
+        ),
+    ]
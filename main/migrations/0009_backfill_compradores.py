@@ -0,0 +1,125 @@
+import re
+from collections import defaultdict
+
+from django.db import migrations, transaction
+from django.db.models import Count, Max, Sum
+
+LOTE = 2000
+
+_NO_DIGITOS = re.compile(r'\D')
+
+
+def normalizar_telefono(telefono):
+    """Copia congelada de main.telefonos.normalizar_telefono al momento de esta migración"""
+    if not telefono:
+        return ''
+    digitos = _NO_DIGITOS.sub('', telefono)
+    if digitos.startswith('00'):
+        digitos = digitos[2:]
+    return digitos
+
+
+def vincular(modelo, campo_telefono, campo_nombre, Comprador):
+    """Crea los compradores y vincula las filas, de a LOTE filas por transacción"""
+    ultimo = 0
+    while True:
+        filas = list(
+            modelo.objects.filter(id__gt=ultimo, comprador__isnull=True)
+            .exclude(**{f'{campo_telefono}__isnull': True})
+            .exclude(**{campo_telefono: ''})
+            .order_by('id')
+            .values_list('id', campo_telefono, campo_nombre)[:LOTE]
+        )
+        if not filas:
+            return
+        ultimo = filas[-1][0]
+
+        por_telefono = defaultdict(list)
+        nombres = {}
+        for pk, telefono, nombre in filas:
+            telefono = normalizar_telefono(telefono)
+            if telefono:
+                por_telefono[telefono].append(pk)
+                nombres[telefono] = nombre or nombres.get(telefono, '')
+
+        with transaction.atomic():
+            Comprador.objects.bulk_create(
+                [Comprador(telefono=telefono, nombre=nombre or '') for telefono, nombre in nombres.items()],
+                ignore_conflicts=True
+            )
+            ids = dict(Comprador.objects.filter(telefono__in=list(por_telefono)).values_list('telefono', 'id'))
+            for telefono, pks in por_telefono.items():
+                modelo.objects.filter(id__in=pks).update(comprador_id=ids[telefono])
+
+
+def calcular_totales(Numero, Comprador, CompraRifa):
+    compras = (
+        Numero.objects.filter(estado='vendido', comprador__isnull=False)
+        .order_by()
+        .values('comprador_id', 'rifa_id')
+        .annotate(numeros=Count('id'), monto=Sum('rifa__precio_numero'), ultima=Max('fecha_compra'))
+    )
+    CompraRifa.objects.bulk_create(
+        (
+            CompraRifa(
+                comprador_id=fila['comprador_id'],
+                rifa_id=fila['rifa_id'],
+                numeros=fila['numeros'],
+                monto=fila['monto'],
+                fecha_ultima_compra=fila['ultima'],
+            )
+            for fila in compras.iterator()
+        ),
+        batch_size=LOTE
+    )
+
+    totales = (
+        CompraRifa.objects.order_by()
+        .values('comprador_id')
+        .annotate(numeros=Sum('numeros'), monto=Sum('monto'), ultima=Max('fecha_ultima_compra'))
+    )
+    Comprador.objects.bulk_update(
+        (
+            Comprador(
+                id=fila['comprador_id'],
+                numeros_comprados=fila['numeros'],
+                monto_total=fila['monto'],
+                fecha_ultima_compra=fila['ultima'],
+            )
+            for fila in totales.iterator()
+        ),
+        ['numeros_comprados', 'monto_total', 'fecha_ultima_compra'],
+        batch_size=LOTE
+    )
+
+
+def backfill(apps, schema_editor):
+    Comprador = apps.get_model('main', 'Comprador')
+    CompraRifa = apps.get_model('main', 'CompraRifa')
+    Numero = apps.get_model('main', 'Numero')
+    Transaccion = apps.get_model('main', 'Transaccion')
+
+    vincular(Numero, 'telefono_comprador', 'nombre_comprador', Comprador)
+    vincular(Transaccion, 'telefono_cliente', 'nombre_cliente', Comprador)
+    with transaction.atomic():
+        calcular_totales(Numero, Comprador, CompraRifa)
+
+
+def deshacer(apps, schema_editor):
+    apps.get_model('main', 'CompraRifa').objects.all().delete()
+    apps.get_model('main', 'Numero').objects.update(comprador=None)
+    apps.get_model('main', 'Transaccion').objects.update(comprador=None)
+    apps.get_model('main', 'Comprador').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+    # Cada lote se confirma por separado para no bloquear la base durante todo el backfill
+    atomic = False
+
+    dependencies = [
+        ('main', '0008_comprador'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, deshacer),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0009_backfill_compradores'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rifa',
+            name='archivada',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.CreateModel(
+            name='ArchivoRifa',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('estados', models.BinaryField()),
+                ('datos', models.BinaryField()),
+                ('disponibles', models.PositiveIntegerField(default=0)),
+                ('reservados', models.PositiveIntegerField(default=0)),
+                ('vendidos', models.PositiveIntegerField(default=0)),
+                ('fecha_archivado', models.DateTimeField(auto_now_add=True)),
+                ('rifa', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='archivo', to='main.rifa')),
+            ],
+            options={
+                'verbose_name': 'Archivo de rifa',
+                'verbose_name_plural': 'Archivos de rifas',
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-19 08:45
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0010_archivo_rifa'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransicionNumero',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('numero', models.PositiveIntegerField()),
+                ('estado_anterior', models.CharField(choices=[('disponible', 'Disponible'), ('reservado', 'Reservado'), ('vendido', 'Vendido')], max_length=20)),
+                ('estado_nuevo', models.CharField(choices=[('disponible', 'Disponible'), ('reservado', 'Reservado'), ('vendido', 'Vendido')], max_length=20)),
+                ('nombre_comprador', models.CharField(blank=True, max_length=100, null=True)),
+                ('telefono_comprador', models.CharField(blank=True, max_length=20, null=True)),
+                ('origen', models.CharField(choices=[('gestion', 'Gestión de números'), ('admin', 'Admin'), ('transaccion', 'Transacción'), ('reserva_aleatoria', 'Reserva al azar')], max_length=20)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('comprador', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transiciones', to='main.comprador')),
+                ('comprador_anterior', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='main.comprador')),
+                ('operador', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transiciones_numeros', to=settings.AUTH_USER_MODEL)),
+                ('rifa', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='transiciones', to='main.rifa')),
+                ('transaccion', models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transiciones', to='main.transaccion')),
+            ],
+            options={
+                'verbose_name': 'Transición de número',
+                'verbose_name_plural': 'Transiciones de números',
+                'ordering': ['-fecha'],
+                'indexes': [models.Index(fields=['rifa', 'numero', '-fecha'], name='transicion_numero_idx'), models.Index(fields=['operador', '-fecha'], name='transicion_operador_idx')],
+            },
+        ),
+    ]
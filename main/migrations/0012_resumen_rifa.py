@@ -0,0 +1,88 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:02
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def datos_imagen(variantes, tipo):
+    """Copia congelada de main.imagenes.datos_imagen al momento de esta migración"""
+    lista = variantes.get(tipo) or []
+    if not lista:
+        return None
+    menor = lista[0]
+    return {
+        'src': default_storage.url(menor['jpeg']),
+        'ancho': menor['ancho'],
+        'alto': menor['alto'],
+        'srcset_webp': ', '.join(
+            f"{default_storage.url(v['webp'])} {v['ancho']}w" for v in lista
+        ),
+        'srcset_jpeg': ', '.join(
+            f"{default_storage.url(v['jpeg'])} {v['ancho']}w" for v in lista
+        ),
+    }
+
+
+def crear_resumenes(apps, schema_editor):
+    Rifa = apps.get_model('main', 'Rifa')
+    ArchivoRifa = apps.get_model('main', 'ArchivoRifa')
+    ResumenRifa = apps.get_model('main', 'ResumenRifa')
+
+    archivados = dict(ArchivoRifa.objects.values_list('rifa_id', 'vendidos'))
+    rifas = Rifa.objects.annotate(
+        vendidos=Count('numeros', filter=Q(numeros__estado='vendido'))
+    ).order_by('id')
+    ahora = django.utils.timezone.now()
+    resumenes = []
+    for rifa in rifas.iterator():
+        imagen = {}
+        if rifa.imagen:
+            imagen = datos_imagen(rifa.imagen_variantes, 'tarjeta') or {'src': default_storage.url(rifa.imagen.name)}
+        resumenes.append(ResumenRifa(
+            rifa_id=rifa.pk,
+            nombre=rifa.nombre,
+            slug=rifa.slug,
+            estado=rifa.estado,
+            fecha_sorteo=rifa.fecha_sorteo,
+            precio_numero=rifa.precio_numero,
+            cantidad_numeros=rifa.cantidad_numeros,
+            vendidos=archivados.get(rifa.pk, rifa.vendidos),
+            imagen=imagen,
+            fecha_actualizacion=ahora,
+        ))
+    ResumenRifa.objects.bulk_create(resumenes, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0011_transicion_numero'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenRifa',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100)),
+                ('slug', models.SlugField(max_length=100)),
+                ('estado', models.CharField(choices=[('activa', 'Activa'), ('completada', 'Completada'), ('cancelada', 'Cancelada'), ('sorteada', 'Sorteada')], max_length=20)),
+                ('fecha_sorteo', models.DateTimeField()),
+                ('precio_numero', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('cantidad_numeros', models.PositiveIntegerField()),
+                ('vendidos', models.IntegerField(default=0)),
+                ('imagen', models.JSONField(blank=True, default=dict)),
+                ('fecha_actualizacion', models.DateTimeField(default=django.utils.timezone.now)),
+                ('rifa', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='resumen', to='main.rifa')),
+            ],
+            options={
+                'verbose_name': 'Resumen de rifa',
+                'verbose_name_plural': 'Resúmenes de rifas',
+                'indexes': [models.Index(fields=['estado', 'fecha_sorteo'], name='resumen_catalogo_idx')],
+            },
+        ),
+        migrations.RunPython(crear_resumenes, migrations.RunPython.noop),
+    ]
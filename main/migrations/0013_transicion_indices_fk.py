@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:29
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0012_resumen_rifa'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transicionnumero',
+            name='comprador',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transiciones', to='main.comprador'),
+        ),
+        migrations.AlterField(
+            model_name='transicionnumero',
+            name='comprador_anterior',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='main.comprador'),
+        ),
+        migrations.AlterField(
+            model_name='transicionnumero',
+            name='transaccion',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='transiciones', to='main.transaccion'),
+        ),
+    ]
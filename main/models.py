@@ -1,10 +1,44 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction, IntegrityError
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
-from django.db.models.signals import post_save
+from django.db.models import F, Window
+from django.db.models.functions import Coalesce, RowNumber
+from django.db.models.signals import post_save, pre_delete
 from django.dispatch import receiver
 import random
 import string
+from collections import Counter, namedtuple
+
+from .telefonos import normalizar_telefono
+
+# Proporción de números libres desde la que conviene sortear dentro del rango
+DENSIDAD_MINIMA_SONDEO = 0.1
+
+# Cambio de un número ya guardado, para Rifa.registrar_cambios
+CambioNumero = namedtuple('CambioNumero', [
+    'numero', 'anterior', 'nuevo', 'comprador_anterior', 'comprador', 'nombre', 'telefono'
+])
+
+class RifaQuerySet(models.QuerySet):
+    def con_numeros_vendidos(self):
+        """Anota los números vendidos con una subconsulta, sin un COUNT por rifa"""
+        vendidos = Numero.objects.filter(
+            rifa=models.OuterRef('pk'), estado='vendido'
+        ).order_by().values('rifa').annotate(total=models.Count('id')).values('total')
+        # Las rifas archivadas ya no tienen filas de números: se usa el total del archivo
+        archivados = ArchivoRifa.objects.filter(rifa=models.OuterRef('pk')).values('vendidos')
+        return self.annotate(
+            _numeros_vendidos=models.Case(
+                models.When(archivada=True, then=models.Subquery(archivados)),
+                default=Coalesce(
+                    models.Subquery(vendidos, output_field=models.IntegerField()),
+                    models.Value(0)
+                ),
+                output_field=models.IntegerField()
+            )
+        )
+
 
 class Rifa(models.Model):
     ESTADO_CHOICES = [
@@ -46,6 +80,12 @@ class Rifa(models.Model):
         help_text="Máximo de números que un usuario puede comprar"
     )
     numeros_generados = models.BooleanField(default=False)
+    # Versiones redimensionadas de la imagen (ver main/imagenes.py)
+    imagen_variantes = models.JSONField(default=dict, blank=True, editable=False)
+    # Los números de las rifas archivadas están en ArchivoRifa (ver main/archivo.py)
+    archivada = models.BooleanField(default=False, editable=False)
+    
+    objects = RifaQuerySet.as_manager()
     
     class Meta:
         verbose_name = 'Rifa'
@@ -54,30 +94,46 @@ class Rifa(models.Model):
         indexes = [
             models.Index(fields=['estado', 'fecha_sorteo']),
             models.Index(fields=['fecha_sorteo']),
+            # Listado de mis_rifas (orden por defecto, con y sin filtro de estado)
+            models.Index(fields=['-fecha_creacion'], name='rifa_creacion_idx'),
+            models.Index(fields=['estado', '-fecha_creacion'], name='rifa_estado_creacion_idx'),
         ]
     
     def __str__(self):
         return self.nombre
     
-    def generar_numeros(self):
-        """Genera los números automáticamente para la rifa"""
+    def generar_numeros(self, progreso=None, lote=5000):
+        """Genera los números automáticamente para la rifa
+
+        Se crean en lotes e ignorando los que ya existen, así una tarea
+        interrumpida puede reintentarse. ``progreso(procesados, total)`` se
+        llama después de cada lote.
+        """
         if not self.numeros_generados:
-            numeros_a_crear = []
-            for numero in range(1, self.cantidad_numeros + 1):
-                numeros_a_crear.append(
+            for inicio in range(1, self.cantidad_numeros + 1, lote):
+                fin = min(inicio + lote, self.cantidad_numeros + 1)
+                numeros_a_crear = [
                     Numero(
                         rifa=self,
                         numero=numero,
                         estado='disponible'
                     )
-                )
-            # Crear todos los números en lote para mejor rendimiento
-            Numero.objects.bulk_create(numeros_a_crear)
+                    for numero in range(inicio, fin)
+                ]
+                # Crear todos los números en lote para mejor rendimiento
+                Numero.objects.bulk_create(numeros_a_crear, ignore_conflicts=True)
+                if progreso:
+                    progreso(fin - 1, self.cantidad_numeros)
             self.numeros_generados = True
             self.save()
     
     @property
     def numeros_vendidos(self):
+        # Usa el valor anotado por con_numeros_vendidos() si está disponible
+        if hasattr(self, '_numeros_vendidos'):
+            return self._numeros_vendidos
+        if self.archivada:
+            return self.archivo.vendidos
         return self.numeros.filter(estado='vendido').count()
     
     @property
@@ -90,22 +146,230 @@ class Rifa(models.Model):
             return 0
         return (self.numeros_vendidos / self.cantidad_numeros) * 100
     
+    def registrar_ventas(self, transiciones):
+        """Actualiza el resumen horario con una lista de (estado_anterior, estado_nuevo)"""
+        vendidos = reservados = 0
+        for anterior, nuevo in transiciones:
+            if anterior == nuevo:
+                continue
+            vendidos += (nuevo == 'vendido') - (anterior == 'vendido')
+            reservados += (nuevo == 'reservado') - (anterior == 'reservado')
+        VentaHoraria.registrar(self, vendidos=vendidos, reservados=reservados)
+        ResumenRifa.sumar_vendidos(self, vendidos)
+    
+    def registrar_compras(self, cambios):
+        """Actualiza los totales de los compradores con una lista de
+        (comprador_anterior_id, estado_anterior, comprador_nuevo_id, estado_nuevo)"""
+        movimientos = Counter()
+        for comprador_anterior, anterior, comprador_nuevo, nuevo in cambios:
+            if anterior == 'vendido' and comprador_anterior:
+                movimientos[comprador_anterior] -= 1
+            if nuevo == 'vendido' and comprador_nuevo:
+                movimientos[comprador_nuevo] += 1
+        CompraRifa.registrar(self, movimientos)
+    
+    def registrar_cambios(self, cambios, operador=None, origen='', transaccion=None):
+        """Registra una lista de ``CambioNumero`` ya guardados: resumen horario,
+        totales de compradores y bitácora.
+
+        Va en la misma transacción que los cambios, con el estado anterior
+        leído de la fila bloqueada (``select_for_update``): si no, dos
+        operadores que vieron el mismo estado registran los dos la transición.
+        """
+        if not cambios:
+            return
+        if not transaction.get_connection().in_atomic_block:
+            raise RuntimeError("registrar_cambios tiene que ir en la transacción que guarda los números")
+        self.registrar_ventas([(cambio.anterior, cambio.nuevo) for cambio in cambios])
+        self.registrar_compras([
+            (cambio.comprador_anterior, cambio.anterior, cambio.comprador, cambio.nuevo)
+            for cambio in cambios
+        ])
+        TransicionNumero.registrar(self, cambios, operador=operador, origen=origen, transaccion=transaccion)
+    
+    def descontar_compras(self):
+        """Resta de los compradores lo comprado en esta rifa, antes de borrar sus números"""
+        for comprador_id, numeros, monto in self.compras.values_list('comprador_id', 'numeros', 'monto'):
+            Comprador.objects.filter(pk=comprador_id).update(
+                numeros_comprados=F('numeros_comprados') - numeros,
+                monto_total=F('monto_total') - monto,
+            )
+        self.compras.all().delete()
+    
+    def numeros_aleatorios(self, cantidad):
+        """Elige ``cantidad`` números disponibles al azar, con probabilidad uniforme.
+
+        Devuelve una lista de ``(id, numero)`` sin traer todos los disponibles:
+        se sortean números del rango y se consultan contra el índice
+        (rifa, estado, numero). Si quedan pocos libres (rifa casi vendida) se
+        sortean posiciones entre los disponibles y se resuelven en una sola
+        consulta numerada sobre el mismo índice.
+        """
+        disponibles = self.numeros.filter(estado='disponible').order_by()
+        elegidos = {}
+
+        def sondear(muestra):
+            faltan = cantidad - len(elegidos)
+            sondeo = random.sample(range(1, self.cantidad_numeros + 1), min(self.cantidad_numeros, muestra))
+            encontrados = [
+                fila for fila in disponibles.filter(numero__in=sondeo).values_list('id', 'numero')
+                if fila[0] not in elegidos
+            ]
+            random.shuffle(encontrados)
+            elegidos.update(encontrados[:faltan])
+            return len(elegidos) == cantidad
+
+        # Primero un sondeo corto, que alcanza mientras la rifa tenga muchos libres
+        if sondear(cantidad * 4 + 16):
+            return list(elegidos.items())
+
+        total = disponibles.count()
+        if total <= cantidad:
+            return list(disponibles.order_by('numero').values_list('id', 'numero'))
+
+        densidad = total / self.cantidad_numeros
+        if densidad >= DENSIDAD_MINIMA_SONDEO:
+            for _ in range(3):
+                # Se sortean de más para que casi siempre alcance una ronda
+                if sondear(int((cantidad - len(elegidos)) / densidad * 1.5) + 8):
+                    return list(elegidos.items())
+
+        faltan = cantidad - len(elegidos)
+        posiciones = random.sample(range(1, total + 1), min(total, faltan + len(elegidos)))
+        filas = disponibles.annotate(
+            posicion=Window(RowNumber(), order_by='numero')
+        ).filter(posicion__in=posiciones).values_list('id', 'numero')
+        filas = [fila for fila in filas if fila[0] not in elegidos]
+        random.shuffle(filas)
+        elegidos.update(filas[:faltan])
+        return list(elegidos.items())
+
+    def reservar_numeros_aleatorios(self, cantidad, nombre=None, telefono=None, operador=None):
+        """Reserva ``cantidad`` números disponibles al azar y devuelve los reservados.
+
+        Los candidatos se bloquean (en motores que lo soportan) y se vuelve a
+        comprobar que sigan disponibles; los que otro operador tomó en el
+        medio se reemplazan con un nuevo sorteo.
+        """
+        reservados = []
+        for _ in range(5):
+            faltan = cantidad - len(reservados)
+            candidatos = dict(self.numeros_aleatorios(faltan))
+            if not candidatos:
+                break
+            ahora = timezone.now()
+            with transaction.atomic():
+                comprador = Comprador.obtener(telefono, nombre)
+                libres = list(
+                    self.numeros.select_for_update(skip_locked=True)
+                    .filter(id__in=candidatos, estado='disponible')
+                    .values_list('id', flat=True)
+                )
+                Numero.objects.filter(id__in=libres).update(
+                    estado='reservado',
+                    fecha_reserva=ahora,
+                    nombre_comprador=nombre or None,
+                    telefono_comprador=telefono or None,
+                    comprador=comprador,
+                    fecha_actualizacion=ahora,
+                )
+                self.registrar_cambios(
+                    [
+                        CambioNumero(
+                            candidatos[numero_id], 'disponible', 'reservado', None,
+                            comprador.pk if comprador else None, nombre or None, telefono or None
+                        )
+                        for numero_id in libres
+                    ],
+                    operador=operador,
+                    origen='reserva_aleatoria'
+                )
+            reservados.extend((numero_id, candidatos[numero_id]) for numero_id in libres)
+            if len(reservados) == cantidad:
+                break
+        return reservados
+
     @property
     def esta_activa(self):
         return self.estado == 'activa' and timezone.now() < self.fecha_sorteo
     
+    def procesar_imagen(self):
+        """Genera las variantes de la imagen si cambió desde la última vez"""
+        if not self.imagen:
+            if not self.imagen_variantes:
+                return
+            variantes = {}
+        elif self.imagen_variantes.get('origen') != self.imagen.name:
+            from PIL import Image
+            from .imagenes import generar_variantes
+            try:
+                variantes = generar_variantes(self.imagen)
+            except (OSError, ValueError, Image.DecompressionBombError):
+                # Imagen ilegible, faltante o demasiado grande: se muestra la original
+                variantes = {'origen': self.imagen.name}
+        else:
+            return
+        self.imagen_variantes = variantes
+        self.fecha_actualizacion = timezone.now()
+        Rifa.objects.filter(pk=self.pk).update(
+            imagen_variantes=variantes,
+            fecha_actualizacion=self.fecha_actualizacion
+        )
+        ResumenRifa.objects.filter(rifa=self).update(
+            imagen=self.imagen_catalogo(),
+            fecha_actualizacion=self.fecha_actualizacion
+        )
+    
+    def variantes_imagen(self, tipo):
+        """Datos de las variantes ya generadas, o None si todavía no hay.
+
+        Solo lee: las variantes se generan en ``save()`` o con
+        ``manage.py procesar_imagenes``, nunca al renderizar. Sin variantes
+        las plantillas muestran la imagen original.
+        """
+        if not self.imagen or self.imagen_variantes.get('origen') != self.imagen.name:
+            return None
+        from .imagenes import datos_imagen
+        return datos_imagen(self.imagen_variantes, tipo)
+    
+    @property
+    def imagen_tarjeta(self):
+        return self.variantes_imagen('tarjeta')
+    
+    @property
+    def imagen_detalle(self):
+        return self.variantes_imagen('detalle')
+    
+    def imagen_catalogo(self):
+        """Datos de la miniatura para el catálogo, sin procesar la imagen"""
+        if not self.imagen:
+            return {}
+        return self.imagen_tarjeta or {'src': self.imagen.url}
+    
     def save(self, *args, **kwargs):
         if not self.slug:
             from django.utils.text import slugify
             self.slug = slugify(self.nombre)
         super().save(*args, **kwargs)
+        self.procesar_imagen()
+        ResumenRifa.actualizar(self)
 
 
 # Signal para generar números automáticamente después de crear una rifa
 @receiver(post_save, sender=Rifa)
 def generar_numeros_rifa(sender, instance, created, **kwargs):
     if created and not instance.numeros_generados:
-        instance.generar_numeros()
+        # Las rifas grandes se generan en segundo plano (manage.py procesar_tareas)
+        if instance.cantidad_numeros > settings.NUMEROS_GENERACION_SINCRONICA:
+            from .tareas import encolar
+            encolar('generar_numeros', rifa_id=instance.pk)
+        else:
+            instance.generar_numeros()
+
+
+@receiver(pre_delete, sender=Rifa)
+def descontar_compras_rifa(sender, instance, **kwargs):
+    instance.descontar_compras()
 
 
 class Numero(models.Model):
@@ -140,6 +404,15 @@ class Numero(models.Model):
         null=True,
         verbose_name="Nombre del comprador"
     )
+    comprador = models.ForeignKey(
+        'Comprador',
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='numeros'
+    )
+    # Versión de la fila: se usa como clave del cache de fragmentos
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
     
     class Meta:
         verbose_name = 'Número'
@@ -147,13 +420,57 @@ class Numero(models.Model):
         unique_together = ['rifa', 'numero']
         ordering = ['rifa', 'numero']
         indexes = [
-            models.Index(fields=['rifa', 'estado']),
+            # Grilla de gestión: filtra por estado y ordena por número
+            models.Index(fields=['rifa', 'estado', 'numero'], name='numero_rifa_estado_num_idx'),
             models.Index(fields=['telefono_comprador']),
+            # Changelist del admin ordenado por fecha de compra
+            models.Index(fields=['fecha_compra'], name='numero_fecha_compra_idx'),
+            # Parciales: solo las filas vendidas / reservadas
+            models.Index(
+                fields=['rifa', 'fecha_compra'],
+                condition=models.Q(estado='vendido'),
+                name='numero_vendidos_idx',
+            ),
+            models.Index(
+                fields=['fecha_reserva'],
+                condition=models.Q(estado='reservado'),
+                name='numero_reservados_idx',
+            ),
         ]
     
     def __str__(self):
         return f"Rifa {self.rifa.nombre} - Número {self.numero}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        numero = super().from_db(db, field_names, values)
+        if not {'telefono_comprador', 'nombre_comprador'} & numero.get_deferred_fields():
+            # Datos del comprador tal como se leyeron: si no cambian no se revincula
+            numero._comprador_guardado = (numero.telefono_comprador, numero.nombre_comprador)
+        return numero
+    
+    def vincular_comprador(self):
+        """Asocia el número al comprador de su teléfono normalizado.
+
+        No consulta nada si el teléfono y el nombre son los que se leyeron de
+        la base y el número ya estaba vinculado (o no tenía teléfono).
+        """
+        guardado = getattr(self, '_comprador_guardado', None)
+        if guardado == (self.telefono_comprador, self.nombre_comprador) and (
+            self.comprador_id is not None or not self.telefono_comprador
+        ):
+            return
+        telefono = normalizar_telefono(self.telefono_comprador)
+        if not telefono:
+            self.comprador = None
+        elif self.comprador_id is None or self.comprador.telefono != telefono:
+            self.comprador = Comprador.obtener(telefono, self.nombre_comprador)
+    
+    def save(self, *args, **kwargs):
+        self.vincular_comprador()
+        super().save(*args, **kwargs)
+        self._comprador_guardado = (self.telefono_comprador, self.nombre_comprador)
+    
     @property
     def vendido(self):
         return self.estado == 'vendido'
@@ -190,6 +507,13 @@ class Transaccion(models.Model):
         max_length=100,
         verbose_name="Nombre del cliente"
     )
+    comprador = models.ForeignKey(
+        'Comprador',
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='transacciones'
+    )
     rifa = models.ForeignKey(
         Rifa,
         on_delete=models.CASCADE,
@@ -231,6 +555,10 @@ class Transaccion(models.Model):
         indexes = [
             models.Index(fields=['telefono_cliente', 'estado']),
             models.Index(fields=['codigo_transaccion']),
+            # Changelist del admin: orden por defecto y filtros por rifa / estado
+            models.Index(fields=['-fecha_creacion'], name='transaccion_creacion_idx'),
+            models.Index(fields=['rifa', '-fecha_creacion'], name='transaccion_rifa_creacion_idx'),
+            models.Index(fields=['estado', '-fecha_creacion'], name='transaccion_estado_creac_idx'),
         ]
     
     def __str__(self):
@@ -250,6 +578,8 @@ class Transaccion(models.Model):
         # Calcular monto total automáticamente
         self.monto_total = self.calcular_monto_total()
         
+        self.comprador = Comprador.obtener(self.telefono_cliente, self.nombre_cliente)
+        
         # Llamar al save original
         super().save(*args, **kwargs)
         
@@ -268,14 +598,399 @@ class Transaccion(models.Model):
         random_str = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
         return f"{prefix}{random_str}"
     
-    def marcar_numeros_como_vendidos(self):
-        """Marca los números asociados como vendidos y actualiza la información del comprador"""
-        for numero in self.numeros.all():
-            numero.estado = 'vendido'
-            numero.telefono_comprador = self.telefono_cliente
-            numero.nombre_comprador = self.nombre_cliente
-            numero.fecha_compra = timezone.now()
-            numero.save()
+    def marcar_numeros_como_vendidos(self, operador=None):
+        """Marca los números asociados como vendidos y actualiza la información del comprador.
+
+        Los números se releen bloqueados; si alguno quedó reservado o vendido
+        a otro comprador se lanza ``ValueError`` y no se vende ninguno. Sin
+        comprador normalizado de uno u otro lado no se puede probar que sea
+        el mismo, así que el número también se considera ocupado.
+        """
+        cambios = []
+        with transaction.atomic():
+            numeros = list(self.numeros.select_for_update().order_by('numero'))
+            ocupados = [
+                numero.numero for numero in numeros
+                if numero.estado != 'disponible' and (
+                    numero.comprador_id is None
+                    or self.comprador_id is None
+                    or numero.comprador_id != self.comprador_id
+                )
+            ]
+            if ocupados:
+                raise ValueError(
+                    f"Los números {', '.join(map(str, ocupados))} ya están reservados o vendidos a otro comprador"
+                )
+            for numero in numeros:
+                if numero.estado == 'vendido':
+                    continue
+                cambios.append(CambioNumero(
+                    numero.numero, numero.estado, 'vendido', numero.comprador_id,
+                    self.comprador_id, self.nombre_cliente, self.telefono_cliente
+                ))
+                numero.estado = 'vendido'
+                numero.telefono_comprador = self.telefono_cliente
+                numero.nombre_comprador = self.nombre_cliente
+                numero.comprador = self.comprador
+                numero.fecha_compra = timezone.now()
+                numero.save()
+            self.rifa.registrar_cambios(cambios, operador=operador, origen='transaccion', transaccion=self)
+
+
+class VentaHoraria(models.Model):
+    """Resumen incremental de ventas y reservas de una rifa por hora.
+
+    Cada fila guarda el movimiento neto de la hora: la suma acumulada de
+    ``vendidos`` y ``reservados`` da el estado actual de la rifa.
+    """
+    rifa = models.ForeignKey(
+        Rifa,
+        on_delete=models.CASCADE,
+        related_name='ventas_horarias'
+    )
+    hora = models.DateTimeField()
+    vendidos = models.IntegerField(default=0)
+    reservados = models.IntegerField(default=0)
+    monto = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    
+    class Meta:
+        verbose_name = 'Venta por hora'
+        verbose_name_plural = 'Ventas por hora'
+        ordering = ['rifa', 'hora']
+        unique_together = ['rifa', 'hora']
+    
+    def __str__(self):
+        return f"{self.rifa_id} - {self.hora:%Y-%m-%d %H:00}"
+    
+    @classmethod
+    def registrar(cls, rifa, vendidos=0, reservados=0, momento=None):
+        """Suma los movimientos a la fila de la hora actual, creándola si no existe"""
+        if not vendidos and not reservados:
+            return
+        hora = (momento or timezone.now()).replace(minute=0, second=0, microsecond=0)
+        cambios = {
+            'vendidos': F('vendidos') + vendidos,
+            'reservados': F('reservados') + reservados,
+            'monto': F('monto') + vendidos * rifa.precio_numero,
+        }
+        if cls.objects.filter(rifa=rifa, hora=hora).update(**cambios):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(
+                    rifa=rifa,
+                    hora=hora,
+                    vendidos=vendidos,
+                    reservados=reservados,
+                    monto=vendidos * rifa.precio_numero,
+                )
+        except IntegrityError:
+            # Otro proceso creó la fila en paralelo
+            cls.objects.filter(rifa=rifa, hora=hora).update(**cambios)
+
+
+class ResumenRifa(models.Model):
+    """Fila precalculada de una rifa para el catálogo público.
+
+    ``actualizar`` la rehace al guardar la rifa y ``Rifa.registrar_ventas``
+    le suma la diferencia de vendidos en cada cambio de estado, así el
+    catálogo se lista sin contar números.
+    """
+    rifa = models.OneToOneField(
+        Rifa,
+        on_delete=models.CASCADE,
+        related_name='resumen'
+    )
+    nombre = models.CharField(max_length=100)
+    slug = models.SlugField(max_length=100)
+    estado = models.CharField(max_length=20, choices=Rifa.ESTADO_CHOICES)
+    fecha_sorteo = models.DateTimeField()
+    precio_numero = models.DecimalField(max_digits=10, decimal_places=2)
+    cantidad_numeros = models.PositiveIntegerField()
+    vendidos = models.IntegerField(default=0)
+    # Datos de la miniatura (ver main/imagenes.datos_imagen); vacío si no hay imagen
+    imagen = models.JSONField(default=dict, blank=True)
+    fecha_actualizacion = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        verbose_name = 'Resumen de rifa'
+        verbose_name_plural = 'Resúmenes de rifas'
+        indexes = [
+            models.Index(fields=['estado', 'fecha_sorteo'], name='resumen_catalogo_idx'),
+        ]
+    
+    def __str__(self):
+        return self.nombre
+    
+    @property
+    def disponibles(self):
+        return max(self.cantidad_numeros - self.vendidos, 0)
+    
+    @property
+    def porcentaje_vendido(self):
+        if not self.cantidad_numeros:
+            return 0
+        return self.vendidos * 100 / self.cantidad_numeros
+    
+    @classmethod
+    def actualizar(cls, rifa):
+        """Rehace el resumen con los datos actuales de la rifa"""
+        resumen, _ = cls.objects.update_or_create(
+            rifa=rifa,
+            defaults={
+                'nombre': rifa.nombre,
+                'slug': rifa.slug,
+                'estado': rifa.estado,
+                'fecha_sorteo': rifa.fecha_sorteo,
+                'precio_numero': rifa.precio_numero,
+                'cantidad_numeros': rifa.cantidad_numeros,
+                'vendidos': Rifa.objects.con_numeros_vendidos().get(pk=rifa.pk).numeros_vendidos,
+                'imagen': rifa.imagen_catalogo(),
+                'fecha_actualizacion': timezone.now(),
+            }
+        )
+        return resumen
+    
+    @classmethod
+    def sumar_vendidos(cls, rifa, vendidos):
+        if vendidos:
+            cls.objects.filter(rifa=rifa).update(
+                vendidos=F('vendidos') + vendidos,
+                fecha_actualizacion=timezone.now()
+            )
+
+
+class Comprador(models.Model):
+    """Comprador identificado por su teléfono normalizado, con sus totales acumulados.
+
+    ``numeros_comprados`` y ``monto_total`` se mantienen incrementalmente desde
+    cada venta (ver ``Rifa.registrar_compras``) y ``CompraRifa`` guarda el
+    detalle por rifa; los rankings son lecturas por índice.
+    """
+    telefono = models.CharField(max_length=20, unique=True)
+    nombre = models.CharField(max_length=100, blank=True)
+    numeros_comprados = models.IntegerField(default=0)
+    monto_total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_ultima_compra = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        verbose_name = 'Comprador'
+        verbose_name_plural = 'Compradores'
+        ordering = ['-numeros_comprados']
+        indexes = [
+            models.Index(fields=['-numeros_comprados'], name='comprador_numeros_idx'),
+            models.Index(fields=['-monto_total'], name='comprador_monto_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.nombre or 'Sin nombre'} ({self.telefono})"
+    
+    @classmethod
+    def obtener(cls, telefono, nombre=None):
+        """Devuelve el comprador del teléfono, creándolo si no existe; None sin teléfono"""
+        telefono = normalizar_telefono(telefono)
+        if not telefono:
+            return None
+        comprador, creado = cls.objects.get_or_create(telefono=telefono, defaults={'nombre': nombre or ''})
+        if not creado and nombre and comprador.nombre != nombre:
+            # Se conserva el último nombre con el que se cargó
+            comprador.nombre = nombre
+            cls.objects.filter(pk=comprador.pk).update(nombre=nombre)
+        return comprador
+
+
+class CompraRifa(models.Model):
+    """Números vendidos y monto de un comprador en una rifa"""
+    comprador = models.ForeignKey(
+        Comprador,
+        on_delete=models.CASCADE,
+        related_name='compras'
+    )
+    rifa = models.ForeignKey(
+        Rifa,
+        on_delete=models.CASCADE,
+        related_name='compras'
+    )
+    numeros = models.IntegerField(default=0)
+    monto = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    fecha_ultima_compra = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        verbose_name = 'Compra por rifa'
+        verbose_name_plural = 'Compras por rifa'
+        ordering = ['rifa', '-numeros']
+        unique_together = ['comprador', 'rifa']
+        indexes = [
+            models.Index(fields=['rifa', '-numeros'], name='compra_rifa_numeros_idx'),
+            models.Index(fields=['rifa', '-monto'], name='compra_rifa_monto_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.comprador} - {self.rifa}"
+    
+    @classmethod
+    def registrar(cls, rifa, movimientos, momento=None):
+        """Suma ``{comprador_id: numeros}`` a las compras de la rifa y a los totales del comprador"""
+        momento = momento or timezone.now()
+        for comprador_id, numeros in movimientos.items():
+            if not numeros:
+                continue
+            monto = numeros * rifa.precio_numero
+            cambios = {'numeros': F('numeros') + numeros, 'monto': F('monto') + monto}
+            totales = {
+                'numeros_comprados': F('numeros_comprados') + numeros,
+                'monto_total': F('monto_total') + monto,
+            }
+            if numeros > 0:
+                cambios['fecha_ultima_compra'] = totales['fecha_ultima_compra'] = momento
+            
+            if not cls.objects.filter(comprador_id=comprador_id, rifa=rifa).update(**cambios):
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(
+                            comprador_id=comprador_id,
+                            rifa=rifa,
+                            numeros=numeros,
+                            monto=monto,
+                            fecha_ultima_compra=momento if numeros > 0 else None,
+                        )
+                except IntegrityError:
+                    # Otro proceso creó la fila en paralelo
+                    cls.objects.filter(comprador_id=comprador_id, rifa=rifa).update(**cambios)
+            Comprador.objects.filter(pk=comprador_id).update(**totales)
+
+
+class TransicionNumero(models.Model):
+    """Bitácora de solo escritura de los cambios de los números.
+
+    El número se guarda por valor y no como FK, así la historia sobrevive al
+    archivado y a la regeneración de la rifa. ``rifa`` y ``operador`` no
+    llevan índice propio porque encabezan los índices compuestos; las FK a
+    comprador y transacción sí, para que borrar uno no recorra la bitácora.
+    """
+    ORIGEN_CHOICES = [
+        ('gestion', 'Gestión de números'),
+        ('admin', 'Admin'),
+        ('transaccion', 'Transacción'),
+        ('reserva_aleatoria', 'Reserva al azar'),
+    ]
+    
+    rifa = models.ForeignKey(
+        Rifa,
+        on_delete=models.CASCADE,
+        related_name='transiciones',
+        db_index=False
+    )
+    numero = models.PositiveIntegerField()
+    estado_anterior = models.CharField(max_length=20, choices=Numero.ESTADO_CHOICES)
+    estado_nuevo = models.CharField(max_length=20, choices=Numero.ESTADO_CHOICES)
+    comprador_anterior = models.ForeignKey(
+        Comprador,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='+'
+    )
+    comprador = models.ForeignKey(
+        Comprador,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='transiciones'
+    )
+    nombre_comprador = models.CharField(max_length=100, blank=True, null=True)
+    telefono_comprador = models.CharField(max_length=20, blank=True, null=True)
+    operador = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='transiciones_numeros',
+        db_index=False
+    )
+    transaccion = models.ForeignKey(
+        Transaccion,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name='transiciones'
+    )
+    origen = models.CharField(max_length=20, choices=ORIGEN_CHOICES)
+    fecha = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        verbose_name = 'Transición de número'
+        verbose_name_plural = 'Transiciones de números'
+        ordering = ['-fecha']
+        indexes = [
+            models.Index(fields=['rifa', 'numero', '-fecha'], name='transicion_numero_idx'),
+            models.Index(fields=['operador', '-fecha'], name='transicion_operador_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.rifa_id} #{self.numero}: {self.estado_anterior} → {self.estado_nuevo}"
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("La bitácora de transiciones no se modifica")
+        super().save(*args, **kwargs)
+    
+    @classmethod
+    def registrar(cls, rifa, cambios, operador=None, origen='', transaccion=None):
+        """Agrega los cambios a la bitácora con un solo bulk_create"""
+        if operador is not None and not operador.is_authenticated:
+            operador = None
+        fecha = timezone.now()
+        cls.objects.bulk_create([
+            cls(
+                rifa=rifa,
+                numero=cambio.numero,
+                estado_anterior=cambio.anterior,
+                estado_nuevo=cambio.nuevo,
+                comprador_anterior_id=cambio.comprador_anterior,
+                comprador_id=cambio.comprador,
+                nombre_comprador=cambio.nombre,
+                telefono_comprador=cambio.telefono,
+                operador=operador,
+                transaccion=transaccion,
+                origen=origen,
+                fecha=fecha,
+            )
+            for cambio in cambios
+        ])
+
+
+class ArchivoRifa(models.Model):
+    """Números de una rifa terminada, comprimidos fuera de la tabla de números"""
+    rifa = models.OneToOneField(
+        Rifa,
+        on_delete=models.CASCADE,
+        related_name='archivo'
+    )
+    estados = models.BinaryField()
+    datos = models.BinaryField()
+    disponibles = models.PositiveIntegerField(default=0)
+    reservados = models.PositiveIntegerField(default=0)
+    vendidos = models.PositiveIntegerField(default=0)
+    fecha_archivado = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'Archivo de rifa'
+        verbose_name_plural = 'Archivos de rifas'
+    
+    def __str__(self):
+        return f"Archivo de {self.rifa}"
+    
+    @property
+    def tamano(self):
+        return len(self.estados) + len(self.datos)
+    
+    def leer(self):
+        from .archivo import leer
+        return leer(self)
+
+
 class Ganador(models.Model):
     rifa = models.OneToOneField(
         Rifa,
@@ -315,4 +1030,71 @@ class Ganador(models.Model):
         if self.numero_ganador and self.numero_ganador.telefono_comprador:
             self.telefono_ganador = self.numero_ganador.telefono_comprador
             self.nombre_ganador = self.numero_ganador.nombre_comprador
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+
+
+class Tarea(models.Model):
+    """Trabajo en segundo plano, ejecutado por ``manage.py procesar_tareas``"""
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('en_proceso', 'En proceso'),
+        ('completada', 'Completada'),
+        ('fallida', 'Fallida'),
+    ]
+    
+    tipo = models.CharField(max_length=50)
+    parametros = models.JSONField(default=dict, blank=True)
+    estado = models.CharField(
+        max_length=20,
+        choices=ESTADO_CHOICES,
+        default='pendiente'
+    )
+    intentos = models.PositiveIntegerField(default=0)
+    max_intentos = models.PositiveIntegerField(default=3)
+    procesados = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    resultado = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True)
+    trabajador = models.CharField(max_length=100, blank=True)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    disponible_desde = models.DateTimeField(default=timezone.now)
+    fecha_inicio = models.DateTimeField(blank=True, null=True)
+    fecha_fin = models.DateTimeField(blank=True, null=True)
+    # Última señal de vida del trabajador; permite recuperar tareas huérfanas
+    latido = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        verbose_name = 'Tarea'
+        verbose_name_plural = 'Tareas'
+        ordering = ['-fecha_creacion']
+        indexes = [
+            models.Index(fields=['estado', 'disponible_desde'], name='tarea_cola_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_tipo_display()} #{self.pk}"
+    
+    def get_tipo_display(self):
+        from .tareas import nombre_tarea
+        return nombre_tarea(self.tipo)
+    
+    @property
+    def porcentaje(self):
+        if self.estado == 'completada':
+            return 100
+        if not self.total:
+            return 0
+        return min(100, self.procesados * 100 // self.total)
+    
+    def reportar_progreso(self, procesados, total=None):
+        """Guarda el avance sin tocar el resto de la fila"""
+        self.procesados = procesados
+        if total is not None:
+            self.total = total
+        self.latido = timezone.now()
+        Tarea.objects.filter(pk=self.pk).update(
+            procesados=self.procesados,
+            total=self.total,
+            latido=self.latido
+        )
+
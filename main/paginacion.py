@@ -0,0 +1,140 @@
+import base64
+import bisect
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+
+class PaginaCursor:
+    """Página obtenida por keyset: sin COUNT(*) ni OFFSET"""
+
+    def __init__(self, objetos, cursor_siguiente=None, cursor_anterior=None, es_primera=True):
+        self.objetos = objetos
+        self.cursor_siguiente = cursor_siguiente
+        self.cursor_anterior = cursor_anterior
+        self.es_primera = es_primera
+
+    def __iter__(self):
+        return iter(self.objetos)
+
+    def __len__(self):
+        return len(self.objetos)
+
+    @property
+    def has_next(self):
+        return self.cursor_siguiente is not None
+
+    @property
+    def has_previous(self):
+        return self.cursor_anterior is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+def _codificar(valores, direccion):
+    datos = json.dumps([valores, direccion], default=str)
+    return base64.urlsafe_b64encode(datos.encode()).decode().rstrip('=')
+
+
+def _decodificar(cursor):
+    try:
+        datos = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        valores, direccion = json.loads(datos)
+    except (ValueError, TypeError):
+        return None
+    if direccion not in ('siguiente', 'anterior') or not isinstance(valores, list) or len(valores) != 2:
+        return None
+    return valores, direccion
+
+
+def _valor(queryset, campo, valor):
+    """Convierte el valor del cursor al tipo del campo (las fechas viajan como texto)"""
+    try:
+        field = queryset.model._meta.get_field(campo)
+    except FieldDoesNotExist:
+        # Campos anotados: el valor ya viene con el tipo de JSON
+        return valor
+    return field.to_python(valor)
+
+
+def paginar_por_cursor(queryset, orden, cursor=None, por_pagina=12):
+    """Pagina ``queryset`` por keyset sobre ``orden`` con desempate por ``id``.
+
+    ``orden`` es un nombre de campo con ``-`` opcional, como en ``order_by``.
+    Cada página se resuelve con un rango sobre el índice del campo de orden,
+    así que cuesta lo mismo la primera que la página mil. Un cursor inválido
+    se trata como la primera página.
+    """
+    descendente = orden.startswith('-')
+    campo = orden.lstrip('-')
+    datos = _decodificar(cursor) if cursor else None
+
+    if datos is not None:
+        (valor, pk), direccion = datos
+        try:
+            valor = _valor(queryset, campo, valor)
+            pk = int(pk)
+        except (ValidationError, TypeError, ValueError):
+            datos, direccion = None, 'siguiente'
+    else:
+        direccion = 'siguiente'
+
+    # Hacia atrás se recorre en el orden inverso y después se da vuelta
+    hacia_atras = direccion == 'anterior'
+    mayor = descendente == hacia_atras
+    if datos is not None:
+        operador = 'gt' if mayor else 'lt'
+        queryset = queryset.filter(
+            Q(**{f'{campo}__{operador}': valor}) |
+            Q(**{campo: valor, f'id__{operador}': pk})
+        )
+    prefijo = '' if mayor else '-'
+    objetos = list(queryset.order_by(f'{prefijo}{campo}', f'{prefijo}id')[:por_pagina + 1])
+
+    hay_mas = len(objetos) > por_pagina
+    objetos = objetos[:por_pagina]
+    if hacia_atras:
+        objetos.reverse()
+
+    def cursor_de(objeto, direccion):
+        return _codificar([getattr(objeto, campo), objeto.pk], direccion)
+
+    siguiente = anterior = None
+    if objetos:
+        if hay_mas or hacia_atras:
+            siguiente = cursor_de(objetos[-1], 'siguiente')
+        if datos is not None and (hay_mas or not hacia_atras):
+            anterior = cursor_de(objetos[0], 'anterior')
+    return PaginaCursor(objetos, siguiente, anterior, es_primera=anterior is None)
+
+
+def paginar_lista(claves, cursor=None, por_pagina=12):
+    """Versión de ``paginar_por_cursor`` para una lista ordenada de claves únicas.
+
+    Usa el mismo formato de cursor, así las plantillas no distinguen entre
+    una página de la base y una armada en memoria (por ejemplo, de un archivo).
+    """
+    datos = _decodificar(cursor) if cursor else None
+    inicio = 0
+    if datos is not None:
+        (valor, _), direccion = datos
+        try:
+            valor = int(valor)
+        except (TypeError, ValueError):
+            direccion = None
+        if direccion == 'siguiente':
+            inicio = bisect.bisect_right(claves, valor)
+        elif direccion == 'anterior':
+            inicio = max(0, bisect.bisect_left(claves, valor) - por_pagina)
+    fin = min(len(claves), inicio + por_pagina)
+    objetos = claves[inicio:fin]
+
+    siguiente = anterior = None
+    if fin < len(claves):
+        siguiente = _codificar([objetos[-1], objetos[-1]], 'siguiente')
+    if objetos and inicio > 0:
+        anterior = _codificar([objetos[0], objetos[0]], 'anterior')
+    return PaginaCursor(objetos, siguiente, anterior, es_primera=anterior is None)
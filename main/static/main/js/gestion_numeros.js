@@ -0,0 +1,171 @@
+let currentNumeroId = null;
+// Estado con el que se abrió el modal: el servidor rechaza el cambio si ya no es ese
+let estadoVisto = null;
+
+function mostrarModalNumero(numeroId) {
+    currentNumeroId = numeroId;
+
+    fetch(`/numero/${numeroId}/datos/`)
+        .then(response => response.json())
+        .then(data => {
+            document.getElementById('modalNumero').textContent = data.numero;
+            document.getElementById('numeroId').value = numeroId;
+            document.getElementById('estado').value = data.estado;
+            estadoVisto = data.estado;
+            document.getElementById('nombre').value = data.nombre_comprador || '';
+            document.getElementById('telefono').value = data.telefono_comprador || '';
+
+            const currentInfo = document.getElementById('currentInfo');
+            currentInfo.innerHTML = `
+                <div class="info-item">
+                    <span class="info-label">Estado actual:</span>
+                    <span class="info-value status-${data.estado}">${getEstadoDisplay(data.estado)}</span>
+                </div>
+                ${data.nombre_comprador ? `
+                <div class="info-item">
+                    <span class="info-label">Comprador:</span>
+                    <span class="info-value">${data.nombre_comprador}</span>
+                </div>
+                ` : ''}
+                ${data.telefono_comprador ? `
+                <div class="info-item">
+                    <span class="info-label">Teléfono:</span>
+                    <span class="info-value">${data.telefono_comprador}</span>
+                </div>
+                ` : ''}
+                ${data.fecha_compra ? `
+                <div class="info-item">
+                    <span class="info-label">Fecha compra:</span>
+                    <span class="info-value">${new Date(data.fecha_compra).toLocaleDateString()}</span>
+                </div>
+                ` : ''}
+                ${data.fecha_reserva ? `
+                <div class="info-item">
+                    <span class="info-label">Fecha reserva:</span>
+                    <span class="info-value">${new Date(data.fecha_reserva).toLocaleDateString()}</span>
+                </div>
+                ` : ''}
+            `;
+
+            toggleCompradorFields();
+            document.getElementById('numeroModal').style.display = 'block';
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            alert('Error al cargar los datos del número');
+        });
+}
+
+function cerrarModal() {
+    document.getElementById('numeroModal').style.display = 'none';
+    currentNumeroId = null;
+}
+
+function toggleCompradorFields() {
+    const estado = document.getElementById('estado').value;
+    const compradorFields = document.getElementById('compradorFields');
+    const transferenciaField = document.getElementById('transferenciaField');
+
+    if (estado === 'disponible') {
+        compradorFields.style.display = 'none';
+    } else {
+        compradorFields.style.display = 'flex';
+
+        if (estado === 'vendido') {
+            transferenciaField.style.display = 'block';
+        } else {
+            transferenciaField.style.display = 'none';
+        }
+    }
+}
+
+function guardarCambios() {
+    const numeroId = document.getElementById('numeroId').value;
+    const formData = new FormData();
+
+    formData.append('estado', document.getElementById('estado').value);
+    formData.append('nombre', document.getElementById('nombre').value);
+    formData.append('telefono', document.getElementById('telefono').value);
+    if (estadoVisto) {
+        formData.append('estado_anterior', estadoVisto);
+    }
+
+    fetch(`/numero/${numeroId}/actualizar/`, {
+        method: 'POST',
+        body: formData,
+        headers: {
+            'X-CSRFToken': getCookie('csrftoken'),
+        }
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            cerrarModal();
+            location.reload();
+        } else if (data.estado) {
+            // Otro operador cambió el número mientras el modal estaba abierto
+            alert(data.error);
+            cerrarModal();
+            location.reload();
+        } else {
+            alert('Error al actualizar el número: ' + data.error);
+        }
+    })
+    .catch(error => {
+        console.error('Error:', error);
+        alert('Error al actualizar el número');
+    });
+}
+
+function numeroAlAzar(rifaId) {
+    fetch(`/rifa/${rifaId}/numeros/aleatorios/?cantidad=1`)
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                mostrarModalNumero(data.numeros[0].id);
+            } else {
+                alert(data.error);
+            }
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            alert('Error al elegir un número');
+        });
+}
+
+function getEstadoDisplay(estado) {
+    const estados = {
+        'disponible': 'Disponible',
+        'reservado': 'Reservado', 
+        'vendido': 'Vendido'
+    };
+    return estados[estado] || estado;
+}
+
+function getCookie(name) {
+    let cookieValue = null;
+    if (document.cookie && document.cookie !== '') {
+        const cookies = document.cookie.split(';');
+        for (let i = 0; i < cookies.length; i++) {
+            const cookie = cookies[i].trim();
+            if (cookie.substring(0, name.length + 1) === (name + '=')) {
+                cookieValue = decodeURIComponent(cookie.substring(name.length + 1));
+                break;
+            }
+        }
+    }
+    return cookieValue;
+}
+
+window.onclick = function(event) {
+    const modal = document.getElementById('numeroModal');
+    if (event.target === modal) {
+        cerrarModal();
+    }
+}
+
+document.addEventListener('keydown', function(event) {
+    if (event.key === 'Escape') {
+        cerrarModal();
+    }
+});
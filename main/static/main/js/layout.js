@@ -0,0 +1,17 @@
+// Toggle del menú en móviles
+document.getElementById('menuToggle').addEventListener('click', function() {
+    document.getElementById('sidebar').classList.toggle('active');
+});
+
+// Cerrar menú al hacer clic fuera de él en móviles
+document.addEventListener('click', function(event) {
+    const sidebar = document.getElementById('sidebar');
+    const menuToggle = document.getElementById('menuToggle');
+
+    if (window.innerWidth <= 1024 && 
+        !sidebar.contains(event.target) && 
+        !menuToggle.contains(event.target) &&
+        sidebar.classList.contains('active')) {
+        sidebar.classList.remove('active');
+    }
+});
@@ -0,0 +1,213 @@
+"""Cola de tareas en la base de datos, sin broker externo.
+
+Las operaciones pesadas se encolan con ``encolar(tipo, **parametros)`` y las
+ejecuta ``manage.py procesar_tareas``. Cada tarea reporta su avance con
+``tarea.reportar_progreso`` y se reintenta con espera exponencial si falla.
+"""
+import csv
+import io
+import logging
+import os
+import socket
+import traceback
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.db import transaction
+from django.db.models import F
+from django.urls import reverse
+from django.utils import timezone
+
+from .archivo import archivar
+from .models import Rifa, Tarea, Transaccion
+
+logger = logging.getLogger(__name__)
+
+# Una tarea en proceso sin latido durante este tiempo se considera huérfana
+TIEMPO_SIN_LATIDO = timedelta(minutes=10)
+
+_registro = {}
+
+
+def registrar_tarea(tipo, nombre):
+    """Registra la función que ejecuta las tareas de ``tipo``"""
+    def decorador(funcion):
+        _registro[tipo] = (nombre, funcion)
+        return funcion
+    return decorador
+
+
+def nombre_tarea(tipo):
+    return _registro.get(tipo, (tipo, None))[0]
+
+
+def encolar(tipo, max_intentos=3, **parametros):
+    if tipo not in _registro:
+        raise ValueError(f"Tipo de tarea desconocido: {tipo}")
+    return Tarea.objects.create(tipo=tipo, parametros=parametros, max_intentos=max_intentos)
+
+
+def identificador_trabajador():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def recuperar_huerfanas():
+    """Vuelve a encolar las tareas de trabajadores que dejaron de responder"""
+    limite = timezone.now() - TIEMPO_SIN_LATIDO
+    return Tarea.objects.filter(estado='en_proceso', latido__lt=limite).update(
+        estado='pendiente', trabajador=''
+    )
+
+
+def reclamar_siguiente(trabajador):
+    """Toma la próxima tarea pendiente; el UPDATE condicional evita que dos trabajadores tomen la misma"""
+    while True:
+        ahora = timezone.now()
+        candidata = Tarea.objects.filter(
+            estado='pendiente', disponible_desde__lte=ahora
+        ).order_by('disponible_desde', 'id').values_list('id', flat=True).first()
+        if candidata is None:
+            return None
+        tomada = Tarea.objects.filter(id=candidata, estado='pendiente').update(
+            estado='en_proceso',
+            trabajador=trabajador,
+            fecha_inicio=ahora,
+            latido=ahora,
+            intentos=F('intentos') + 1,
+        )
+        if tomada:
+            return Tarea.objects.get(id=candidata)
+
+
+def ejecutar(tarea):
+    """Ejecuta una tarea ya reclamada y registra el resultado o el error"""
+    _, funcion = _registro.get(tarea.tipo, (None, None))
+    try:
+        if funcion is None:
+            raise ValueError(f"Tipo de tarea desconocido: {tarea.tipo}")
+        resultado = funcion(tarea, **tarea.parametros)
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception("Falló la tarea %s", tarea.pk)
+        if tarea.intentos < tarea.max_intentos:
+            # Reintento con espera exponencial: 30s, 60s, 120s...
+            espera = timedelta(seconds=30 * 2 ** (tarea.intentos - 1))
+            cambios = {'estado': 'pendiente', 'disponible_desde': timezone.now() + espera}
+        else:
+            cambios = {'estado': 'fallida', 'fecha_fin': timezone.now()}
+        Tarea.objects.filter(pk=tarea.pk).update(error=error, trabajador='', **cambios)
+        return False
+
+    Tarea.objects.filter(pk=tarea.pk).update(
+        estado='completada',
+        resultado=resultado or {},
+        error='',
+        fecha_fin=timezone.now(),
+    )
+    return True
+
+
+def ejecutar_pendientes(trabajador=None, limite=None):
+    """Ejecuta tareas hasta vaciar la cola (o hasta ``limite``) y devuelve cuántas corrió"""
+    trabajador = trabajador or identificador_trabajador()
+    recuperar_huerfanas()
+    ejecutadas = 0
+    while limite is None or ejecutadas < limite:
+        tarea = reclamar_siguiente(trabajador)
+        if tarea is None:
+            break
+        ejecutar(tarea)
+        ejecutadas += 1
+    return ejecutadas
+
+
+# Tareas
+
+@registrar_tarea('generar_numeros', 'Generar números')
+def generar_numeros(tarea, rifa_id):
+    rifa = Rifa.objects.get(pk=rifa_id)
+    tarea.reportar_progreso(0, rifa.cantidad_numeros)
+    rifa.generar_numeros(progreso=tarea.reportar_progreso)
+    return {'numeros': rifa.cantidad_numeros}
+
+
+@registrar_tarea('regenerar_numeros', 'Regenerar números')
+def regenerar_numeros(tarea, rifa_id):
+    rifa = Rifa.objects.get(pk=rifa_id)
+    if rifa.archivada:
+        raise ValueError(f"La rifa {rifa.nombre} está archivada")
+    with transaction.atomic():
+        # Eliminar números existentes
+        rifa.descontar_compras()
+        rifa.numeros.all().delete()
+        rifa.ventas_horarias.all().delete()
+        rifa.numeros_generados = False
+        rifa.save()
+    # Generar nuevos números
+    tarea.reportar_progreso(0, rifa.cantidad_numeros)
+    rifa.generar_numeros(progreso=tarea.reportar_progreso)
+    return {'numeros': rifa.cantidad_numeros}
+
+
+@registrar_tarea('completar_transacciones', 'Completar transacciones')
+def completar_transacciones(tarea, transaccion_ids, operador_id=None):
+    operador = get_user_model().objects.filter(pk=operador_id).first() if operador_id else None
+    transacciones = Transaccion.objects.filter(pk__in=transaccion_ids).select_related('rifa')
+    tarea.reportar_progreso(0, len(transaccion_ids))
+    completadas = 0
+    # Transacciones con números que otro comprador tomó en el medio: quedan como estaban
+    rechazadas = {}
+    for i, transaccion in enumerate(transacciones, 1):
+        try:
+            with transaction.atomic():
+                transaccion.estado = 'completada'
+                transaccion.save()
+                transaccion.marcar_numeros_como_vendidos(operador=operador)
+        except ValueError as error:
+            rechazadas[transaccion.codigo_transaccion] = str(error)
+        else:
+            completadas += 1
+        tarea.reportar_progreso(i)
+    return {'completadas': completadas, 'rechazadas': rechazadas}
+
+
+@registrar_tarea('exportar_numeros', 'Exportar números')
+def exportar_numeros(tarea, rifa_id, lote=2000):
+    rifa = Rifa.objects.get(pk=rifa_id)
+    if rifa.archivada:
+        numeros = (
+            (n.numero, n.estado, n.nombre_comprador, n.telefono_comprador, n.fecha_reserva, n.fecha_compra)
+            for n in rifa.archivo.leer()
+        )
+    else:
+        numeros = rifa.numeros.order_by('numero').values_list(
+            'numero', 'estado', 'nombre_comprador', 'telefono_comprador', 'fecha_reserva', 'fecha_compra'
+        ).iterator(chunk_size=lote)
+    tarea.reportar_progreso(0, rifa.cantidad_numeros)
+
+    salida = io.StringIO()
+    writer = csv.writer(salida)
+    writer.writerow(['numero', 'estado', 'nombre', 'telefono', 'fecha_reserva', 'fecha_compra'])
+    for i, fila in enumerate(numeros, 1):
+        writer.writerow(['' if valor is None else valor for valor in fila])
+        if i % lote == 0:
+            tarea.reportar_progreso(i)
+
+    # Tiene nombres y teléfonos: va al storage privado, no a MEDIA
+    nombre = storages['exportaciones'].save(
+        f"{rifa.slug}-{timezone.now():%Y%m%d%H%M%S}.csv",
+        ContentFile(salida.getvalue().encode('utf-8'))
+    )
+    tarea.reportar_progreso(rifa.cantidad_numeros)
+    return {'archivo': nombre, 'url': reverse('descargar_exportacion', args=[tarea.pk])}
+
+
+@registrar_tarea('archivar_rifa', 'Archivar rifa')
+def archivar_rifa(tarea, rifa_id):
+    rifa = Rifa.objects.get(pk=rifa_id)
+    tarea.reportar_progreso(0, 1)
+    archivo = archivar(rifa)
+    tarea.reportar_progreso(1)
+    return {'numeros': archivo.disponibles + archivo.reservados + archivo.vendidos, 'bytes': archivo.tamano}
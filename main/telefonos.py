@@ -0,0 +1,19 @@
+import re
+
+_NO_DIGITOS = re.compile(r'\D')
+
+
+def normalizar_telefono(telefono):
+    """Deja solo los dígitos del teléfono, sin el prefijo internacional ``00``.
+
+    ``'+54 9 (11) 1234-5678'``, ``'0054 9 11 1234 5678'`` y ``'5491112345678'``
+    quedan iguales. No se intenta completar códigos de país o de área: un
+    número cargado con y sin ellos se considera distinto. Devuelve ``''`` si
+    no hay dígitos.
+    """
+    if not telefono:
+        return ''
+    digitos = _NO_DIGITOS.sub('', telefono)
+    if digitos.startswith('00'):
+        digitos = digitos[2:]
+    return digitos
@@ -0,0 +1,85 @@
+import threading
+from collections import Counter
+
+from django import template
+from django.core.cache import caches
+from django.core.cache.utils import make_template_fragment_key
+
+register = template.Library()
+
+CACHE_ALIAS = 'fragmentos'
+
+_lock = threading.Lock()
+_aciertos = Counter()
+_fallos = Counter()
+
+
+def obtener_estadisticas():
+    """Aciertos, fallos y tasa de aciertos por nombre de fragmento"""
+    with _lock:
+        nombres = set(_aciertos) | set(_fallos)
+        estadisticas = {}
+        for nombre in sorted(nombres):
+            total = _aciertos[nombre] + _fallos[nombre]
+            estadisticas[nombre] = {
+                'aciertos': _aciertos[nombre],
+                'fallos': _fallos[nombre],
+                'tasa_aciertos': _aciertos[nombre] / total if total else 0,
+            }
+        return estadisticas
+
+
+def reiniciar_estadisticas():
+    with _lock:
+        _aciertos.clear()
+        _fallos.clear()
+
+
+class CacheFilaNode(template.Node):
+    def __init__(self, nodelist, nombre, vary_on):
+        self.nodelist = nodelist
+        self.nombre = nombre
+        self.vary_on = vary_on
+
+    def render(self, context):
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        cache_key = make_template_fragment_key(self.nombre, vary_on)
+        cache = caches[CACHE_ALIAS]
+        value = cache.get(cache_key)
+        if value is not None:
+            with _lock:
+                _aciertos[self.nombre] += 1
+            return value
+        value = self.nodelist.render(context)
+        cache.set(cache_key, value)
+        with _lock:
+            _fallos[self.nombre] += 1
+        return value
+
+
+@register.tag('cache_fila')
+def do_cache_fila(parser, token):
+    """
+    Cachea el HTML de una fila mientras no cambie su versión.
+
+    Uso::
+
+        {% cache_fila "numero" numero.id numero.fecha_actualizacion %}
+            ...
+        {% endcache_fila %}
+
+    El primer argumento es el nombre del fragmento y el resto las variables
+    que forman la clave (id y versión de la fila). Se usa el cache
+    ``fragmentos`` con su timeout por defecto.
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(
+            "'%s' necesita un nombre y al menos una variable de versión" % bits[0]
+        )
+    nombre = bits[1]
+    if nombre[0] in ('"', "'") and nombre[-1] == nombre[0]:
+        nombre = nombre[1:-1]
+    nodelist = parser.parse(('endcache_fila',))
+    parser.delete_first_token()
+    return CacheFilaNode(nodelist, nombre, [parser.compile_filter(bit) for bit in bits[2:]])
@@ -1,3 +1,1239 @@
-from django.test import TestCase
+import gzip
+import importlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from collections import Counter
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User, UserManager
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Q
+from django.template import engines
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from .models import (
+    Rifa, Numero, Transaccion, VentaHoraria, Tarea, Comprador, CompraRifa, Ganador, TransicionNumero,
+    ResumenRifa, CambioNumero
+)
+from . import estaticos, tareas
+from .management.commands import simular_venta
+from .archivo import archivar as archivar_rifa
+from .templatetags import fragmentos
+
+
+def crear_rifa(nombre='Rifa de prueba', cantidad_numeros=50, **kwargs):
+    kwargs.setdefault('fecha_sorteo', timezone.now() + timedelta(days=7))
+    kwargs.setdefault('precio_numero', 100)
+    return Rifa.objects.create(
+        nombre=nombre,
+        descripcion='Descripción',
+        cantidad_numeros=cantidad_numeros,
+        **kwargs
+    )
+
+
+def exportaciones_temporales(test):
+    """Manda las exportaciones de ``test`` a un directorio temporal"""
+    directorio = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, directorio)
+    override = override_settings(STORAGES={
+        **settings.STORAGES,
+        'exportaciones': {
+            'BACKEND': 'django.core.files.storage.FileSystemStorage',
+            'OPTIONS': {'location': directorio, 'base_url': None},
+        },
+    })
+    override.enable()
+    test.addCleanup(override.disable)
+    return directorio
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN es específico de SQLite')
+class IndicesConsultasTest(TestCase):
+    """Cada consulta caliente debe resolverse con un índice y no con un full scan"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.rifa = crear_rifa()
+
+    def assertUsaIndice(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = '\n'.join(str(fila[-1]) for fila in cursor.fetchall())
+        self.assertIsNone(
+            re.search(r'^SCAN main_\w+$', plan, re.MULTILINE),
+            f'Full scan en:\n{sql}\n{plan}'
+        )
+
+    def test_grilla_numeros(self):
+        self.assertUsaIndice(Numero.objects.filter(rifa=self.rifa).order_by('numero'))
+        self.assertUsaIndice(
+            Numero.objects.filter(rifa=self.rifa, estado='reservado').order_by('numero')
+        )
+
+    def test_pagina_por_cursor(self):
+        siguiente = Numero.objects.filter(rifa=self.rifa).filter(
+            Q(numero__gt=20) | Q(numero=20, id__gt=20)
+        ).order_by('numero', 'id')[:501]
+        self.assertUsaIndice(siguiente)
+        self.assertUsaIndice(
+            Rifa.objects.filter(
+                Q(fecha_sorteo__lt=timezone.now()) | Q(fecha_sorteo=timezone.now(), id__lt=5)
+            ).order_by('-fecha_sorteo', '-id')[:13]
+        )
+
+    def test_estadisticas_vendidos(self):
+        self.assertUsaIndice(
+            Numero.objects.filter(rifa=self.rifa, estado='vendido').values('id')
+        )
+        self.assertUsaIndice(
+            Numero.objects.filter(rifa=self.rifa, estado='vendido').order_by('fecha_compra')
+        )
+
+    def test_reservas_por_fecha(self):
+        self.assertUsaIndice(
+            Numero.objects.filter(estado='reservado', fecha_reserva__lt=timezone.now())
+        )
+
+    def test_admin_numeros_por_fecha_compra(self):
+        self.assertUsaIndice(Numero.objects.order_by('-fecha_compra')[:100])
+
+    def test_busqueda_por_telefono(self):
+        self.assertUsaIndice(Numero.objects.filter(telefono_comprador='1155551234'))
+
+    def test_listado_transacciones(self):
+        self.assertUsaIndice(Transaccion.objects.all()[:100])
+        self.assertUsaIndice(Transaccion.objects.filter(rifa=self.rifa)[:100])
+        self.assertUsaIndice(Transaccion.objects.filter(estado='pendiente')[:100])
+
+    def test_listado_rifas(self):
+        self.assertUsaIndice(Rifa.objects.all()[:12])
+        self.assertUsaIndice(Rifa.objects.filter(estado='activa')[:12])
+
+    def test_ranking_compradores(self):
+        self.assertUsaIndice(
+            Comprador.objects.filter(numeros_comprados__gt=0).order_by('-numeros_comprados', 'id')[:20]
+        )
+        self.assertUsaIndice(
+            Comprador.objects.filter(monto_total__gt=0).order_by('-monto_total', 'id')[:20]
+        )
+        self.assertUsaIndice(
+            CompraRifa.objects.filter(rifa=self.rifa, numeros__gt=0).order_by('-numeros', 'id')[:20]
+        )
+
+    def test_bitacora_transiciones(self):
+        usuario = User.objects.create_user('bitacora')
+        self.assertUsaIndice(
+            TransicionNumero.objects.filter(rifa=self.rifa, numero=7).order_by('-fecha')
+        )
+        self.assertUsaIndice(
+            TransicionNumero.objects.filter(operador=usuario).order_by('-fecha')[:100]
+        )
+
+    def test_catalogo(self):
+        ahora = timezone.now()
+        self.assertUsaIndice(
+            ResumenRifa.objects.filter(estado='activa', fecha_sorteo__gt=ahora).order_by('fecha_sorteo', 'id')[:25]
+        )
+        self.assertUsaIndice(
+            ResumenRifa.objects.filter(estado='activa', fecha_sorteo__gt=ahora).filter(
+                Q(fecha_sorteo__gt=ahora) | Q(fecha_sorteo=ahora, id__gt=5)
+            ).order_by('fecha_sorteo', 'id')[:25]
+        )
+
+
+class AdminChangelistTest(TestCase):
+    """Los changelists del admin hacen las mismas queries sin importar cuántas filas muestren"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def contar_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def crear_datos(self, desde, hasta):
+        for i in range(desde, hasta):
+            rifa = crear_rifa(f'Rifa {i}', cantidad_numeros=5)
+            numeros = list(rifa.numeros.all()[:2])
+            Numero.objects.filter(pk=numeros[0].pk).update(estado='vendido')
+            transaccion = Transaccion.objects.create(
+                rifa=rifa, nombre_cliente='Cliente', telefono_cliente='1155551234'
+            )
+            transaccion.numeros.set(numeros)
+
+    def test_queries_constantes(self):
+        urls = [
+            reverse('admin:main_rifa_changelist'),
+            reverse('admin:main_transaccion_changelist'),
+            reverse('admin:main_numero_changelist'),
+        ]
+        self.crear_datos(0, 2)
+        pocas = [self.contar_queries(url) for url in urls]
+        self.crear_datos(2, 10)
+        muchas = [self.contar_queries(url) for url in urls]
+        self.assertEqual(pocas, muchas)
+
+    def test_filtro_por_rifa(self):
+        self.crear_datos(0, 3)
+        rifa = Rifa.objects.get(nombre='Rifa 1')
+        response = self.client.get(
+            reverse('admin:main_transaccion_changelist'), {'rifa': rifa.pk}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 1)
+        self.assertContains(response, 'filtro-autocompletar')
+
+
+class VentasHorariasTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('operador', password='clave')
+        cls.rifa = crear_rifa(cantidad_numeros=10)
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def cambiar_estado(self, numero, estado):
+        url = reverse('actualizar_estado_numero', args=[self.rifa.numeros.get(numero=numero).id])
+        self.client.post(url, {'estado': estado, 'nombre': 'Ana', 'telefono': '123'})
+
+    def totales(self):
+        filas = VentaHoraria.objects.filter(rifa=self.rifa)
+        return (
+            sum(f.vendidos for f in filas),
+            sum(f.reservados for f in filas),
+            sum(f.monto for f in filas),
+        )
+
+    def test_movimientos_incrementales(self):
+        self.cambiar_estado(1, 'reservado')
+        self.cambiar_estado(2, 'vendido')
+        self.cambiar_estado(1, 'vendido')
+        self.cambiar_estado(3, 'vendido')
+        self.cambiar_estado(3, 'disponible')
+        self.assertEqual(self.totales(), (2, 0, 200))
+
+    def test_recalcular_coincide_con_incremental(self):
+        self.cambiar_estado(1, 'reservado')
+        self.cambiar_estado(2, 'vendido')
+        incremental = self.totales()
+        VentaHoraria.objects.all().delete()
+        call_command('recalcular_ventas', rifa=[self.rifa.id], stdout=StringIO())
+        self.assertEqual(self.totales(), incremental)
+
+    def test_cambio_sobre_estado_viejo_se_rechaza(self):
+        # Dos operadores abren el 1 disponible; el segundo en guardar llega tarde
+        url = reverse('actualizar_estado_numero', args=[self.rifa.numeros.get(numero=1).id])
+        datos = {'estado': 'vendido', 'estado_anterior': 'disponible', 'nombre': 'Ana', 'telefono': '123'}
+        self.assertEqual(self.client.post(url, datos).status_code, 200)
+        response = self.client.post(url, dict(datos, nombre='Beto', telefono='456'))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['estado'], 'vendido')
+        self.assertEqual(self.rifa.numeros.get(numero=1).nombre_comprador, 'Ana')
+        self.assertEqual(self.totales(), (1, 0, 100))
+        self.assertEqual(CompraRifa.objects.get(rifa=self.rifa).numeros, 1)
+
+    def test_transaccion_no_pisa_numeros_de_otro_comprador(self):
+        self.cambiar_estado(1, 'reservado')
+        transaccion = Transaccion.objects.create(
+            rifa=self.rifa, nombre_cliente='Beto', telefono_cliente='456'
+        )
+        transaccion.numeros.set(self.rifa.numeros.filter(numero__in=[1, 2]))
+        with self.assertRaises(ValueError):
+            transaccion.marcar_numeros_como_vendidos()
+        self.assertEqual(self.rifa.numeros.filter(estado='vendido').count(), 0)
+        self.assertEqual(self.totales(), (0, 1, 0))
+
+    def test_transaccion_sin_comprador_no_pisa_reservas_sin_comprador(self):
+        # Ni la reserva ni la transacción tienen un teléfono normalizable
+        url = reverse('actualizar_estado_numero', args=[self.rifa.numeros.get(numero=1).id])
+        self.client.post(url, {'estado': 'reservado', 'nombre': 'Ana', 'telefono': '-'})
+        self.assertIsNone(self.rifa.numeros.get(numero=1).comprador_id)
+        transaccion = Transaccion.objects.create(
+            rifa=self.rifa, nombre_cliente='Beto', telefono_cliente='s/n'
+        )
+        self.assertIsNone(transaccion.comprador_id)
+        transaccion.numeros.set(self.rifa.numeros.filter(numero=1))
+        with self.assertRaises(ValueError):
+            transaccion.marcar_numeros_como_vendidos()
+        numero = self.rifa.numeros.get(numero=1)
+        self.assertEqual((numero.estado, numero.nombre_comprador), ('reservado', 'Ana'))
+
+    def test_endpoint_serie(self):
+        self.cambiar_estado(1, 'vendido')
+        self.cambiar_estado(2, 'vendido')
+        with self.assertNumQueries(4):  # sesión, usuario, rifa, serie
+            data = self.client.get(
+                reverse('ventas_rifa', args=[self.rifa.id]), {'intervalo': 'dia'}
+            ).json()
+        self.assertEqual(len(data['serie']), 1)
+        self.assertEqual(data['vendidos'], 2)
+        self.assertEqual(data['restantes'], 8)
+        self.assertIsNotNone(data['fecha_agotamiento'])
+
+
+class CacheFragmentosTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('operador', password='clave', is_staff=True)
+        cls.rifa = crear_rifa(cantidad_numeros=200)
+
+    def setUp(self):
+        caches['fragmentos'].clear()
+        fragmentos.reiniciar_estadisticas()
+        self.client.force_login(self.usuario)
+
+    def estadisticas(self, nombre):
+        data = self.client.get(
+            reverse('estadisticas_cache_fragmentos'), {'reiniciar': 1}
+        ).json()
+        return data[nombre]['aciertos'], data[nombre]['fallos']
+
+    def test_grilla_solo_rerenderiza_los_cambios(self):
+        url = reverse('gestion_numeros', args=[self.rifa.id])
+        self.client.get(url)
+        self.assertEqual(self.estadisticas('numero'), (0, 200))
+
+        numero = self.rifa.numeros.get(numero=7)
+        self.client.post(
+            reverse('actualizar_estado_numero', args=[numero.id]),
+            {'estado': 'vendido', 'nombre': 'Ana', 'telefono': '123'}
+        )
+        response = self.client.get(url)
+        self.assertEqual(self.estadisticas('numero'), (199, 1))
+        self.assertContains(response, 'Ana')
+
+    def test_tarjeta_de_rifa_se_invalida_al_vender(self):
+        url = reverse('mis_rifas')
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(self.estadisticas('rifa'), (1, 1))
+
+        Numero.objects.filter(rifa=self.rifa, numero=1).update(estado='vendido')
+        response = self.client.get(url)
+        self.assertEqual(self.estadisticas('rifa'), (0, 1))
+        self.assertContains(response, '1 vendidos')
+
+
+class ImagenesRifaTest(TestCase):
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        override = override_settings(MEDIA_ROOT=self.media)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def imagen(self, ancho, alto, modo='RGB'):
+        buffer = BytesIO()
+        Image.new(modo, (ancho, alto)).save(buffer, 'PNG')
+        return SimpleUploadedFile('foto.png', buffer.getvalue(), content_type='image/png')
+
+    def test_variantes_al_subir(self):
+        rifa = crear_rifa(imagen=self.imagen(2000, 1000, 'RGBA'))
+        rifa.refresh_from_db()
+        tarjeta = rifa.imagen_variantes['tarjeta']
+        self.assertEqual([(v['ancho'], v['alto']) for v in tarjeta], [(400, 200), (800, 400)])
+        self.assertEqual(rifa.imagen_variantes['detalle'][0]['ancho'], 1200)
+        self.assertIn('400w', rifa.imagen_tarjeta['srcset_webp'])
+
+    def test_no_agranda_imagenes_chicas(self):
+        rifa = crear_rifa(imagen=self.imagen(300, 300))
+        anchos = {v['ancho'] for tipo in ('tarjeta', 'detalle') for v in rifa.imagen_variantes[tipo]}
+        self.assertEqual(anchos, {300})
+
+    def test_imagen_sin_variantes_no_se_procesa_al_mostrarla(self):
+        rifa = crear_rifa(imagen=self.imagen(1000, 500))
+        Rifa.objects.filter(pk=rifa.pk).update(imagen_variantes={})
+        rifa.refresh_from_db()
+        # Al renderizar solo se lee: sin variantes se muestra la original
+        with self.assertNumQueries(0):
+            self.assertIsNone(rifa.imagen_tarjeta)
+            self.assertIsNone(rifa.imagen_detalle)
+        self.assertEqual(rifa.imagen_catalogo(), {'src': rifa.imagen.url})
+
+        call_command('procesar_imagenes', stdout=StringIO())
+        rifa.refresh_from_db()
+        self.assertEqual(rifa.imagen_tarjeta['ancho'], 400)
+        self.assertEqual(rifa.resumen.imagen['ancho'], 400)
+
+    def test_imagen_demasiado_grande_usa_la_original(self):
+        with mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 1000):
+            rifa = crear_rifa(imagen=self.imagen(2000, 1000))
+        rifa.refresh_from_db()
+        self.assertEqual(rifa.imagen_variantes, {'origen': rifa.imagen.name})
+        self.assertIsNone(rifa.imagen_tarjeta)
+
+
+class PaginacionCursorTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('operador', password='clave')
+        fecha = timezone.now() + timedelta(days=7)
+        # Fechas de sorteo repetidas para probar el desempate por id
+        for i in range(30):
+            crear_rifa(f'Rifa {i:02d}', cantidad_numeros=1, fecha_sorteo=fecha + timedelta(days=i % 3))
+        cls.rifa = crear_rifa('Grande', cantidad_numeros=1200)
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def recorrer(self, url, params, clave):
+        vistos, cursores = [], []
+        cursor = None
+        while True:
+            response = self.client.get(url, dict(params, **({'cursor': cursor} if cursor else {})))
+            pagina = response.context[clave]
+            vistos.extend(pagina)
+            cursores.append(pagina.cursor_anterior)
+            cursor = pagina.cursor_siguiente
+            if cursor is None:
+                return vistos, cursores
+
+    def test_recorre_todas_las_rifas_sin_repetir(self):
+        for orden in ('fecha_sorteo', '-fecha_sorteo', 'nombre', '-fecha_creacion', '-numeros_vendidos'):
+            vistos, _ = self.recorrer(reverse('mis_rifas'), {'sort': orden}, 'rifas')
+            self.assertEqual(len(vistos), 31, orden)
+            self.assertEqual(len({rifa.pk for rifa in vistos}), 31, orden)
+
+    def test_pagina_anterior(self):
+        url = reverse('mis_rifas')
+        primera = self.client.get(url, {'sort': 'nombre'}).context['rifas']
+        segunda = self.client.get(url, {'sort': 'nombre', 'cursor': primera.cursor_siguiente}).context['rifas']
+        volver = self.client.get(url, {'sort': 'nombre', 'cursor': segunda.cursor_anterior}).context['rifas']
+        self.assertEqual([r.pk for r in volver], [r.pk for r in primera])
+        self.assertFalse(volver.has_previous)
+
+    def test_grilla_de_numeros(self):
+        url = reverse('gestion_numeros', args=[self.rifa.id])
+        vistos, _ = self.recorrer(url, {}, 'numeros')
+        self.assertEqual([n.numero for n in vistos], list(range(1, 1201)))
+
+    def test_estadisticas_de_la_grilla_sin_contar_numeros(self):
+        for numero, estado in ((1, 'vendido'), (2, 'vendido'), (3, 'reservado')):
+            self.client.post(
+                reverse('actualizar_estado_numero', args=[self.rifa.numeros.get(numero=numero).id]),
+                {'estado': estado, 'nombre': 'Ana', 'telefono': '123'}
+            )
+        url = reverse('gestion_numeros', args=[self.rifa.id])
+        cursor = self.client.get(url).context['numeros'].cursor_siguiente
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(url, {'cursor': cursor})
+        self.assertEqual(
+            response.context['stats'], {'total': 1200, 'disponibles': 1197, 'reservados': 1, 'vendidos': 2}
+        )
+        # Solo se cuentan las reservas, no la grilla entera
+        conteos = [q['sql'] for q in consultas if 'COUNT' in q['sql'] and 'main_numero' in q['sql']]
+        self.assertEqual(len(conteos), 1)
+        self.assertIn("'reservado'", conteos[0])
+        # Reservas anteriores a VentaHoraria (sin filas de resumen horario)
+        VentaHoraria.objects.filter(rifa=self.rifa).delete()
+        self.assertEqual(self.client.get(url).context['stats']['reservados'], 1)
+        stats = self.client.get(url, {'estado': 'vendido'}).context['stats']
+        self.assertEqual(stats, {'total': 2, 'disponibles': 0, 'reservados': 0, 'vendidos': 2})
+        # Buscar un número cuenta solo esa fila
+        stats = self.client.get(url, {'numero': '3'}).context['stats']
+        self.assertEqual(stats, {'total': 1, 'disponibles': 0, 'reservados': 1, 'vendidos': 0})
+
+    def test_enlaces_conservan_la_busqueda(self):
+        for i in range(13):
+            crear_rifa(f'Tom & Jerry+ #{i:02d}', cantidad_numeros=1)
+        response = self.client.get(reverse('mis_rifas'), {'q': 'Tom & Jerry+ #'})
+        siguiente = response.context['rifas'].cursor_siguiente
+        self.assertIsNotNone(siguiente)
+        self.assertContains(response, 'q=Tom%20%26%20Jerry%2B%20%23&estado=all')
+        response = self.client.get(reverse('mis_rifas'), {'q': 'Tom & Jerry+ #', 'cursor': siguiente})
+        self.assertEqual(len(response.context['rifas']), 1)
+        self.assertContains(response, '&q=Tom%20%26%20Jerry%2B%20%23&')
+
+    def test_cursor_invalido_es_primera_pagina(self):
+        response = self.client.get(reverse('mis_rifas'), {'cursor': 'no-es-un-cursor'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context['rifas'].has_previous)
+
+
+class TareasTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'clave')
+
+    @override_settings(NUMEROS_GENERACION_SINCRONICA=10)
+    def test_rifa_grande_se_genera_en_segundo_plano(self):
+        rifa = crear_rifa(cantidad_numeros=25)
+        self.assertEqual(rifa.numeros.count(), 0)
+        tarea = Tarea.objects.get(tipo='generar_numeros')
+
+        self.assertEqual(tareas.ejecutar_pendientes(), 1)
+        tarea.refresh_from_db()
+        self.assertEqual(tarea.estado, 'completada')
+        self.assertEqual((tarea.procesados, tarea.total, tarea.porcentaje), (25, 25, 100))
+        self.assertEqual(rifa.numeros.count(), 25)
+        rifa.refresh_from_db()
+        self.assertTrue(rifa.numeros_generados)
+
+    def test_reintento_y_falla_definitiva(self):
+        tarea = tareas.encolar('exportar_numeros', max_intentos=2, rifa_id=999999)
+        with self.assertLogs('main.tareas', 'ERROR'):
+            tareas.ejecutar_pendientes()
+        tarea.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.intentos), ('pendiente', 1))
+        self.assertIn('DoesNotExist', tarea.error)
+
+        # El reintento espera; se adelanta para no dormir en el test
+        Tarea.objects.filter(pk=tarea.pk).update(disponible_desde=timezone.now())
+        with self.assertLogs('main.tareas', 'ERROR'):
+            tareas.ejecutar_pendientes()
+        tarea.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.intentos), ('fallida', 2))
+
+    def test_una_tarea_no_se_reclama_dos_veces(self):
+        tareas.encolar('generar_numeros', rifa_id=crear_rifa().pk)
+        self.assertIsNotNone(tareas.reclamar_siguiente('uno'))
+        self.assertIsNone(tareas.reclamar_siguiente('dos'))
+
+    def test_huerfana_se_recupera(self):
+        tarea = tareas.encolar('generar_numeros', rifa_id=crear_rifa().pk)
+        tareas.reclamar_siguiente('caido')
+        Tarea.objects.filter(pk=tarea.pk).update(latido=timezone.now() - timedelta(hours=1))
+        self.assertEqual(tareas.ejecutar_pendientes(), 1)
+        tarea.refresh_from_db()
+        self.assertEqual(tarea.estado, 'completada')
+
+    def test_acciones_del_admin_encolan(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        override = override_settings(MEDIA_ROOT=media)
+        override.enable()
+        self.addCleanup(override.disable)
+        exportaciones = exportaciones_temporales(self)
+        self.client.force_login(self.admin)
+        rifa = crear_rifa(cantidad_numeros=5)
+        transaccion = Transaccion.objects.create(
+            rifa=rifa, nombre_cliente='Ana', telefono_cliente='123'
+        )
+        transaccion.numeros.set(rifa.numeros.all()[:2])
+
+        self.client.post(reverse('admin:main_rifa_changelist'), {
+            'action': 'exportar_numeros', '_selected_action': [rifa.pk]
+        })
+        self.client.post(reverse('admin:main_transaccion_changelist'), {
+            'action': 'completar_transacciones', '_selected_action': [transaccion.pk]
+        })
+        self.assertEqual(Tarea.objects.filter(estado='pendiente').count(), 2)
+        self.assertEqual(rifa.numeros.filter(estado='vendido').count(), 0)
+
+        tareas.ejecutar_pendientes()
+        self.assertEqual(rifa.numeros.filter(estado='vendido').count(), 2)
+        exportacion = Tarea.objects.get(tipo='exportar_numeros')
+        self.assertTrue(exportacion.resultado['archivo'].endswith('.csv'))
+        # Los datos de compradores no quedan en MEDIA: solo en el storage privado
+        self.assertEqual(os.listdir(media), [])
+        self.assertEqual(os.listdir(exportaciones), [exportacion.resultado['archivo']])
+        response = self.client.get(exportacion.resultado['url'])
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('attachment', response['Content-Disposition'])
+        self.assertIn(b'numero,estado,nombre,telefono', b''.join(response.streaming_content))
+
+        data = self.client.get(reverse('estado_tarea', args=[exportacion.pk])).json()
+        self.assertEqual(data['estado'], 'completada')
+        response = self.client.get(reverse('admin:main_tarea_change', args=[exportacion.pk]))
+        self.assertContains(response, exportacion.resultado['url'])
+
+        self.client.force_login(User.objects.create_user('operador'))
+        self.assertEqual(self.client.get(exportacion.resultado['url']).status_code, 302)
+
+
+class NumerosAleatoriosTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('operador', password='clave')
+        cls.rifa = crear_rifa(cantidad_numeros=400)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def vender_todos_menos(self, libres):
+        self.rifa.numeros.exclude(numero__in=libres).update(estado='vendido')
+
+    def test_rifa_casi_vendida(self):
+        libres = {7, 150, 151, 399}
+        self.vender_todos_menos(libres)
+        # sondeo + count + una consulta numerada, sin importar cuántos estén vendidos
+        with self.assertNumQueries(3):
+            elegidos = self.rifa.numeros_aleatorios(3)
+        numeros = [numero for _, numero in elegidos]
+        self.assertEqual(len(set(numeros)), 3)
+        self.assertTrue(set(numeros) <= libres)
+        self.assertEqual(sorted(n for _, n in self.rifa.numeros_aleatorios(10)), sorted(libres))
+
+    def test_distribucion_uniforme(self):
+        # Pocos libres (posiciones numeradas) y muchos libres (sondeo del rango)
+        for libres in ({1, 2, 399, 400}, set(range(1, 401, 2))):
+            self.rifa.numeros.update(estado='disponible')
+            self.vender_todos_menos(libres)
+            posicion = {numero: i for i, numero in enumerate(sorted(libres))}
+            cuartos = Counter(
+                posicion[numero] * 4 // len(libres)
+                for _ in range(800) for _, numero in self.rifa.numeros_aleatorios(1)
+            )
+            # 200 esperados por cuarto, con un desvío de ~12
+            for cuarto in range(4):
+                self.assertTrue(140 < cuartos[cuarto] < 260, cuartos)
+
+    def test_endpoint_reserva(self):
+        self.vender_todos_menos({10, 20, 30})
+        url = reverse('numeros_aleatorios', args=[self.rifa.id])
+
+        data = self.client.get(url, {'cantidad': 2}).json()
+        self.assertEqual((data['success'], data['reservados'], len(data['numeros'])), (True, False, 2))
+        self.assertEqual(self.rifa.numeros.filter(estado='reservado').count(), 0)
+
+        data = self.client.post(url, {'cantidad': 2, 'reservar': '1', 'nombre': 'Ana'}).json()
+        reservados = {n['numero'] for n in data['numeros']}
+        self.assertEqual(len(reservados), 2)
+        self.assertEqual(
+            set(self.rifa.numeros.filter(estado='reservado', nombre_comprador='Ana')
+                .values_list('numero', flat=True)),
+            reservados
+        )
+        self.assertEqual(VentaHoraria.objects.get(rifa=self.rifa).reservados, 2)
+
+        data = self.client.post(url, {'cantidad': 5, 'reservar': '1'}).json()
+        self.assertEqual(len(data['numeros']), 1)
+        data = self.client.post(url, {'reservar': '1'}).json()
+        self.assertFalse(data['success'])
+
+
+class CompradoresTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('operador', password='clave')
+        cls.rifa = crear_rifa(cantidad_numeros=10)
+        cls.otra = crear_rifa(nombre='Otra rifa', cantidad_numeros=10, precio_numero=50)
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def cambiar_estado(self, rifa, numero, estado, telefono='+54 9 11 5555-1234', nombre='Ana'):
+        url = reverse('actualizar_estado_numero', args=[rifa.numeros.get(numero=numero).id])
+        self.client.post(url, {'estado': estado, 'nombre': nombre, 'telefono': telefono})
+
+    def test_guardar_sin_cambiar_comprador_no_consulta_compradores(self):
+        self.cambiar_estado(self.rifa, 1, 'reservado')
+        numero = self.rifa.numeros.get(numero=1)
+        numero.estado = 'vendido'
+        with self.assertNumQueries(1):  # solo el UPDATE del número
+            numero.save()
+
+        numero = self.rifa.numeros.get(numero=1)
+        numero.telefono_comprador = '1144440000'
+        numero.save()
+        self.assertEqual(numero.comprador.telefono, '1144440000')
+        self.assertEqual(Comprador.objects.count(), 2)
+
+    def ranking(self, **params):
+        data = self.client.get(reverse('ranking_compradores'), params).json()
+        return [(fila['telefono'], fila['numeros'], fila['monto']) for fila in data['ranking']]
+
+    def test_telefonos_normalizados(self):
+        self.cambiar_estado(self.rifa, 1, 'vendido', telefono='+54 9 11 5555-1234')
+        self.cambiar_estado(self.rifa, 2, 'vendido', telefono='0054 (9) 11 5555 1234')
+        self.cambiar_estado(self.rifa, 3, 'reservado', telefono='5491155551234')
+        transaccion = Transaccion.objects.create(
+            rifa=self.rifa, nombre_cliente='Ana', telefono_cliente='54-9-11-5555-1234'
+        )
+        self.assertEqual(Comprador.objects.count(), 1)
+        comprador = Comprador.objects.get()
+        self.assertEqual(comprador.telefono, '5491155551234')
+        self.assertEqual(comprador.numeros.count(), 3)
+        self.assertEqual(transaccion.comprador, comprador)
+
+    def test_totales_incrementales_y_ranking(self):
+        self.cambiar_estado(self.rifa, 1, 'vendido')
+        self.cambiar_estado(self.rifa, 2, 'vendido')
+        self.cambiar_estado(self.otra, 1, 'vendido')
+        self.cambiar_estado(self.rifa, 3, 'vendido', telefono='1144440000', nombre='Beto')
+        self.cambiar_estado(self.rifa, 4, 'reservado', telefono='1144440000', nombre='Beto')
+
+        transaccion = Transaccion.objects.create(
+            rifa=self.otra, nombre_cliente='Beto', telefono_cliente='11 4444 0000'
+        )
+        transaccion.numeros.set(self.otra.numeros.filter(numero__in=[2, 3, 4]))
+        transaccion.marcar_numeros_como_vendidos()
+
+        self.assertEqual(self.ranking(), [
+            ('1144440000', 4, '250.00'),
+            ('5491155551234', 3, '250.00'),
+        ])
+        self.assertEqual(self.ranking(rifa=self.rifa.id), [
+            ('5491155551234', 2, '200.00'),
+            ('1144440000', 1, '100.00'),
+        ])
+
+        # Volver a disponible y cambiar de comprador descuenta del anterior
+        self.cambiar_estado(self.rifa, 1, 'disponible')
+        self.cambiar_estado(self.otra, 2, 'vendido')
+        self.assertEqual(self.ranking(orden='monto'), [
+            ('5491155551234', 3, '200.00'),
+            ('1144440000', 3, '200.00'),
+        ])
+
+        comprador = Comprador.objects.get(telefono='5491155551234')
+        perfil = self.client.get(reverse('perfil_comprador', args=[comprador.id])).json()
+        self.assertEqual(
+            sorted((r['nombre'], r['numeros']) for r in perfil['rifas']),
+            [('Otra rifa', 2), ('Rifa de prueba', 1)]
+        )
+
+        incremental = self.ranking()
+        call_command('recalcular_compradores', stdout=StringIO())
+        self.assertEqual(self.ranking(), incremental)
+
+        # Borrar una rifa descuenta sus compras
+        self.otra.delete()
+        self.assertEqual(self.ranking(), [('5491155551234', 1, '100.00'), ('1144440000', 1, '100.00')])
+
+    def test_backfill(self):
+        # Datos anteriores a los compradores: teléfonos cargados sin vincular
+        self.rifa.numeros.filter(numero__in=[1, 2]).update(
+            estado='vendido', telefono_comprador='+54 11 5555-1234', nombre_comprador='Ana'
+        )
+        self.rifa.numeros.filter(numero=3).update(estado='reservado', telefono_comprador='541155551234')
+        self.otra.numeros.filter(numero=1).update(estado='vendido', telefono_comprador='(11) 4444-0000')
+
+        migracion = importlib.import_module('main.migrations.0009_backfill_compradores')
+        migracion.LOTE = 2
+        self.addCleanup(setattr, migracion, 'LOTE', 2000)
+        migracion.backfill(apps, None)
+
+        self.assertEqual(Numero.objects.filter(comprador__isnull=False).count(), 4)
+        self.assertEqual(
+            list(Comprador.objects.values_list('telefono', 'nombre', 'numeros_comprados', 'monto_total')),
+            [('541155551234', 'Ana', 2, 200), ('1144440000', '', 1, 50)]
+        )
+
+
+class ArchivoRifaTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('operador', password='clave')
+        cls.rifa = crear_rifa(cantidad_numeros=30)
+        transaccion = Transaccion.objects.create(
+            rifa=cls.rifa, nombre_cliente='Ana', telefono_cliente='11 5555-1234'
+        )
+        transaccion.numeros.set(cls.rifa.numeros.filter(numero__in=[3, 4, 5]))
+        transaccion.marcar_numeros_como_vendidos()
+        cls.transaccion = transaccion
+        numero = cls.rifa.numeros.get(numero=20)
+        numero.estado = 'reservado'
+        numero.nombre_comprador = 'Beto'
+        numero.fecha_reserva = timezone.now()
+        numero.save()
+        cls.rifa.registrar_cambios([CambioNumero(20, 'disponible', 'reservado', None, None, 'Beto', None)])
+        Ganador.objects.create(rifa=cls.rifa, numero_ganador=cls.rifa.numeros.get(numero=5))
+        Rifa.objects.filter(pk=cls.rifa.pk).update(estado='sorteada')
+        cls.rifa.refresh_from_db()
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        override = override_settings(MEDIA_ROOT=media)
+        override.enable()
+        self.addCleanup(override.disable)
+        exportaciones_temporales(self)
+
+    def grilla(self, **params):
+        response = self.client.get(reverse('gestion_numeros', args=[self.rifa.id]), params)
+        filas = [
+            (n.numero, n.estado, n.nombre_comprador, n.telefono_comprador, n.fecha_reserva, n.fecha_compra)
+            for n in response.context['numeros']
+        ]
+        return filas, response.context['stats']
+
+    def exportar(self):
+        tareas.encolar('exportar_numeros', rifa_id=self.rifa.id)
+        tareas.ejecutar_pendientes()
+        tarea = Tarea.objects.filter(tipo='exportar_numeros').latest('id')
+        with storages['exportaciones'].open(tarea.resultado['archivo']) as archivo:
+            return archivo.read()
+
+    def test_archivar_y_leer(self):
+        antes = {estado: self.grilla(estado=estado) for estado in ('all', 'vendido', 'reservado')}
+        csv_antes = self.exportar()
+
+        archivo = archivar_rifa(self.rifa)
+        self.assertEqual((archivo.disponibles, archivo.reservados, archivo.vendidos), (26, 1, 3))
+        # Solo queda la fila del ganador
+        self.assertEqual(list(self.rifa.numeros.values_list('numero', flat=True)), [5])
+
+        for estado, resultado in antes.items():
+            self.assertEqual(self.grilla(estado=estado), resultado)
+        self.assertEqual(self.grilla(numero='20')[0], [antes['reservado'][0][0]])
+        self.assertEqual(self.exportar(), csv_antes)
+        self.assertEqual(Rifa.objects.con_numeros_vendidos().get(pk=self.rifa.pk).numeros_vendidos, 3)
+        self.assertEqual(Rifa.objects.get(pk=self.rifa.pk).numeros_vendidos, 3)
+
+        response = self.client.get(reverse('gestion_numeros', args=[self.rifa.id]))
+        self.assertContains(response, 'solo lectura')
+        self.assertNotContains(response, 'mostrarModalNumero(')
+
+        # Los totales de compradores se reconstruyen también desde el archivo
+        call_command('recalcular_compradores', stdout=StringIO())
+        self.assertEqual(Comprador.objects.get(telefono='1155551234').numeros_comprados, 3)
+
+    def test_restaurar(self):
+        antes = self.grilla()
+        archivar_rifa(self.rifa)
+        call_command('archivar_rifas', restaurar=True, stdout=StringIO())
+        self.rifa.refresh_from_db()
+        self.assertFalse(self.rifa.archivada)
+        self.assertEqual(self.grilla(), antes)
+        self.assertEqual(
+            sorted(self.transaccion.numeros.values_list('numero', flat=True)), [3, 4, 5]
+        )
+        self.assertEqual(self.rifa.numeros.get(numero=3).comprador.telefono, '1155551234')
+
+    def test_comando_solo_archiva_rifas_terminadas(self):
+        activa = crear_rifa(nombre='Activa', cantidad_numeros=10)
+        salida = StringIO()
+        call_command('archivar_rifas', stdout=salida)
+        self.assertIn('30 fila(s)', salida.getvalue())
+        self.assertTrue(Rifa.objects.get(pk=self.rifa.pk).archivada)
+        self.assertFalse(Rifa.objects.get(pk=activa.pk).archivada)
+        with self.assertRaises(ValueError):
+            archivar_rifa(activa)
+
+
+class TransicionesNumeroTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('operador', password='clave')
+        cls.admin = User.objects.create_superuser('admin', password='clave')
+        cls.rifa = crear_rifa(cantidad_numeros=20)
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def historial(self, numero):
+        url = reverse('historial_numero', args=[self.rifa.id, numero])
+        return [
+            (fila['estado_anterior'], fila['estado_nuevo'], fila['operador'], fila['origen'])
+            for fila in self.client.get(url).json()['transiciones']
+        ]
+
+    def test_historial_de_todos_los_caminos(self):
+        numero = self.rifa.numeros.get(numero=1)
+        url = reverse('actualizar_estado_numero', args=[numero.id])
+        self.client.post(url, {'estado': 'reservado', 'nombre': 'Ana', 'telefono': '1155551234'})
+        # El 1 está reservado: el sorteo no puede tocarlo
+        (_, reservado), = self.rifa.reservar_numeros_aleatorios(1, nombre='Carla', telefono='1133330000')
+        self.client.post(url, {'estado': 'disponible'})
+
+        transaccion = Transaccion.objects.create(
+            rifa=self.rifa, nombre_cliente='Carla', telefono_cliente='1133330000'
+        )
+        transaccion.numeros.set(self.rifa.numeros.filter(numero__in=[1, reservado]))
+        tareas.encolar(
+            'completar_transacciones', transaccion_ids=[transaccion.id], operador_id=self.admin.id
+        )
+        tareas.ejecutar_pendientes()
+
+        self.assertEqual(self.historial(1), [
+            ('disponible', 'vendido', 'admin', 'transaccion'),
+            ('reservado', 'disponible', 'operador', 'gestion'),
+            ('disponible', 'reservado', 'operador', 'gestion'),
+        ])
+        self.assertEqual(self.historial(reservado), [
+            ('reservado', 'vendido', 'admin', 'transaccion'),
+            ('disponible', 'reservado', None, 'reserva_aleatoria'),
+        ])
+        venta = TransicionNumero.objects.filter(rifa=self.rifa, numero=reservado).latest('id')
+        self.assertEqual(venta.transaccion, transaccion)
+        self.assertEqual(venta.comprador, transaccion.comprador)
+        self.assertEqual(venta.comprador_anterior.telefono, '1133330000')
+        self.assertEqual(
+            sorted(self.admin.transiciones_numeros.values_list('numero', flat=True)),
+            sorted([1, reservado])
+        )
+
+    def test_cambios_intercalados_registran_una_transicion(self):
+        # Dos operadores abren el 3 a la vez y los dos intentan venderlo
+        otro = User.objects.create_user('otro operador')
+        segundo = self.client_class()
+        segundo.force_login(otro)
+        numero = self.rifa.numeros.get(numero=3)
+        datos_url = reverse('obtener_datos_numero', args=[numero.id])
+        visto = self.client.get(datos_url).json()['estado']
+        visto_otro = segundo.get(datos_url).json()['estado']
+
+        url = reverse('actualizar_estado_numero', args=[numero.id])
+        primera = self.client.post(url, {
+            'estado': 'vendido', 'estado_anterior': visto, 'nombre': 'Ana', 'telefono': '1155551234'
+        })
+        segunda = segundo.post(url, {
+            'estado': 'vendido', 'estado_anterior': visto_otro, 'nombre': 'Beto', 'telefono': '1144440000'
+        })
+
+        self.assertEqual((primera.status_code, segunda.status_code), (200, 409))
+        self.assertEqual(self.historial(3), [('disponible', 'vendido', 'operador', 'gestion')])
+        transicion = TransicionNumero.objects.get(rifa=self.rifa, numero=3)
+        self.assertEqual(transicion.telefono_comprador, '1155551234')
+        self.assertIsNone(transicion.comprador_anterior)
+
+    def test_admin_registra_operador(self):
+        self.client.force_login(self.admin)
+        numero = self.rifa.numeros.get(numero=5)
+        self.client.post(reverse('admin:main_numero_change', args=[numero.id]), {
+            'rifa': self.rifa.id, 'numero': 5, 'estado': 'vendido',
+            'nombre_comprador': 'Ana', 'telefono_comprador': '1155551234',
+        })
+        self.assertEqual(self.historial(5), [('disponible', 'vendido', 'admin', 'admin')])
+        # Corregir el nombre no cambia estado ni comprador: no se registra
+        self.client.post(reverse('admin:main_numero_change', args=[numero.id]), {
+            'rifa': self.rifa.id, 'numero': 5, 'estado': 'vendido',
+            'nombre_comprador': 'Ana María', 'telefono_comprador': '1155551234',
+        })
+        self.assertEqual(self.rifa.numeros.get(numero=5).nombre_comprador, 'Ana María')
+        self.assertEqual(self.historial(5), [('disponible', 'vendido', 'admin', 'admin')])
+
+    def test_un_insert_por_lote(self):
+        transaccion = Transaccion.objects.create(
+            rifa=self.rifa, nombre_cliente='Ana', telefono_cliente='1155551234'
+        )
+        transaccion.numeros.set(self.rifa.numeros.filter(numero__lte=10))
+        tabla = TransicionNumero._meta.db_table
+        with CaptureQueriesContext(connection) as consultas:
+            transaccion.marcar_numeros_como_vendidos()
+        inserts = [q for q in consultas if q['sql'].startswith(f'INSERT INTO "{tabla}"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(TransicionNumero.objects.filter(transaccion=transaccion).count(), 10)
+
+    def test_solo_agregar(self):
+        numero = self.rifa.numeros.get(numero=3)
+        self.client.post(
+            reverse('actualizar_estado_numero', args=[numero.id]), {'estado': 'vendido', 'telefono': '1'}
+        )
+        transicion = TransicionNumero.objects.get()
+        transicion.estado_nuevo = 'disponible'
+        with self.assertRaises(ValueError):
+            transicion.save()
+
+
+class MiddlewareJSONTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_superuser('admin', password='clave')
+        cls.rifa = crear_rifa(cantidad_numeros=5)
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def test_endpoints_json_sin_capas_html(self):
+        response = self.client.get(reverse('ventas_rifa', args=[self.rifa.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Frame-Options', response.headers)
+        self.assertFalse(hasattr(response.wsgi_request, '_messages'))
+
+        response = self.client.get(reverse('gestion_numeros', args=[self.rifa.id]))
+        self.assertEqual(response.headers['X-Frame-Options'], 'DENY')
+        self.assertTrue(hasattr(response.wsgi_request, '_messages'))
+
+    def test_mensajes_del_admin(self):
+        response = self.client.post(
+            reverse('admin:main_rifa_changelist'),
+            {'action': 'archivar_rifas', '_selected_action': [self.rifa.id]},
+            follow=True
+        )
+        self.assertContains(response, 'Solo se archivan rifas sorteadas')
+
+    def test_comando_perfil_middleware(self):
+        salida = StringIO()
+        call_command('perfil_arranque', solo_middleware=True, requests=2, stdout=salida)
+        self.assertIn('main.middleware.MessageMiddleware', salida.getvalue())
+        self.assertIn('JSON ventas', salida.getvalue())
+        self.assertEqual(User.objects.count(), 1)
+
+
+class PerfilesSettingsTest(unittest.TestCase):
+    """Cada perfil se importa en un proceso nuevo, como lo haría un worker"""
+
+    def ejecutar(self, codigo, **entorno):
+        variables = {
+            k: v for k, v in os.environ.items()
+            if k not in ('DJANGO_ENTORNO', 'DJANGO_SETTINGS_MODULE', 'DJANGO_ALLOWED_HOSTS')
+        }
+        return subprocess.run(
+            [sys.executable, '-c', codigo], env=dict(variables, **entorno),
+            capture_output=True, text=True, cwd=settings.BASE_DIR
+        )
+
+    def importar(self, codigo, **entorno):
+        proceso = self.ejecutar(codigo, **entorno)
+        self.assertEqual(proceso.returncode, 0, proceso.stderr)
+        return json.loads(proceso.stdout)
+
+    def test_prod_directo_usa_el_storage_comprimido(self):
+        prod = self.importar(
+            'import json\n'
+            'from rifa.settings import prod\n'
+            'print(json.dumps([prod.STORAGES["staticfiles"]["BACKEND"], prod.TEMPLATES[0]["APP_DIRS"], prod.DEBUG]))',
+            DJANGO_SECRET_KEY='clave', DJANGO_ALLOWED_HOSTS='rifas.example.com'
+        )
+        self.assertEqual(prod, ['main.estaticos.ComprimidoManifestStaticFilesStorage', False, False])
+
+    def test_prod_exige_hosts(self):
+        for hosts in ('', ','):
+            proceso = self.ejecutar(
+                'from rifa.settings import prod', DJANGO_SECRET_KEY='clave', DJANGO_ALLOWED_HOSTS=hosts
+            )
+            self.assertNotEqual(proceso.returncode, 0)
+            self.assertIn('ImproperlyConfigured: Falta DJANGO_ALLOWED_HOSTS', proceso.stderr)
+
+    def test_dev_no_modifica_base(self):
+        base = self.importar(
+            'import json\n'
+            'from rifa.settings import dev, base\n'
+            'print(json.dumps([base.STORAGES["staticfiles"]["BACKEND"], dev.STORAGES["staticfiles"]["BACKEND"]]))'
+        )
+        self.assertEqual(base, [
+            'main.estaticos.ComprimidoManifestStaticFilesStorage',
+            'django.contrib.staticfiles.storage.StaticFilesStorage',
+        ])
+
+@override_settings(
+    PRECOMPILAR_TEMPLATES=True,
+    TEMPLATES=[{
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'OPTIONS': {
+            'loaders': [('django.template.loaders.cached.Loader', [
+                'django.template.loaders.app_directories.Loader',
+            ])],
+        },
+    }],
+)
+class PrecompilarTemplatesTest(TestCase):
+
+    def cacheados(self):
+        loader, = engines['django'].engine.template_loaders
+        return set(loader.get_template_cache)
+
+    def test_solo_al_cargar_la_aplicacion(self):
+        # ready() corre en cada comando de manage.py: no precompila
+        apps.get_app_config('main').ready()
+        self.assertEqual(self.cacheados(), set())
+
+        import rifa.wsgi
+        importlib.reload(rifa.wsgi)
+        self.assertTrue({'home.html', 'layout.html', 'mis_rifas.html'} <= self.cacheados())
+
+class EstaticosComprimidosTest(TestCase):
+
+    def setUp(self):
+        self.raiz = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.raiz)
+        override = override_settings(STATIC_ROOT=self.raiz)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.storage = estaticos.ComprimidoManifestStaticFilesStorage(location=self.raiz)
+        self.storage.save('main/prueba.css', ContentFile(b'body { color: red; }' * 50))
+        self.storage.save('main/logo.png', ContentFile(b'\x89PNG'))
+        procesados = self.storage.post_process({
+            nombre: (self.storage, nombre) for nombre in ('main/prueba.css', 'main/logo.png')
+        })
+        self.hashes = {nombre: con_hash for nombre, con_hash, _ in procesados}
+
+    def pedir(self, nombre, accept_encoding=''):
+        request = RequestFactory().get('/static/' + nombre, HTTP_ACCEPT_ENCODING=accept_encoding)
+        return estaticos.servir_estatico(request, nombre)
+
+    def test_collectstatic_comprime_junto_al_nombre_con_hash(self):
+        css = self.hashes['main/prueba.css']
+        self.assertRegex(css, r'^main/prueba\.[0-9a-f]{12}\.css$')
+        with open(self.storage.path(css + '.gz'), 'rb') as archivo:
+            self.assertEqual(gzip.decompress(archivo.read()), b'body { color: red; }' * 50)
+        self.assertEqual(os.path.isfile(self.storage.path(css + '.br')), estaticos.brotli is not None)
+        # Solo se comprimen los tipos de texto
+        self.assertFalse(os.path.exists(self.storage.path(self.hashes['main/logo.png'] + '.gz')))
+
+    def test_elige_codificacion_segun_accept_encoding(self):
+        css = self.hashes['main/prueba.css']
+        # El .br puede no existir (brotli es opcional): se simula para probar la elección
+        with open(self.storage.path(css + '.br'), 'wb') as archivo:
+            archivo.write(b'br')
+        casos = {
+            'gzip, deflate, br': 'br',
+            'gzip': 'gzip',
+            'br;q=0, gzip': 'gzip',
+            'gzip;q=0': None,
+            'br;q=0.5, gzip;q=0.8': 'gzip',
+            '*': 'br',
+            '*;q=0.1, br;q=0': 'gzip',
+            '': None,
+        }
+        for cabecera, esperada in casos.items():
+            with self.subTest(cabecera=cabecera):
+                response = self.pedir(css, cabecera)
+                self.assertEqual(response.headers.get('Content-Encoding'), esperada)
+                self.assertEqual(response.headers['Vary'], 'Accept-Encoding')
+                self.assertEqual(response.headers['Content-Type'], 'text/css')
+                response.close()
+
+    def test_cache_inmutable_solo_con_hash(self):
+        response = self.pedir(self.hashes['main/prueba.css'], 'gzip')
+        self.assertEqual(response.headers['Cache-Control'], 'public, max-age=31536000, immutable')
+        response.close()
+        response = self.pedir('main/prueba.css', 'gzip')
+        self.assertEqual(response.headers['Cache-Control'], 'public, max-age=300')
+        response.close()
+
+class CatalogoTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user('operador', password='clave')
+        cls.rifa = crear_rifa('Rifa activa', cantidad_numeros=10)
+        crear_rifa('Rifa pausada', estado='pausada')
+        crear_rifa('Rifa vencida', fecha_sorteo=timezone.now() - timedelta(days=1))
+
+    def setUp(self):
+        # cache_page guarda la página entera en el cache 'default'
+        caches['default'].clear()
+
+    def catalogo(self):
+        return self.client.get(reverse('catalogo_json')).json()
+
+    def test_solo_rifas_activas_sin_sortear(self):
+        data = self.catalogo()
+        self.assertEqual([rifa['nombre'] for rifa in data['rifas']], ['Rifa activa'])
+        self.assertEqual(data['rifas'][0]['disponibles'], 10)
+        self.assertIsNone(data['rifas'][0]['imagen'])
+
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, 'Rifa activa')
+        self.assertNotContains(response, 'Rifa pausada')
+
+    def test_resumen_sigue_las_ventas(self):
+        self.client.force_login(self.usuario)
+        for numero in (1, 2, 3):
+            self.client.post(
+                reverse('actualizar_estado_numero', args=[self.rifa.numeros.get(numero=numero).id]),
+                {'estado': 'vendido', 'nombre': 'Ana', 'telefono': '123'}
+            )
+        self.client.post(
+            reverse('actualizar_estado_numero', args=[self.rifa.numeros.get(numero=3).id]),
+            {'estado': 'disponible'}
+        )
+        self.client.logout()
+
+        rifa = self.catalogo()['rifas'][0]
+        self.assertEqual((rifa['vendidos'], rifa['disponibles'], rifa['porcentaje_vendido']), (2, 8, 20.0))
+
+        self.rifa.estado = 'pausada'
+        self.rifa.save()
+        caches['default'].clear()
+        self.assertEqual(self.catalogo()['rifas'], [])
+
+    def test_recalcular_ventas_rehace_el_resumen(self):
+        Numero.objects.filter(rifa=self.rifa, numero__lte=4).update(estado='vendido')
+        call_command('recalcular_ventas', rifa=[self.rifa.id], stdout=StringIO())
+        self.assertEqual(ResumenRifa.objects.get(rifa=self.rifa).vendidos, 4)
+
+    def test_pagina_cacheada_y_publica(self):
+        for url in (reverse('home'), reverse('catalogo_json')):
+            response = self.client.get(url)
+            self.assertIn('public', response.headers['Cache-Control'])
+            self.assertIn('max-age=', response.headers['Cache-Control'])
+            # Sin sesión ni CSRF la misma copia sirve para todos los visitantes
+            self.assertNotIn('Cookie', response.headers.get('Vary', ''))
+            self.assertNotIn('sessionid', response.cookies)
+            with CaptureQueriesContext(connection) as consultas:
+                self.client.get(url)
+            self.assertEqual(len(consultas), 0)
+
+        # Un operador logueado recibe la misma página cacheada
+        self.client.force_login(self.usuario)
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get(reverse('home'))
+        self.assertEqual(len(consultas), 0)
+
+
+class SimularVentaTest(TransactionTestCase):
+
+    def test_simulacion_limpia_y_verifica(self):
+        salida = StringIO()
+        call_command(
+            'simular_venta', operadores=3, operaciones=10, numeros=20, stdout=salida
+        )
+        informe = salida.getvalue()
+        self.assertIn('Requests:', informe)
+        self.assertIn('Números vendidos a más de un comprador:', informe)
+        self.assertIn('ventas por hora (vendidos)', informe)
+        self.assertFalse(Rifa.objects.exists())
+        self.assertFalse(User.objects.exists())
+        self.assertFalse(Comprador.objects.exists())
+
+    def test_limpia_aunque_falle_al_preparar(self):
+        # El segundo operador no se puede crear: el primero y la rifa ya existen
+        crear = User.objects.create_user
+        creados = []
+
+        def crear_uno(*args, **datos):
+            if creados:
+                raise RuntimeError('corte')
+            creados.append(crear(*args, **datos))
+            return creados[-1]
+
+        with mock.patch.object(UserManager, 'create_user', side_effect=crear_uno):
+            with self.assertRaisesMessage(RuntimeError, 'corte'):
+                call_command('simular_venta', operadores=2, numeros=10, stdout=StringIO())
+        self.assertEqual(len(creados), 1)
+        self.assertFalse(Rifa.objects.exists())
+        self.assertFalse(User.objects.exists())
+
+    def test_inconsistencias_terminan_con_error(self):
+        rifa = crear_rifa(cantidad_numeros=5)
+        numero = rifa.numeros.get(numero=1)
+        Numero.objects.filter(pk=numero.pk).update(estado='vendido', telefono_comprador='111')
+        comando = simular_venta.Command(stdout=StringIO())
+        # Dos operadores con la venta confirmada y los contadores sin el movimiento
+        with self.assertRaisesMessage(CommandError, 'vendidos a más de un comprador'):
+            comando.verificar(rifa, [(numero.pk, '111'), (numero.pk, '222')])
+        with self.assertRaisesMessage(CommandError, 'ventas por hora (vendidos): 0 registrados, 1 reales'):
+            comando.verificar(rifa, [(numero.pk, '111')])
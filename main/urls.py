@@ -1,10 +1,19 @@
 from django.urls import path
-from .views import *
-urlpatterns = [
-    path('', home_view, name='home'),
-    path('mis-rifas/', mis_rifas_view, name='mis_rifas'),
-    path('rifa/<int:rifa_id>/numeros/', gestion_numeros_rifa, name='gestion_numeros'),
-    path('numero/<int:numero_id>/actualizar/', actualizar_estado_numero, name='actualizar_estado_numero'),
-    path('numero/<int:numero_id>/datos/', obtener_datos_numero, name='obtener_datos_numero'),
+from . import views
 
+urlpatterns = [
+    path('', views.home_view, name='home'),
+    path('catalogo/json/', views.catalogo_json, name='catalogo_json'),
+    path('mis-rifas/', views.mis_rifas_view, name='mis_rifas'),
+    path('rifa/<int:rifa_id>/numeros/', views.gestion_numeros_rifa, name='gestion_numeros'),
+    path('rifa/<int:rifa_id>/numeros/aleatorios/', views.numeros_aleatorios, name='numeros_aleatorios'),
+    path('numero/<int:numero_id>/actualizar/', views.actualizar_estado_numero, name='actualizar_estado_numero'),
+    path('numero/<int:numero_id>/datos/', views.obtener_datos_numero, name='obtener_datos_numero'),
+    path('rifa/<int:rifa_id>/numeros/<int:numero>/historial/', views.historial_numero, name='historial_numero'),
+    path('rifa/<int:rifa_id>/ventas/', views.ventas_rifa, name='ventas_rifa'),
+    path('compradores/ranking/', views.ranking_compradores, name='ranking_compradores'),
+    path('comprador/<int:comprador_id>/', views.perfil_comprador, name='perfil_comprador'),
+    path('tarea/<int:tarea_id>/estado/', views.estado_tarea, name='estado_tarea'),
+    path('tarea/<int:tarea_id>/exportacion/', views.descargar_exportacion, name='descargar_exportacion'),
+    path('debug/cache-fragmentos/', views.estadisticas_cache_fragmentos, name='estadisticas_cache_fragmentos'),
 ]
@@ -1,20 +1,37 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import JsonResponse
+from django.core.files.storage import storages
+from django.http import FileResponse, Http404, JsonResponse
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.http import require_POST
+from django.contrib.admin.views.decorators import staff_member_required
+from django.conf import settings
+from django.views.decorators.cache import cache_control, cache_page
+from django.views.decorators.http import require_POST, require_http_methods
 from django.utils import timezone
-from django.db.models import Q
-from django.core.paginator import Paginator
-from .models import Rifa, Numero, Transaccion
+from django.db import transaction
+from django.db.models import Count, Q
+from datetime import timedelta
+from .models import (
+    Rifa, Numero, Transaccion, VentaHoraria, Tarea, Comprador, CompraRifa, ArchivoRifa,
+    TransicionNumero, CambioNumero, ResumenRifa
+)
+from .middleware import vista_json
+from .paginacion import paginar_por_cursor, paginar_lista
+from . import archivo as archivo_rifas
+from .templatetags import fragmentos
+
+NUMEROS_POR_PAGINA = 500
+MAX_NUMEROS_ALEATORIOS = 50
+MAX_RANKING = 100
+RIFAS_POR_PAGINA_CATALOGO = 24
 
 @login_required
 def mis_rifas_view(request):
-    page_number = request.GET.get('page', 1)
+    cursor = request.GET.get('cursor')
     sort_by = request.GET.get('sort', '-fecha_creacion')
     filter_estado = request.GET.get('estado', 'all')
     search_query = request.GET.get('q', '')
     
-    rifas = Rifa.objects.all()
+    rifas = Rifa.objects.con_numeros_vendidos()
     
     if search_query:
         rifas = rifas.filter(
@@ -36,14 +53,17 @@ def mis_rifas_view(request):
         'numeros_vendidos': 'Menos vendidas'
     }
     
-    if sort_by in valid_sorts:
-        rifas = rifas.order_by(sort_by)
-    else:
-        rifas = rifas.order_by('-fecha_creacion')
+    if sort_by not in valid_sorts:
+        sort_by = '-fecha_creacion'
     
-    # Paginación
-    paginator = Paginator(rifas, 12)
-    page_obj = paginator.get_page(page_number)
+    # Paginación por cursor sobre el campo de orden, con desempate por id.
+    # Los vendidos se ordenan por el valor anotado.
+    page_obj = paginar_por_cursor(
+        rifas,
+        sort_by.replace('numeros_vendidos', '_numeros_vendidos'),
+        cursor=cursor,
+        por_pagina=12
+    )
     
     # Estadísticas
     total_rifas = Rifa.objects.count()
@@ -63,18 +83,62 @@ def mis_rifas_view(request):
     
     return render(request, 'mis_rifas.html', context)
 
+def pagina_catalogo(cursor):
+    """Rifas activas con sorteo pendiente, de la más próxima a la más lejana"""
+    resumenes = ResumenRifa.objects.filter(estado='activa', fecha_sorteo__gt=timezone.now())
+    return paginar_por_cursor(resumenes, 'fecha_sorteo', cursor=cursor, por_pagina=RIFAS_POR_PAGINA_CATALOGO)
+
+# Catálogo público: no toca la sesión, así la misma página sirve para todos
+@cache_page(settings.CATALOGO_CACHE_SEGUNDOS)
+@cache_control(public=True)
 def home_view(request):
-    return render(request, 'home.html')
+    return render(request, 'home.html', {'rifas': pagina_catalogo(request.GET.get('cursor'))})
+
+@vista_json
+@cache_page(settings.CATALOGO_CACHE_SEGUNDOS)
+@cache_control(public=True)
+def catalogo_json(request):
+    page_obj = pagina_catalogo(request.GET.get('cursor'))
+    
+    return JsonResponse({
+        'rifas': [
+            {
+                'id': resumen.rifa_id,
+                'nombre': resumen.nombre,
+                'slug': resumen.slug,
+                'precio_numero': str(resumen.precio_numero),
+                'cantidad_numeros': resumen.cantidad_numeros,
+                'vendidos': resumen.vendidos,
+                'disponibles': resumen.disponibles,
+                'porcentaje_vendido': round(resumen.porcentaje_vendido, 1),
+                'fecha_sorteo': resumen.fecha_sorteo.isoformat(),
+                'imagen': resumen.imagen or None,
+            }
+            for resumen in page_obj
+        ],
+        'siguiente': page_obj.cursor_siguiente,
+        'anterior': page_obj.cursor_anterior,
+    })
 
 @login_required
 def gestion_numeros_rifa(request, rifa_id):
     rifa = get_object_or_404(Rifa, id=rifa_id)
     
     # Obtener parámetros
-    page = request.GET.get('page', 1)
+    cursor = request.GET.get('cursor')
     filter_estado = request.GET.get('estado', 'all')
     search_numero = request.GET.get('numero', '')
     
+    if rifa.archivada:
+        page_obj, stats = numeros_archivados(rifa, filter_estado, search_numero, cursor)
+        return render(request, 'gestion_numeros.html', {
+            'rifa': rifa,
+            'numeros': page_obj,
+            'stats': stats,
+            'current_filter': filter_estado,
+            'search_numero': search_numero,
+        })
+    
     # Filtrar números
     numeros = Numero.objects.filter(rifa=rifa)
     
@@ -84,20 +148,23 @@ def gestion_numeros_rifa(request, rifa_id):
     if search_numero:
         numeros = numeros.filter(numero=search_numero)
     
-    # Paginación
-    numeros = numeros.order_by('numero')
+    # Sin búsqueda los totales salen de los resúmenes: cada página cuesta lo
+    # mismo sin importar el tamaño de la rifa. Buscar un número lee una sola fila.
+    stats = None if search_numero else estadisticas_resumidas(rifa, filter_estado)
+    if stats is None:
+        stats = numeros.aggregate(
+            total=Count('id'),
+            disponibles=Count('id', filter=Q(estado='disponible')),
+            reservados=Count('id', filter=Q(estado='reservado')),
+            vendidos=Count('id', filter=Q(estado='vendido')),
+        )
     
-    # Estadísticas
-    stats = {
-        'total': numeros.count(),
-        'disponibles': numeros.filter(estado='disponible').count(),
-        'reservados': numeros.filter(estado='reservado').count(),
-        'vendidos': numeros.filter(estado='vendido').count(),
-    }
+    # Paginación por cursor sobre el número
+    page_obj = paginar_por_cursor(numeros, 'numero', cursor=cursor, por_pagina=NUMEROS_POR_PAGINA)
     
     context = {
         'rifa': rifa,
-        'numeros': numeros,
+        'numeros': page_obj,
         'stats': stats,
         'current_filter': filter_estado,
         'search_numero': search_numero,
@@ -105,16 +172,90 @@ def gestion_numeros_rifa(request, rifa_id):
     
     return render(request, 'gestion_numeros.html', context)
 
-@login_required
+def estadisticas_resumidas(rifa, filter_estado):
+    """Totales por estado sin recorrer toda la grilla.
+
+    Los vendidos salen de ResumenRifa; los reservados se cuentan con el
+    índice ``(rifa, estado, numero)``, porque VentaHoraria no se completó
+    para las rifas anteriores a su migración. Devuelve None si la rifa todavía no
+    tiene todos sus números o no tiene resumen; en ese caso se cuentan las
+    filas.
+    """
+    if not rifa.numeros_generados:
+        return None
+    resumen = ResumenRifa.objects.filter(rifa=rifa).values_list('vendidos', flat=True).first()
+    if resumen is None:
+        return None
+    reservados = rifa.numeros.filter(estado='reservado').count()
+    conteo = {
+        'disponible': rifa.cantidad_numeros - resumen - reservados,
+        'reservado': reservados,
+        'vendido': resumen,
+    }
+    if filter_estado != 'all':
+        conteo = {estado: cantidad if estado == filter_estado else 0 for estado, cantidad in conteo.items()}
+    return {
+        'total': sum(conteo.values()),
+        'disponibles': conteo['disponible'],
+        'reservados': conteo['reservado'],
+        'vendidos': conteo['vendido'],
+    }
+
+def numeros_archivados(rifa, filter_estado, search_numero, cursor):
+    """Página y estadísticas de una rifa archivada, leídas del archivo comprimido"""
+    archivo = ArchivoRifa.objects.defer('estados', 'datos').get(rifa=rifa)
+    datos = archivo.leer()
+    if search_numero:
+        numero = datos.numero(int(search_numero)) if search_numero.isdigit() else None
+        claves = [numero.numero] if numero and filter_estado in ('all', numero.estado) else []
+        conteo = datos.contar(claves)
+    elif filter_estado == 'all':
+        claves = datos.claves()
+        conteo = datos.contar()
+    else:
+        claves = datos.claves(filter_estado)
+        conteo = dict.fromkeys(archivo_rifas.CODIGOS, 0)
+        conteo[filter_estado] = len(claves)
+    
+    stats = {
+        'total': len(claves),
+        'disponibles': conteo['disponible'],
+        'reservados': conteo['reservado'],
+        'vendidos': conteo['vendido'],
+    }
+    
+    page_obj = paginar_lista(claves, cursor=cursor, por_pagina=NUMEROS_POR_PAGINA)
+    page_obj.objetos = [datos.numero(numero) for numero in page_obj.objetos]
+    return page_obj, stats
 
+@vista_json
+@login_required
 @require_POST
 def actualizar_estado_numero(request, numero_id):
-    numero = get_object_or_404(Numero, id=numero_id)
     nuevo_estado = request.POST.get('estado')
     telefono = request.POST.get('telefono', '')
     nombre = request.POST.get('nombre', '')
+    # Estado que vio el operador al abrir el número; si cambió en el medio se rechaza
+    estado_visto = request.POST.get('estado_anterior')
+    
+    if nuevo_estado not in ['disponible', 'reservado', 'vendido']:
+        get_object_or_404(Numero, id=numero_id)
+        return JsonResponse({'success': False, 'error': 'Estado inválido'})
     
-    if nuevo_estado in ['disponible', 'reservado', 'vendido']:
+    with transaction.atomic():
+        # La fila se relee bloqueada: el estado anterior que se registra es el real
+        numero = get_object_or_404(
+            Numero.objects.select_for_update(of=('self',)).select_related('rifa'), id=numero_id
+        )
+        if estado_visto and estado_visto != numero.estado:
+            return JsonResponse({
+                'success': False,
+                'error': f'El número ya está {numero.get_estado_display().lower()}',
+                'estado': numero.estado,
+            }, status=409)
+        
+        estado_anterior = numero.estado
+        comprador_anterior = numero.comprador_id
         numero.estado = nuevo_estado
         numero.telefono_comprador = telefono if telefono else None
         numero.nombre_comprador = nombre if nombre else None
@@ -130,16 +271,23 @@ def actualizar_estado_numero(request, numero_id):
             numero.nombre_comprador = None
         
         numero.save()
-        
-        return JsonResponse({
-            'success': True,
-            'numero': numero.numero,
-            'estado': numero.estado,
-            'estado_display': numero.get_estado_display()
-        })
+        numero.rifa.registrar_cambios(
+            [CambioNumero(
+                numero.numero, estado_anterior, nuevo_estado, comprador_anterior,
+                numero.comprador_id, numero.nombre_comprador, numero.telefono_comprador
+            )],
+            operador=request.user,
+            origen='gestion'
+        )
     
-    return JsonResponse({'success': False, 'error': 'Estado inválido'})
+    return JsonResponse({
+        'success': True,
+        'numero': numero.numero,
+        'estado': numero.estado,
+        'estado_display': numero.get_estado_display()
+    })
 
+@vista_json
 @login_required
 def obtener_datos_numero(request, numero_id):
     numero = get_object_or_404(Numero, id=numero_id)
@@ -152,3 +300,226 @@ def obtener_datos_numero(request, numero_id):
         'fecha_reserva': numero.fecha_reserva.isoformat() if numero.fecha_reserva else '',
         'fecha_compra': numero.fecha_compra.isoformat() if numero.fecha_compra else '',
     })
+
+@vista_json
+@login_required
+@require_http_methods(['GET', 'POST'])
+def numeros_aleatorios(request, rifa_id):
+    """Números disponibles al azar; con POST y ``reservar=1`` además se reservan"""
+    rifa = get_object_or_404(Rifa, id=rifa_id)
+    datos = request.POST if request.method == 'POST' else request.GET
+    try:
+        cantidad = int(datos.get('cantidad', 1))
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Cantidad inválida'}, status=400)
+    cantidad = max(1, min(cantidad, MAX_NUMEROS_ALEATORIOS))
+    
+    reservar = request.method == 'POST' and datos.get('reservar') == '1'
+    if reservar:
+        if rifa.estado != 'activa':
+            return JsonResponse({'success': False, 'error': 'La rifa no está activa'}, status=400)
+        numeros = rifa.reservar_numeros_aleatorios(
+            cantidad,
+            nombre=datos.get('nombre', ''),
+            telefono=datos.get('telefono', ''),
+            operador=request.user
+        )
+    else:
+        numeros = rifa.numeros_aleatorios(cantidad)
+    
+    return JsonResponse({
+        'success': bool(numeros),
+        'reservados': reservar,
+        'numeros': [{'id': numero_id, 'numero': numero} for numero_id, numero in numeros],
+        'error': '' if numeros else 'No quedan números disponibles',
+    })
+
+@vista_json
+@login_required
+def ventas_rifa(request, rifa_id):
+    """Serie de ventas por hora o por día y proyección de la fecha de agotamiento"""
+    rifa = get_object_or_404(Rifa, id=rifa_id)
+    intervalo = request.GET.get('intervalo', 'hora')
+    
+    # Toda la historia de la rifa en una sola consulta por rango sobre (rifa, hora)
+    filas = VentaHoraria.objects.filter(rifa=rifa).order_by('hora').values_list(
+        'hora', 'vendidos', 'reservados', 'monto'
+    )
+    
+    serie = {}
+    for hora, vendidos, reservados, monto in filas:
+        if intervalo == 'dia':
+            hora = hora.replace(hour=0)
+        punto = serie.setdefault(hora, [0, 0, 0])
+        punto[0] += vendidos
+        punto[1] += reservados
+        punto[2] += monto
+    
+    total_vendidos = sum(punto[0] for punto in serie.values())
+    restantes = rifa.cantidad_numeros - total_vendidos
+    
+    # Proyección lineal con el ritmo de venta de los últimos 7 días
+    ahora = timezone.now()
+    desde = ahora - timedelta(days=7)
+    recientes = sum(punto[0] for hora, punto in serie.items() if hora >= desde)
+    fecha_agotamiento = None
+    if restantes <= 0:
+        fecha_agotamiento = ahora
+    elif recientes > 0:
+        por_hora = recientes / (7 * 24)
+        fecha_agotamiento = ahora + timedelta(hours=restantes / por_hora)
+    
+    return JsonResponse({
+        'rifa': rifa.id,
+        'intervalo': intervalo,
+        'serie': [
+            {
+                'fecha': hora.isoformat(),
+                'vendidos': vendidos,
+                'reservados': reservados,
+                'monto': str(monto),
+            }
+            for hora, (vendidos, reservados, monto) in serie.items()
+        ],
+        'vendidos': total_vendidos,
+        'restantes': restantes,
+        'fecha_agotamiento': fecha_agotamiento.isoformat() if fecha_agotamiento else None,
+    })
+
+@vista_json
+@login_required
+def ranking_compradores(request):
+    """Mejores compradores de una rifa (``?rifa=<id>``) o de todas, por números o por monto"""
+    por_monto = request.GET.get('orden') == 'monto'
+    try:
+        limite = max(1, min(int(request.GET.get('limite', 20)), MAX_RANKING))
+    except ValueError:
+        limite = 20
+    
+    rifa_id = request.GET.get('rifa')
+    if rifa_id and not rifa_id.isdigit():
+        return JsonResponse({'error': 'Rifa inválida'}, status=400)
+    if rifa_id:
+        rifa = get_object_or_404(Rifa, id=rifa_id)
+        filas = CompraRifa.objects.filter(rifa=rifa, numeros__gt=0).select_related('comprador').order_by(
+            '-monto' if por_monto else '-numeros', 'id'
+        )[:limite]
+        ranking = [
+            (fila.comprador, fila.numeros, fila.monto, fila.fecha_ultima_compra) for fila in filas
+        ]
+    else:
+        filas = Comprador.objects.filter(numeros_comprados__gt=0).order_by(
+            '-monto_total' if por_monto else '-numeros_comprados', 'id'
+        )[:limite]
+        ranking = [
+            (fila, fila.numeros_comprados, fila.monto_total, fila.fecha_ultima_compra) for fila in filas
+        ]
+    
+    return JsonResponse({
+        'rifa': int(rifa_id) if rifa_id else None,
+        'orden': 'monto' if por_monto else 'numeros',
+        'ranking': [
+            {
+                'comprador': comprador.id,
+                'nombre': comprador.nombre,
+                'telefono': comprador.telefono,
+                'numeros': numeros,
+                'monto': str(monto),
+                'fecha_ultima_compra': fecha.isoformat() if fecha else None,
+            }
+            for comprador, numeros, monto, fecha in ranking
+        ],
+    })
+
+@vista_json
+@login_required
+def perfil_comprador(request, comprador_id):
+    """Totales de un comprador y el detalle por rifa"""
+    comprador = get_object_or_404(Comprador, id=comprador_id)
+    compras = comprador.compras.filter(numeros__gt=0).select_related('rifa').order_by('-fecha_ultima_compra')
+    
+    return JsonResponse({
+        'id': comprador.id,
+        'nombre': comprador.nombre,
+        'telefono': comprador.telefono,
+        'numeros': comprador.numeros_comprados,
+        'monto': str(comprador.monto_total),
+        'fecha_ultima_compra': comprador.fecha_ultima_compra.isoformat() if comprador.fecha_ultima_compra else None,
+        'rifas': [
+            {
+                'rifa': compra.rifa_id,
+                'nombre': compra.rifa.nombre,
+                'numeros': compra.numeros,
+                'monto': str(compra.monto),
+            }
+            for compra in compras
+        ],
+    })
+
+@vista_json
+@login_required
+def historial_numero(request, rifa_id, numero):
+    """Transiciones de un número, de la más reciente a la más antigua"""
+    rifa = get_object_or_404(Rifa, id=rifa_id)
+    transiciones = (
+        TransicionNumero.objects.filter(rifa=rifa, numero=numero)
+        .select_related('operador')
+        .order_by('-fecha', '-id')
+    )
+    
+    return JsonResponse({
+        'rifa': rifa.id,
+        'numero': numero,
+        'transiciones': [
+            {
+                'fecha': transicion.fecha.isoformat(),
+                'estado_anterior': transicion.estado_anterior,
+                'estado_nuevo': transicion.estado_nuevo,
+                'nombre_comprador': transicion.nombre_comprador,
+                'telefono_comprador': transicion.telefono_comprador,
+                'comprador': transicion.comprador_id,
+                'operador': transicion.operador.username if transicion.operador else None,
+                'origen': transicion.origen,
+                'transaccion': transicion.transaccion_id,
+            }
+            for transicion in transiciones
+        ],
+    })
+
+@staff_member_required
+def descargar_exportacion(request, tarea_id):
+    """CSV de una exportación terminada; el storage de exportaciones no tiene URL pública"""
+    tarea = get_object_or_404(Tarea, id=tarea_id, tipo='exportar_numeros', estado='completada')
+    storage = storages['exportaciones']
+    nombre = (tarea.resultado or {}).get('archivo')
+    if not nombre or not storage.exists(nombre):
+        raise Http404("La exportación ya no está disponible")
+    response = FileResponse(storage.open(nombre), as_attachment=True, filename=nombre, content_type='text/csv')
+    response['Cache-Control'] = 'private, no-store'
+    return response
+
+@vista_json
+@staff_member_required
+def estadisticas_cache_fragmentos(request):
+    """Aciertos y fallos del cache de fragmentos de este proceso"""
+    estadisticas = fragmentos.obtener_estadisticas()
+    if request.GET.get('reiniciar'):
+        fragmentos.reiniciar_estadisticas()
+    return JsonResponse(estadisticas)
+
+@vista_json
+@staff_member_required
+def estado_tarea(request, tarea_id):
+    """Estado y progreso de una tarea en segundo plano, para consultar desde el admin"""
+    tarea = get_object_or_404(Tarea, id=tarea_id)
+    return JsonResponse({
+        'id': tarea.id,
+        'estado': tarea.estado,
+        'estado_display': tarea.get_estado_display(),
+        'procesados': tarea.procesados,
+        'total': tarea.total,
+        'porcentaje': tarea.porcentaje,
+        'intentos': tarea.intentos,
+        'resultado': tarea.resultado,
+        'error': tarea.error.strip().splitlines()[-1] if tarea.error else '',
+    })
@@ -11,6 +11,11 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'rifa.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'rifa.settings.default')
 
 application = get_asgi_application()
+
+# Templates al loader cacheado antes del primer request (PRECOMPILAR_TEMPLATES)
+from main.apps import precompilar_al_iniciar  # noqa: E402
+
+precompilar_al_iniciar()
@@ -0,0 +1,12 @@
+"""
+Settings de rifa, divididos por entorno:
+
+* ``base``: configuración común.
+* ``dev``: ``DEBUG`` y clave de desarrollo.
+* ``prod``: sin ``DEBUG``, clave y hosts obligatorios, templates cacheados.
+* ``default``: elige ``dev`` o ``prod`` con la variable ``DJANGO_ENTORNO``
+  (``dev`` por defecto); es el que usan manage.py, wsgi y asgi.
+
+El paquete no importa ningún perfil: ``rifa.settings.prod`` se puede usar
+directamente sin pasar por ``dev``.
+"""
@@ -0,0 +1,225 @@
+"""
+Django settings for rifa project: configuración común a todos los entornos.
+
+Generated by 'django-admin startproject' using Django 5.2.8.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/5.2/topics/settings/
+
+For the full list of settings and their values, see
+https://docs.djangoproject.com/en/5.2/ref/settings/
+"""
+
+from pathlib import Path
+import os
+# Build paths inside the project like this: BASE_DIR / 'subdir'.
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+
+# dev.py y prod.py completan estos valores
+# See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
+
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY', '')
+
+DEBUG = False
+
+ALLOWED_HOSTS = [host for host in os.environ.get('DJANGO_ALLOWED_HOSTS', '').split(',') if host]
+
+
+# Application definition
+
+INSTALLED_APPS = [
+    'django.contrib.admin',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+    'main',
+]
+
+# Mensajes y X-Frame-Options solo sirven a las páginas HTML: las versiones de
+# main.middleware no corren para las vistas marcadas con @vista_json
+MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'main.middleware.MessageMiddleware',
+    'main.middleware.XFrameOptionsMiddleware',
+]
+
+ROOT_URLCONF = 'rifa.urls'
+
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+            ],
+        },
+    },
+]
+
+WSGI_APPLICATION = 'rifa.wsgi.application'
+
+
+# Database
+# https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+
+# El motor se elige con DB_ENGINE ('sqlite' por defecto o 'postgresql').
+# En PostgreSQL se reutilizan las conexiones (CONN_MAX_AGE) o, con DB_POOL=1,
+# se usa el pool de psycopg 3. En SQLite se activan WAL y busy_timeout para
+# evitar los errores "database is locked" con varios operadores escribiendo.
+
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgresql':
+    DB_POOL = os.environ.get('DB_POOL', '0') == '1'
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.environ.get('DB_NAME', 'rifa'),
+            'USER': os.environ.get('DB_USER', 'rifa'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '5432'),
+            # El pool y las conexiones persistentes son excluyentes
+            'CONN_MAX_AGE': 0 if DB_POOL else int(os.environ.get('DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', '2')),
+                    'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', '10')),
+                    'timeout': int(os.environ.get('DB_POOL_TIMEOUT', '10')),
+                } if DB_POOL else False,
+            },
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+        }
+    }
+    if os.environ.get('SQLITE_TUNED', '1') == '1':
+        DATABASES['default']['OPTIONS'] = {
+            # Segundos que se espera a que se libere el lock (busy_timeout)
+            'timeout': int(os.environ.get('SQLITE_TIMEOUT', '20')),
+            # Toma el lock de escritura al iniciar la transacción, así no
+            # falla al intentar promover un lock de lectura a escritura
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': (
+                'PRAGMA journal_mode=WAL;'
+                'PRAGMA synchronous=NORMAL;'
+                'PRAGMA mmap_size=134217728;'
+                'PRAGMA temp_store=MEMORY;'
+            ),
+        }
+
+
+# Tareas en segundo plano
+# Las rifas con más números que este límite se generan con una tarea
+# (manage.py procesar_tareas) en vez de dentro del request.
+
+NUMEROS_GENERACION_SINCRONICA = int(os.environ.get('NUMEROS_GENERACION_SINCRONICA', '5000'))
+
+
+# Cache
+# El alias 'fragmentos' guarda el HTML de cada tarjeta de las grillas
+# ({% cache_fila %}); necesita lugar para una grilla completa de números.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'fragmentos': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'fragmentos',
+        'TIMEOUT': 60 * 60 * 24,
+        'OPTIONS': {
+            'MAX_ENTRIES': 200000,
+        },
+    },
+}
+
+
+# Catálogo público
+# Segundos que se cachea la página completa (en el cache 'default' y en
+# proxies/CDN vía Cache-Control: public); los datos salen de ResumenRifa.
+
+CATALOGO_CACHE_SEGUNDOS = int(os.environ.get('CATALOGO_CACHE_SEGUNDOS', '30'))
+
+
+# Password validation
+# https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
+
+AUTH_PASSWORD_VALIDATORS = [
+    {
+        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
+    },
+]
+
+
+# Internationalization
+# https://docs.djangoproject.com/en/5.2/topics/i18n/
+
+LANGUAGE_CODE = 'en-us'
+
+TIME_ZONE = 'UTC'
+
+USE_I18N = True
+
+USE_TZ = True
+
+
+# Static files (CSS, JavaScript, Images)
+# https://docs.djangoproject.com/en/5.2/howto/static-files/
+
+STATIC_URL = 'static/'
+
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# Fuera de DEBUG los archivos se publican con hash en el nombre y versiones
+# .gz/.br generadas en collectstatic (ver main/estaticos.py)
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'main.estaticos.ComprimidoManifestStaticFilesStorage',
+    },
+    # Exportaciones con datos de compradores: fuera de MEDIA_ROOT y sin URL
+    # pública, solo se descargan desde la vista de staff descargar_exportacion
+    'exportaciones': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        'OPTIONS': {
+            'location': os.environ.get('EXPORTACIONES_ROOT', BASE_DIR / 'privado' / 'exportaciones'),
+            'base_url': None,
+        },
+    },
+}
+
+# Default primary key field type
+# https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
+
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+MEDIA_URL = '/media/'
@@ -0,0 +1,12 @@
+"""
+Perfil elegido con DJANGO_ENTORNO (``dev`` por defecto o ``prod``).
+
+Uso: DJANGO_SETTINGS_MODULE=rifa.settings.default (por defecto)
+"""
+
+import os
+
+if os.environ.get('DJANGO_ENTORNO', 'dev') == 'prod':
+    from .prod import *  # noqa: F401,F403
+else:
+    from .dev import *  # noqa: F401,F403
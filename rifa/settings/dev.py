@@ -0,0 +1,23 @@
+"""
+Perfil de desarrollo para rifa.
+
+Uso: DJANGO_SETTINGS_MODULE=rifa.settings.dev (o rifa.settings.default sin DJANGO_ENTORNO)
+"""
+
+import os
+
+from .base import *  # noqa: F401,F403
+
+# SECURITY WARNING: don't run with debug turned on in production!
+DEBUG = True
+
+SECRET_KEY = os.environ.get(
+    'DJANGO_SECRET_KEY',
+    'django-insecure-0yfkkz(r6)$xyj%vp_dbxsrg=j6$_whv)7($so_u&y9-l-$9d$'
+)
+
+# Copia nueva, no se modifica el dict de base (lo comparte prod)
+STORAGES = {
+    **STORAGES,
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}